@@ -21,6 +21,11 @@ import data.variables as generalVars
 from utils.misc.fileIO import readRates, readIonizationEnergies, readWidths, readMeanR, readELAMelement
 from utils.misc.fileIO import searchChargeStates, readChargeStates, readIonPop, readShake
 
+#Transition index imports
+from simulation.lineUpdater import indexTransitions
+
+#Branching ratio index imports
+from utils.crossSections.energies import setupBranchingRatios
 
 #GUI utils for interface setup
 from interface.binds import on_key_event, enter_function
@@ -29,23 +34,18 @@ from interface.initializers import configureSimuPlot, configureButtonArea, setup
 from typing import List
 
 
-def simulateSpectra(dir_path: Path, element: List[int | str], parent: Tk):
+def loadElementData(dir_path: Path, element: List[int | str]) -> bool:
     """
-    Function to run the simulations interface
+    Function to search and read all the data files required to simulate the element, as well as all charge states if they exist.
+    The data is stored in the general variables, so this can be used with or without the interface
         
         Args:
             dir_path: full path to the location where the application is ran
             element: list with the [z value, element name] to simulate
-            parent: parent tkinter window object where we will bind the new interface
         
         Returns:
-            Nothing, we just setup the interface and all commands are bound and performed through the interface
+            CS_exists: if this element has transition rates for different charge states
     """
-    # ----------------------------------------------------------------------------------------------#
-    #                                                                                               #
-    #                   INITIALIZE AND READ DATA FROM THE PREDEFINED FILES                          #
-    #                                                                                               #
-    #-----------------------------------------------------------------------------------------------#
     
     # Retrieve the z and name of the element to simulate
     z: int = element[0] # type: ignore
@@ -60,6 +60,7 @@ def simulateSpectra(dir_path: Path, element: List[int | str], parent: Tk):
     # Initialize the element name for the functions module
     generalVars.element_name = element_name
     generalVars.Z = z
+    generalVars.element_dir = str(Path(dir_path).resolve())
     
     
     # Path to the radiative rates file for this element
@@ -138,6 +139,9 @@ def simulateSpectra(dir_path: Path, element: List[int | str], parent: Tk):
     # Read the ionization energies energies file
     generalVars.ionizationssat = readIonizationEnergies(ioniz_file)
     
+    # Index the branching ratios of the 1 and 2 hole levels
+    setupBranchingRatios()
+    
     
     # Path to the 2 hole ionization energies energies file for this element
     ioniz_file = dir_path / str(z) / (str(z) + '-groundshakeupenergy.out')
@@ -240,7 +244,32 @@ def simulateSpectra(dir_path: Path, element: List[int | str], parent: Tk):
         """
         # Check if the ion population data exists and load it
         generalVars.Ionpop_exists, generalVars.ionpopdata = readIonPop(ionpop_file)
+    
+    # Index the lines of each transition so that selecting them during the simulation is a lookup
+    indexTransitions()
+    
+    return CS_exists
+
 
+def simulateSpectra(dir_path: Path, element: List[int | str], parent: Tk):
+    """
+    Function to run the simulations interface
+        
+        Args:
+            dir_path: full path to the location where the application is ran
+            element: list with the [z value, element name] to simulate
+            parent: parent tkinter window object where we will bind the new interface
+        
+        Returns:
+            Nothing, we just setup the interface and all commands are bound and performed through the interface
+    """
+    # ----------------------------------------------------------------------------------------------#
+    #                                                                                               #
+    #                   INITIALIZE AND READ DATA FROM THE PREDEFINED FILES                          #
+    #                                                                                               #
+    #-----------------------------------------------------------------------------------------------#
+    
+    CS_exists = loadElementData(dir_path, element)
     
     
     # ----------------------------------------------------------------------------------------------#
@@ -1,5 +1,12 @@
 from datetime import datetime
 import sys
+import os
+
+# Throttled console progress reporter from the simulation package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from utils.misc.progress import ConsoleProgress
+
+progress = ConsoleProgress(min_step=1.0)
 
 Configs = []
 
@@ -138,7 +145,7 @@ with open(output_dir + "/" + output_spectra, "w") as output:
         # Convert each line and write the new format to the output
         # This way we can convert any size file without worrying about RAM
         for i, line in enumerate(lines):
-            print("Processing transition: " + str(i + 1) + "/" + str(transition_num), end='\r')
+            progress.report("Processing transition", i + 1, transition_num)
             
             Shelli, LowerConfigi, JJi, Eigeni, Configi, Percentagei, Shellf, LowerConfigf, \
             JJf, Eigenf, Configf, Percentagef, Energies, BranchingRatio, LevelRadYield, Intensity, \
@@ -2,6 +2,12 @@ import os, sys
 from datetime import date
 import re
 
+# Throttled console progress reporter from the simulation package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from utils.misc.progress import ConsoleProgress
+
+progress = ConsoleProgress(min_step=1.0)
+
 h = 4.135667696 * 10**(-15)
 
 ground_config = "1s2 2s2 2p*2 2p4 3s2 3p*2 3p4 3d*4 3d6 4s1"
@@ -312,7 +318,7 @@ with open(input_dir + "/" + arguments["-itr"], "r") as lines:
     header = lines.readline().strip() #header line
     #print(header.split("\t"))
     for i, line in enumerate(lines):
-        print("Processing rate: " + str(i + 1) + "/" + str(transition_num), end='\r')
+        progress.report("Processing rate", i + 1, transition_num)
         
         values = line.strip().split("\t")
         
@@ -352,7 +358,7 @@ with open(output_dir + arguments["-cfg"].split(".")[0] + "_master." + arguments[
                             if os.path.exists(input_file):
                                 register += 1
                                 
-                                print("Computing level: " + str(register) + "/" + str(total_configs), end="\r")
+                                progress.report("Computing level", register, total_configs)
                                 
                                 _, _, overlap, _, percent, acc, diff, _ = checkOutput(input_file, True)
                                 
@@ -481,7 +487,7 @@ with open(output_dir + arguments["-cfg"].split(".")[0] + "_master." + arguments[
                                 if os.path.exists(input_file):
                                     register += 1
                                     
-                                    print("Computing level: " + str(register) + "/" + str(total_configs), end="\r")
+                                    progress.report("Computing level", register, total_configs)
                                     
                                     _, _, overlap, _, percent, acc, diff, _ = checkOutput(input_file, True)
                                     
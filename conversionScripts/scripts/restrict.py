@@ -2,6 +2,12 @@ import os, sys
 from datetime import datetime
 import re
 
+# Throttled console progress reporter from the simulation package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from utils.misc.progress import ConsoleProgress
+
+progress = ConsoleProgress(min_step=1.0)
+
 
 
 
@@ -342,7 +348,7 @@ with open(output_dir + "/" + input_spectra.split(".")[0] + "_restricted." + inpu
         
         for i, line in enumerate(spectrum):
             
-            print("Processing transition: " + str(i + 1) + "/" + str(transition_num), end='\r')
+            progress.report("Processing transition", i + 1, transition_num)
             
             vals = line.strip().split()
             
@@ -2,6 +2,8 @@
 Module with classes that are used in the simulation and data processing
 """
 
+from __future__ import annotations
+
 # --------------------------------------------------------- #
 #                                                           #
 #        OBJECT DEFENITIONS TO USE IN THE SIMULATION        #
@@ -10,6 +12,64 @@ Module with classes that are used in the simulation and data processing
 
 import data.variables as generalVars
 
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Build the level filters of a transition
+def levelPredicates(low_level: str, high_level: str, auger_level: str = '', *, strict: str) -> Tuple[Callable[[str], bool], Callable[[str], bool]]:
+    """
+    Function to build the filters of the initial and final shells of the lines of a transition.
+    A line belongs to the transition when both filters accept its shells (and its energy is not 0)
+    
+        Args:
+            low_level: low level of the transition
+            high_level: high level of the transition
+            auger_level: auger level of the transition ('' for radiative transitions)
+            strict: which levels must match exactly, h (high), l (low), hl (both), na (none), hia (high, ignoring the shake level)
+                    and for auger transitions ha, la, hla (the auger level must also match)
+        
+        Returns:
+            initial: filter of the initial shell
+            final: filter of the final shell
+    """
+    if auger_level == '':
+        if strict != 'h' and strict != 'l' and strict != 'hl' and strict != 'na' and strict != 'hia':
+            raise RuntimeError("Error: Wrong parameters passed to filterLevel function of Line (Radiative).")
+    else:
+        if strict != 'h' and strict != 'l' and strict != 'hl' and strict != 'na' and strict != 'ha' and strict != 'la' and strict != 'hla' and strict != 'hia':
+            raise RuntimeError("Error: Wrong parameters passed to filterLevel function of Line (Auger).")
+    
+    if strict in ['l', 'hl', 'la', 'hla']:
+        initial = lambda shell: shell == low_level
+    else:
+        initial = lambda shell: shell in low_level or low_level in shell
+    
+    if auger_level == '':
+        if strict == 'h' or strict == 'hl':
+            final = lambda shell: shell == high_level
+        elif strict == 'hia':
+            final = lambda shell: shell[:2] == high_level
+        else:
+            final = lambda shell: shell in high_level or high_level in shell
+    else:
+        if strict in ['h', 'hia', 'hl']:
+            final = lambda shell: shell[:2] == high_level and (shell[2:4] in auger_level or auger_level in shell[2:4])
+        elif strict in ['l', 'na']:
+            final = lambda shell: (shell[:2] in high_level or high_level in shell[:2]) and (shell[2:4] in auger_level or auger_level in shell[2:4])
+        elif strict == 'la':
+            final = lambda shell: (shell[:2] in high_level or high_level in shell[:2]) and shell[2:4] == auger_level
+        else:
+            final = lambda shell: shell[:2] == high_level and shell[2:4] == auger_level
+    
+    return initial, final
+
 class Line():
     """
     Class to hold the lines read from file
@@ -114,47 +174,12 @@ class Line():
         return self
 
     def filterLevel(self, low_level: str, high_level: str, auger_level: str = '', *, strict: str) -> bool:
-        if auger_level == '':
-            if strict != 'h' and strict != 'l' and strict != 'hl' and strict != 'na' and strict != 'hia':
-                raise RuntimeError("Error: Wrong parameters passed to filterLevel function of Line (Radiative).")
-        else:
-            if strict != 'h' and strict != 'l' and strict != 'hl' and strict != 'na' and strict != 'ha' and strict != 'la' and strict != 'hla' and strict != 'hia':
-                raise RuntimeError("Error: Wrong parameters passed to filterLevel function of Line (Auger).")
+        initial, final = levelPredicates(low_level, high_level, auger_level, strict=strict)
         
         if self.energy == 0:
             return False
         
-        if strict == 'h':
-            if auger_level == '':
-                return (self.Shelli in low_level or low_level in self.Shelli) and self.Shellf == high_level
-            else:
-                return (self.Shelli in low_level or low_level in self.Shelli) and self.Shellf[:2] == high_level and (self.Shellf[2:4] in auger_level or auger_level in self.Shellf[2:4])
-        elif strict == 'hia':
-            if auger_level == '':
-                return (self.Shelli in low_level or low_level in self.Shelli) and (self.Shellf[:2] == high_level)
-            else:
-                return (self.Shelli in low_level or low_level in self.Shelli) and (self.Shellf[:2] == high_level) and (self.Shellf[2:4] in auger_level or auger_level in self.Shellf[2:4])
-        elif strict == 'l':
-            if auger_level == '':
-                return self.Shelli == low_level and (self.Shellf in high_level or high_level in self.Shellf)
-            else:
-                return self.Shelli == low_level and (self.Shellf[:2] in high_level or high_level in self.Shellf[:2]) and (self.Shellf[2:4] in auger_level or auger_level in self.Shellf[2:4])
-        elif strict == 'hl':
-            if auger_level == '':
-                return self.Shelli == low_level and self.Shellf == high_level
-            else:
-                return self.Shelli == low_level and self.Shellf[:2] == high_level and (self.Shellf[2:4] in auger_level or auger_level in self.Shellf[2:4])
-        elif strict == 'na':
-            if auger_level == '':
-                return (self.Shelli in low_level or low_level in self.Shelli) and (self.Shellf in high_level or high_level in self.Shellf)
-            else:
-                return (self.Shelli in low_level or low_level in self.Shelli) and (self.Shellf[:2] in high_level or high_level in self.Shellf[:2]) and (self.Shellf[2:4] in auger_level or auger_level in self.Shellf[2:4])
-        elif strict == 'ha':
-            return (self.Shelli in low_level or low_level in self.Shelli) and self.Shellf[:2] == high_level and self.Shellf[2:4] == auger_level
-        elif strict == 'la':
-            return self.Shelli == low_level and (self.Shellf[:2] in high_level or high_level in self.Shellf[:2]) and self.Shellf[2:4] == auger_level
-        elif strict == 'hla':
-            return self.Shelli == low_level and self.Shellf[:2] == high_level and self.Shellf[2:4] == auger_level
+        return initial(self.Shelli) and final(self.Shellf)
     
     def filterJJI(self) -> bool:
         return self.jji in generalVars.jj_vals
@@ -216,9 +241,487 @@ class Line():
             if self.Shelli == other.Shelli and self.jji == other.jji and self.eigvi == other.eigvi:
                 return True
     
-    def effectiveIntensity(self, beam: float, FWHM: float, crossSection, include_cascades: bool, boost_type: str, key: str = '', shake_amps: dict = {}) -> float:
-        from simulation.shake import calculateTotalShake, get_shakeoff, get_shakeup
-        from simulation.mults import get_overlap
+    def effectiveIntensity(self, beam: float | npt.NDArray[np.float64], FWHM: float, crossSection, include_cascades: bool, boost_type: str, key: str = '', shake_amps: dict = {}) -> float | npt.NDArray[np.float64]:
+        # Same calculation as for a table of lines, with a table of this line
+        table = self.table.take(np.array([self.index])) if isinstance(self, LineRow) else LineTable.from_lines([self])
+        
+        return table.effectiveIntensities(beam, FWHM, crossSection, include_cascades, boost_type, key, shake_amps)[0]
+
+# Property to read and write a column of the table of a row view
+def tableColumn(name: str, kind: type) -> property:
+    """
+    Function to create the property of a LineRow that reads and writes one column of its table
+    
+        Args:
+            name: name of the column
+            kind: python type of the returned values
+        
+        Returns:
+            property object for the column
+    """
+    def getter(self):
+        return kind(self.table.columns[name][self.index])
+    
+    def setter(self, value):
+        self.table.columns[name][self.index] = value
+    
+    return property(getter, setter)
+
+# Property to read and write a shell label of the table of a row view
+def tableShell(name: str) -> property:
+    """
+    Function to create the property of a LineRow that reads and writes one of the shell labels of its table
+    
+        Args:
+            name: name of the shell column (Shelli or Shellf)
+        
+        Returns:
+            property object for the shell label
+    """
+    def getter(self):
+        return self.table.shells[self.table.columns[name][self.index]]
+    
+    def setter(self, value):
+        self.table.columns[name][self.index] = self.table.shellCode(value)
+    
+    return property(getter, setter)
+
+# Property for the values that are set on the lines during the simulation
+def tableState(name: str) -> property:
+    """
+    Function to create the property of a LineRow for a value set during the simulation (overlap, diagram overlap, mixture).
+    As in a Line, the attribute does not exist until it is set
+    
+        Args:
+            name: name of the state column
+        
+        Returns:
+            property object for the state value
+    """
+    def getter(self):
+        value = self.table.columns[name][self.index]
+        if np.ndim(value) > 0:
+            # One value per beam energy (beam energy scans)
+            return value.copy()
+        if np.isnan(value):
+            raise AttributeError(name)
+        return float(value)
+    
+    def setter(self, value):
+        self.table.columns[name][self.index] = value
+    
+    return property(getter, setter)
+
+
+# Join the columns of several tables
+def stackColumns(columns: List[npt.NDArray]) -> npt.NDArray:
+    """
+    Function to join the same column of several tables.
+    Simulation values with one value per beam energy are 2D, the columns of the tables where they are not set are repeated for each beam energy
+    
+        Args:
+            columns: column of each table
+        
+        Returns:
+            joined column
+    """
+    widths = [column.shape[1] for column in columns if column.ndim == 2]
+    if len(widths) > 0:
+        columns = [column if column.ndim == 2 else np.repeat(column[:, np.newaxis], widths[0], axis=1) for column in columns]
+    
+    return np.concatenate(columns)
+
+
+class LineRow(Line):
+    """
+    Class with the view of one line of a LineTable, it has the same attributes and methods as a Line
+    """
+    __slots__ = ('table', 'index')
+    
+    def __init__(self, table: LineTable, index: int):
+        self.table = table
+        self.index = index
+    
+    Num = tableColumn('Num', int)
+    Shelli = tableShell('Shelli')
+    jji = tableColumn('jji', int)
+    eigvi = tableColumn('eigvi', int)
+    Shellf = tableShell('Shellf')
+    jjf = tableColumn('jjf', int)
+    eigvf = tableColumn('eigvf', int)
+    energy = tableColumn('energy', float)
+    br = tableColumn('br', float)
+    levelRadYield = tableColumn('levelRadYield', float)
+    intensity = tableColumn('intensity', float)
+    weight = tableColumn('weight', float)
+    radWidth = tableColumn('radWidth', float)
+    augWidth = tableColumn('augWidth', float)
+    totalWidth = tableColumn('totalWidth', float)
+    overlap = tableState('overlap')
+    diagramOverlap = tableState('diagramOverlap')
+    mix = tableState('mix')
+    
+    def __eq__(self, other):
+        return isinstance(other, LineRow) and self.table is other.table and self.index == other.index
+    
+    def __hash__(self):
+        return hash((id(self.table), self.index))
+
+
+class LineTable():
+    """
+    Class to hold the lines read from a rates file in columns.
+    The numeric values are numpy arrays and the shell labels are integer codes into the list of distinct labels.
+    Iterating or indexing the table gives LineRow views, so it can be used as the list of Line objects it replaces,
+    while the filters over all the lines run on the columns
+    """
+    # Integer and float columns, in the order of the rates files
+    int_fields: List[str] = ['Num', 'jji', 'eigvi', 'jjf', 'eigvf']
+    float_fields: List[str] = ['energy', 'br', 'levelRadYield', 'intensity', 'weight', 'radWidth', 'augWidth', 'totalWidth']
+    # Values set on the lines during the simulation, NaN while they are not set
+    state_fields: List[str] = ['overlap', 'diagramOverlap', 'mix']
+    # Shell label columns, coded into the shells list
+    shell_fields: List[str] = ['Shelli', 'Shellf']
+    
+    def __init__(self, shells: List[str], columns: Dict[str, npt.NDArray]):
+        """
+        Args:
+            shells: distinct shell labels, shared by the tables taken from this one
+            columns: array of each column, the shell columns hold the codes of the labels
+        """
+        self.shells = shells
+        self.columns = columns
+        # Index of the selected lines of each level filter and 2J selection, filled by select
+        self.selections: Dict[tuple, npt.NDArray[np.intp]] = {}
+        # Tables of the selected lines and of the joins with other tables, reused between simulations
+        self.subtables: Dict[tuple, LineTable] = {}
+        self.joins: Dict[tuple, Tuple[List[LineTable], LineTable]] = {}
+    
+    # Create a table from a list of lines
+    @classmethod
+    def from_lines(cls, lines: Iterable[Line]) -> LineTable:
+        """
+        Function to create a table from Line objects, the values that a line does not have are 0 as in an empty Line
+        
+            Args:
+                lines: lines to store in the table
+            
+            Returns:
+                the table
+        """
+        lines = list(lines)
+        
+        shells: List[str] = []
+        codes: Dict[str, int] = {}
+        columns: Dict[str, npt.NDArray] = {}
+        
+        for name in cls.shell_fields:
+            column = np.empty(len(lines), dtype=np.int32)
+            for i, line in enumerate(lines):
+                label = getattr(line, name, '')
+                if label not in codes:
+                    codes[label] = len(shells)
+                    shells.append(label)
+                column[i] = codes[label]
+            columns[name] = column
+        
+        for name in cls.int_fields:
+            columns[name] = np.array([getattr(line, name, 0) for line in lines], dtype=np.int32)
+        for name in cls.float_fields:
+            columns[name] = np.array([getattr(line, name, 0.0) for line in lines], dtype=np.float64)
+        for name in cls.state_fields:
+            columns[name] = np.array([getattr(line, name, np.nan) for line in lines], dtype=np.float64)
+        
+        return cls(shells, columns)
+    
+    # Join several tables
+    @classmethod
+    def concatenate(cls, tables: List[LineTable]) -> LineTable:
+        """
+        Function to join the lines of several tables, in order
+        
+            Args:
+                tables: tables to join
+            
+            Returns:
+                table with the lines of all the tables
+        """
+        tables = [table for table in tables if table is not None]
+        if len(tables) == 0:
+            return cls.from_lines([])
+        if all(table.shells is tables[0].shells for table in tables):
+            return cls(tables[0].shells, {name: stackColumns([table.columns[name] for table in tables]) for name in tables[0].columns})
+        
+        # Recode the shell labels of the tables into the labels of the first one
+        shells = list(tables[0].shells)
+        codes = {label: code for code, label in enumerate(shells)}
+        columns: Dict[str, List[npt.NDArray]] = {name: [] for name in tables[0].columns}
+        for table in tables:
+            recode = np.empty(len(table.shells), dtype=np.int32)
+            for code, label in enumerate(table.shells):
+                if label not in codes:
+                    codes[label] = len(shells)
+                    shells.append(label)
+                recode[code] = codes[label]
+            for name in columns:
+                columns[name].append(recode[table.columns[name]] if name in cls.shell_fields else table.columns[name])
+        
+        return cls(shells, {name: stackColumns(columns[name]) for name in columns})
+    
+    # Join several tables, reusing the previous join of the same tables
+    @classmethod
+    def joined(cls, tables: List[LineTable]) -> LineTable:
+        """
+        Function to join the lines of several tables, as concatenate.
+        The join is kept in the first table, so joining the same tables again only copies the simulation values of their lines
+        
+            Args:
+                tables: tables to join
+            
+            Returns:
+                table with the lines of all the tables
+        """
+        if len(tables) == 0:
+            return cls.from_lines([])
+        if len(tables) == 1:
+            return tables[0]
+        
+        key = tuple(id(table) for table in tables[1:])
+        cached = tables[0].joins.get(key)
+        if cached is None or any(old is not new for old, new in zip(cached[0], tables)):
+            cached = (list(tables), cls.concatenate(tables))
+            tables[0].joins[key] = cached
+        
+        table = cached[1]
+        for name in cls.state_fields:
+            table.columns[name] = stackColumns([part.columns[name] for part in tables])
+        
+        return table
+    
+    def __len__(self) -> int:
+        return len(self.columns['energy'])
+    
+    def __iter__(self) -> Iterator[LineRow]:
+        for index in range(len(self)):
+            yield LineRow(self, index)
+    
+    def __getitem__(self, index: int | slice | npt.NDArray) -> LineRow | LineTable:
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("LineTable index out of range")
+            return LineRow(self, int(index))
+        
+        return self.take(index)
+    
+    def __add__(self, other: LineTable) -> LineTable:
+        return LineTable.concatenate([self, other])
+    
+    def __getattr__(self, name: str) -> npt.NDArray:
+        # The columns can be read as attributes of the table
+        columns = self.__dict__.get('columns')
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+    
+    # Select a subset of the lines
+    def take(self, index: slice | npt.NDArray) -> LineTable:
+        """
+        Function to select lines of the table, the new table has copies of the columns and shares the shell labels
+        
+            Args:
+                index: boolean mask, array of indexes (repeated indexes repeat the line) or slice of the lines to select
+            
+            Returns:
+                table with the selected lines
+        """
+        return LineTable(self.shells, {name: column[index] for name, column in self.columns.items()})
+    
+    # Code of a shell label
+    def shellCode(self, label: str) -> int:
+        """
+        Function to get the code of a shell label, adding it to the labels if it is new
+        
+            Args:
+                label: shell label
+            
+            Returns:
+                code of the label
+        """
+        if label not in self.shells:
+            self.shells.append(label)
+        return self.shells.index(label)
+    
+    # Labels of a shell column
+    def shellLabels(self, name: str) -> List[str]:
+        """
+        Function to get the labels of a shell column for all the lines
+        
+            Args:
+                name: name of the shell column (Shelli or Shellf)
+            
+            Returns:
+                list with the shell label of each line
+        """
+        return [self.shells[code] for code in self.columns[name]]
+    
+    # Length of the initial shell labels
+    def shelliLength(self) -> npt.NDArray[np.int64]:
+        """
+        Function to get the length of the initial shell label of each line, shake-up lines have labels longer than 4 characters
+        
+            Returns:
+                array with the length of the initial shell label of each line
+        """
+        lengths = np.array([len(label) for label in self.shells], dtype=np.int64)
+        return lengths[self.columns['Shelli']]
+    
+    # Vectorized level filter
+    def filterLevel(self, low_level: str, high_level: str, auger_level: str = '', *, strict: str) -> npt.NDArray[np.bool_]:
+        """
+        Function to filter the lines of a transition, the same filter as Line.filterLevel for all the lines.
+        The shell filters are evaluated once for each distinct label
+        
+            Args:
+                same as levelPredicates
+            
+            Returns:
+                boolean mask of the lines of the transition
+        """
+        initial, final = levelPredicates(low_level, high_level, auger_level, strict=strict)
+        
+        initial_ok = np.array([initial(label) for label in self.shells], dtype=np.bool_)
+        final_ok = np.array([final(label) for label in self.shells], dtype=np.bool_)
+        
+        return (self.columns['energy'] != 0) & initial_ok[self.columns['Shelli']] & final_ok[self.columns['Shellf']]
+    
+    # Indexes of the lines of a transition
+    def select(self, low_level: str, high_level: str, auger_level: str = '', *, strict: str, jj_vals: List[int] | None = None) -> npt.NDArray[np.intp]:
+        """
+        Function to get the indexes of the lines of a transition, with the same filter as filterLevel and optionally filterJJI.
+        The indexes are calculated once for each combination of levels, filter mode and 2J values and then looked up,
+        the rates are not changed after they are read so the index does not go stale
+        
+            Args:
+                low_level, high_level, auger_level, strict: level filter of the transition, as in levelPredicates
+                jj_vals: 2J values of the initial level to keep (all the lines if None or empty)
+            
+            Returns:
+                array with the indexes of the lines, in the order of the table
+        """
+        key = (low_level, high_level, auger_level, strict)
+        indexes = self.selections.get(key)
+        if indexes is None:
+            indexes = np.flatnonzero(self.filterLevel(low_level, high_level, auger_level, strict=strict))
+            self.selections[key] = indexes
+        
+        if not jj_vals:
+            return indexes
+        
+        jj_key = key + (tuple(sorted(set(jj_vals))),)
+        jj_indexes = self.selections.get(jj_key)
+        if jj_indexes is None:
+            jj_indexes = indexes[np.isin(self.columns['jji'][indexes], jj_key[-1])]
+            self.selections[jj_key] = jj_indexes
+        
+        return jj_indexes
+    
+    # Table with the lines of a transition
+    def selection(self, low_level: str, high_level: str, auger_level: str = '', *, strict: str, jj_vals: List[int] | None = None) -> LineTable:
+        """
+        Function to get the table with the lines of a transition, the same table is returned for the same selection
+        so its own index is also kept between simulations
+        
+            Args:
+                same as select
+            
+            Returns:
+                table with the lines of the transition
+        """
+        key = (low_level, high_level, auger_level, strict, tuple(sorted(set(jj_vals))) if jj_vals else ())
+        table = self.subtables.get(key)
+        if table is None:
+            table = self.take(self.select(low_level, high_level, auger_level, strict=strict, jj_vals=jj_vals))
+            self.subtables[key] = table
+        
+        return table
+    
+    # Vectorized 2J filter
+    def filterJJI(self) -> npt.NDArray[np.bool_]:
+        """
+        Function to filter the lines with the selected 2J values, the same filter as Line.filterJJI for all the lines
+        
+            Returns:
+                boolean mask of the lines with the selected 2J values
+        """
+        return np.isin(self.columns['jji'], generalVars.jj_vals)
+    
+    # Set a simulation value of all the lines
+    def setState(self, name: str, value: float | npt.NDArray[np.float64]) -> LineTable:
+        """
+        Function to set one of the values set during the simulation for all the lines.
+        An array value (one per beam energy in a scan) makes the column 2D, with one row per line
+        
+            Args:
+                name: name of the state column
+                value: value to set
+            
+            Returns:
+                the table
+        """
+        if np.ndim(value) > 0:
+            self.columns[name] = np.tile(np.asarray(value, dtype=np.float64), (len(self), 1))
+        else:
+            self.columns[name] = np.full(len(self), value, dtype=np.float64)
+        
+        return self
+    
+    # Set the diagram overlap of all the lines
+    def setDiagramOverlap(self, overlap: float | npt.NDArray[np.float64]) -> LineTable:
+        return self.setState('diagramOverlap', overlap)
+    
+    # Set the mixture value of all the lines
+    def setMixValue(self, mix: float) -> LineTable:
+        return self.setState('mix', mix)
+    
+    # Keys of the lines
+    def lineKeys(self) -> List[str]:
+        """
+        Function to get the key of each line, the same as Line.key
+        
+            Returns:
+                list with the key of each line
+        """
+        shells = self.shells
+        labelsI = [shells[shell] + " " + str(jj) + " " + str(eigv) for shell, jj, eigv in
+                   zip(self.columns['Shelli'].tolist(), self.columns['jji'].tolist(), self.columns['eigvi'].tolist())]
+        labelsF = [shells[shell] + " " + str(jj) + " " + str(eigv) for shell, jj, eigv in
+                   zip(self.columns['Shellf'].tolist(), self.columns['jjf'].tolist(), self.columns['eigvf'].tolist())]
+        
+        return [labelI + "->" + labelF for labelI, labelF in zip(labelsI, labelsF)]
+    
+    # Effective intensities of all the lines
+    def effectiveIntensities(self, beam: float | npt.NDArray[np.float64], FWHM: float, crossSection, include_cascades: bool, boost_type: str, key: str = '', shake_amps: dict = {}) -> npt.NDArray[np.float64]:
+        """
+        Function to calculate the effective intensity of all the lines (direct decay + cascade decay).
+        Each multiplier is an array aligned with the lines, the multipliers that only depend on the initial level are
+        calculated once for each distinct level, and they are all combined in one expression
+        
+            Args:
+                beam: the beam energy, or an array of beam energies for a beam energy scan (the overlap is 1 for beam energies <= 0)
+                FWHM: the beam energy FWHM
+                crossSection: 1.0 or the dictionary with the cross section functions of each shell
+                include_cascades: add the cascade boost of the lines
+                boost_type: type of the lines (diagram, auger, satellite or shakeup)
+                key: shake level of the satellite lines
+                shake_amps: parameters to multiply the shake probabilities during fitting
+            
+            Returns:
+                array with the effective intensity of each line, with one column for each beam energy if beam is an array
+        """
+        from simulation.shake import calculateTotalShakes, get_shakeoff, get_shakeups
+        from simulation.mults import get_overlaps
         
         if boost_type == 'diagram':
             boostDict = generalVars.radBoostMatrixDict
@@ -232,18 +735,33 @@ class Line():
             print("Error on selected boost type for effective intensity calculation: " + boost_type)
             raise RuntimeError("Available boost types as diagram, auger and satellite")
         
-        crossKey = self.Shelli if key == '' else key
+        if len(self) == 0:
+            return np.zeros((0,) + np.shape(beam))
         
-        beamEnergy = beam if beam > 0.0 else generalVars.defaultBeam
+        # Distinct initial levels, with the index of the level of each line
+        levels, first, inverse = np.unique(np.stack([self.columns['Shelli'], self.columns['jji'], self.columns['eigvi']], axis=1),
+                                           axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        levelShells = [self.shells[code] for code in levels[:, 0]]
+        levelJJs = levels[:, 1].tolist()
         
-        absIntensity = self.intensity
-        boostMult = boostDict[self.key()] if include_cascades else 0.0
-        overlapMult = get_overlap(self, beamEnergy, FWHM) if beam > 0.0 else 1.0
-        crossMult = crossSection[crossKey](generalVars.formationEnergies[boost_type][self.keyI()], generalVars.defaultBeam) if type(crossSection) != type(1.0) and beam <= 0.0 else crossSection
-        mixMult = self.mix if hasattr(self, 'mix') else 1.0
-        diagramMult = (1 - calculateTotalShake(self.jji, shake_amps)) if boost_type == 'diagram' or boost_type == 'auger' else 1.0
-        shakeoffMult = self.diagramOverlap * get_shakeoff(key) if boost_type == 'satellite' else 1.0
-        shakeupMult = self.diagramOverlap * get_shakeup(key, self.Shelli[4:], self.jji) if boost_type == 'shakeup' else 1.0
+        absIntensity = self.columns['intensity']
+        boostMult = np.array([boostDict[lineKey] for lineKey in self.lineKeys()]) if include_cascades else 0.0
+        overlapMult = get_overlaps([LineRow(self, int(index)) for index in first], beam, FWHM)[inverse]
+        if type(crossSection) != type(1.0) and np.min(beam) <= 0.0:
+            formationEnergies = generalVars.formationEnergies[boost_type]
+            crossMult = np.array([crossSection[shell if key == '' else key](formationEnergies[shell + "_" + str(jj) + "_" + str(eigv)], generalVars.defaultBeam)
+                                  for shell, jj, eigv in zip(levelShells, levelJJs, levels[:, 2].tolist())])[inverse]
+        else:
+            crossMult = crossSection
+        mixMult = np.where(np.isnan(self.columns['mix']), 1.0, self.columns['mix'])
+        diagramMult = (1 - calculateTotalShakes(levels[:, 1], shake_amps))[inverse] if boost_type == 'diagram' or boost_type == 'auger' else 1.0
+        diagramOverlap = 1.0
+        if boost_type == 'satellite' or boost_type == 'shakeup':
+            diagramOverlap = self.columns['diagramOverlap']
+            if np.any(np.isnan(diagramOverlap)):
+                raise AttributeError('diagramOverlap')
+        shakeupProbs = get_shakeups([key] * len(levels), [shell[4:] for shell in levelShells], levels[:, 1])[inverse] if boost_type == 'shakeup' else 1.0
         if len(shake_amps) > 0:
             shakeoffMod = shake_amps['shake_amp_' + key] if "shake_amp_" + key in shake_amps else 1.0 if boost_type == 'satellite' else 1.0
             shakeupMod = shake_amps['shakeup_amp_' + key] if "shakeup_amp_" + key in shake_amps else 1.0 if boost_type == 'shakeup' else 1.0
@@ -251,24 +769,441 @@ class Line():
             shakeoffMod = 1.0
             shakeupMod = 1.0
         
-        # if boost_type == 'satellite':
-        #     generalVars.control_shakeoff[key] = get_shakeoff(key)
-        # if boost_type == 'shakeup':
-        #     generalVars.control_shakeup[key + "_" + str(self.jji) + "_" + self.Shelli[4:-1]] = get_shakeup(key, self.Shelli[4:], self.jji)
-        
-        # if boost_type == 'shakeup' and shakeupMult > 0.0:# and 'M2' in self.Shelli:
-        #     with open("shakeup_debug.txt", "a") as f:
-        #         f.write(self.key() + ": " + str(absIntensity) + ', ' + \
-        #         str(crossMult) + ', ' + \
-        #         str(boostMult) + ', ' + \
-        #         str(diagramMult) + ', ' + \
-        #         str(mixMult) + ', ' + \
-        #         str(overlapMult) + ', ' + \
-        #         str(shakeoffMult) + ', ' + \
-        #         str(shakeupMult) + "\n")
+        # With one value per beam energy (beam energy scans) the multipliers of each line are columns
+        if np.ndim(overlapMult) == 2 or np.ndim(diagramOverlap) == 2:
+            absIntensity, boostMult, crossMult, mixMult, diagramMult, shakeupProbs = \
+                [mult[:, np.newaxis] if np.ndim(mult) == 1 else mult for mult in [absIntensity, boostMult, crossMult, mixMult, diagramMult, shakeupProbs]]
+        
+        shakeoffMult = diagramOverlap * get_shakeoff(key) if boost_type == 'satellite' else 1.0
+        shakeupMult = diagramOverlap * shakeupProbs if boost_type == 'shakeup' else 1.0
         
         # Effective intensity = direct decay + cascade decay (boost mult)
         return absIntensity * \
             (crossMult * diagramMult * mixMult * overlapMult * \
             shakeoffMod * shakeoffMult * shakeupMod * shakeupMult + \
-            boostMult)
\ No newline at end of file
+            boostMult)
+    
+    # Memory used by the columns
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+
+class BranchingRatios():
+    """
+    Class with the branching ratios of the levels of an ionization energies file, indexed by level.
+    Each level (initial shell, jj and eigenvalue) gets an integer id, so the branching ratio of a line is a dictionary lookup
+    and the branching ratios of many lines are a single array indexing. The first entry of a repeated level is used,
+    as in the search through the file lines
+    """
+    def __init__(self, levels: List[Line] | None):
+        """
+        Args:
+            levels: lines read from the ionization energies file (None if the file is not avaliable)
+        """
+        self.levels = levels
+        self.ids: Dict[Tuple[str, int, int], int] = {}
+        
+        brs: List[float] = []
+        for level in levels if levels is not None else []:
+            key = (level.Shelli, level.jji, level.eigvi)
+            if key not in self.ids:
+                self.ids[key] = len(brs)
+                brs.append(getattr(level, 'br', 0.0))
+        
+        # The last value is used for the levels that are not in the file (id -1)
+        self.brs = np.array(brs + [0.0], dtype=np.float64)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    # Id of the initial level of a line
+    def levelId(self, line: Line) -> int:
+        return self.ids.get((line.Shelli, line.jji, line.eigvi), -1)
+    
+    # Ids of the initial levels of the lines of a table
+    def levelIds(self, table: LineTable) -> npt.NDArray[np.intp]:
+        shells = table.shells
+        return np.array([self.ids.get((shells[shell], jj, eigv), -1) for shell, jj, eigv in
+                         zip(table.columns['Shelli'].tolist(), table.columns['jji'].tolist(), table.columns['eigvi'].tolist())], dtype=np.intp)
+    
+    # Branching ratio of the initial level of a line
+    def br(self, line: Line) -> float:
+        return float(self.brs[self.levelId(line)])
+    
+    # Branching ratios of an array of level ids
+    def values(self, ids: npt.NDArray[np.intp]) -> npt.NDArray[np.float64]:
+        return self.brs[ids]
+
+
+class ShakeTable():
+    """
+    Class with the probabilities of a shake file in numeric arrays, indexed by shake orbital and 2J value.
+    The fields of the file rows are converted once, so the shake totals for a set of fitted shake amplitudes
+    are one product of the amplitudes vector with the probabilities matrix
+    """
+    def __init__(self, rows: List[List[str]], shakeup: bool = False):
+        """
+        Args:
+            rows: rows of the shake file, as read by readShake
+            shakeup: the rows are from the shake-up file, where only the SUM rows have the total probabilities of each orbital and 2J value
+        """
+        self.rows = rows
+        
+        # Shake-off rows: number, orbital, 2J, probability. Shake-up rows: number, orbital, excitation (or SUM), 2J, probability
+        columns = 5 if shakeup else 4
+        rows = [row for row in rows if len(row) >= columns]
+        orbitals = [row[1] for row in rows]
+        jjs = [int(row[columns - 2]) for row in rows]
+        probs = [float(row[columns - 1]) if not shakeup or row[2] == 'SUM' else 0.0 for row in rows]
+        
+        self.orbitals: List[str] = list(dict.fromkeys(orbitals))
+        self.jjs: List[int] = sorted(set(jjs))
+        self.orbitalIds: Dict[str, int] = {orbital: i for i, orbital in enumerate(self.orbitals)}
+        self.jjIds: Dict[int, int] = {jj: i for i, jj in enumerate(self.jjs)}
+        
+        orbitalIndex = np.array([self.orbitalIds[orbital] for orbital in orbitals], dtype=np.intp)
+        jjIndex = np.array([self.jjIds[jj] for jj in jjs], dtype=np.intp)
+        
+        # Total probability of each orbital (rows) and 2J value (columns)
+        self.probs = np.zeros((len(self.orbitals), len(self.jjs)))
+        np.add.at(self.probs, (orbitalIndex, jjIndex), probs)
+        # Total probability of each orbital over all 2J values
+        self.orbitalTotals = np.zeros(len(self.orbitals))
+        np.add.at(self.orbitalTotals, orbitalIndex, probs)
+        # Probabilities of each orbital weighted by the 2J + 1 multiplicity, and the sum of the multiplicities
+        self.weightedProbs = np.zeros(len(self.orbitals))
+        np.add.at(self.weightedProbs, orbitalIndex, np.array(probs) * (np.array(jjs) + 1))
+        self.multiplicities = np.zeros(len(self.orbitals))
+        np.add.at(self.multiplicities, orbitalIndex, np.array(jjs, dtype=np.float64) + 1)
+        # Sum of the multiplicities of the distinct 2J values, to average over the 2J values
+        self.jjMultiplicity = sum(jj + 1 for jj in self.jjs)
+    
+    def __len__(self) -> int:
+        return len(self.orbitals)
+    
+    # Vector of the shake amplitudes of the orbitals
+    def amplitudes(self, shake_amps: dict, prefix: str) -> npt.NDArray[np.float64]:
+        """
+        Function to get the fitted shake amplitude of each orbital, 1 for the orbitals that are not fitted
+        
+            Args:
+                shake_amps: parameters to multiply the shake probabilities during fitting
+                prefix: prefix of the parameter names (shake_amps_ or shakeup_amps_)
+            
+            Returns:
+                array with the amplitude of each orbital
+        """
+        return np.array([shake_amps[prefix + orbital] if prefix + orbital in shake_amps else 1.0 for orbital in self.orbitals], dtype=np.float64)
+    
+    # Total shake probabilities of several 2J values
+    def totals(self, jjs: npt.NDArray[np.int64], amplitudes: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """
+        Function to get the total probability over all orbitals of several 2J values, with the orbitals multiplied by their amplitudes
+        
+            Args:
+                jjs: 2J values
+                amplitudes: amplitude of each orbital
+            
+            Returns:
+                array with the total probability of each 2J value (0 for the values that are not in the file)
+        """
+        # The last value is used for the 2J values that are not in the file
+        totals = np.append(amplitudes @ self.probs, 0.0)
+        
+        return totals[[self.jjIds.get(int(jj), -1) for jj in np.atleast_1d(jjs)]]
+    
+    # Average total shake probability over the 2J values
+    def average(self, amplitudes: npt.NDArray[np.float64]) -> float:
+        if len(self) == 0:
+            return 0.0
+        return float(amplitudes @ self.orbitalTotals) / self.jjMultiplicity
+    
+    # Probability of an orbital averaged over its rows, weighted by the multiplicity
+    def orbitalAverage(self, orbital: str) -> float:
+        index = self.orbitalIds[orbital]
+        return float(self.weightedProbs[index] / self.multiplicities[index])
+
+
+class ShakeupSplines():
+    """
+    Class with the linear interpolations of the shake-up probabilities as a function of the excited orbital n, for each shake orbital and 2J value.
+    The interpolation nodes of all the keys are kept sorted in flat numeric arrays, so the probabilities of many
+    (key, excited orbital) pairs are evaluated at once, with a mask for the orbitals outside the nodes of their key
+    """
+    def __init__(self, rows: List[List[str]]):
+        """
+        Args:
+            rows: rows of the shake-up file, as read by readShake (the SUM rows are not interpolated)
+        """
+        nodes: Dict[str, Tuple[List[int], List[float]]] = {}
+        for row in rows:
+            if len(row) >= 5 and row[2] != 'SUM':
+                orbitals, probs = nodes.setdefault(row[1] + '_' + row[3], ([], []))
+                orbitals.append(int(row[2][:-1]))
+                probs.append(float(row[4]))
+        
+        # Id of each key and start of its nodes in the flat arrays
+        self.ids: Dict[str, int] = {key: i for i, key in enumerate(nodes)}
+        self.offsets = np.cumsum([0] + [len(orbitals) for orbitals, _ in nodes.values()])
+        
+        self.orbitals = np.zeros(self.offsets[-1])
+        self.probs = np.zeros(self.offsets[-1])
+        for i, (orbitals, probs) in enumerate(nodes.values()):
+            order = np.argsort(orbitals, kind='mergesort')
+            self.orbitals[self.offsets[i]:self.offsets[i + 1]] = np.array(orbitals, dtype=np.float64)[order]
+            self.probs[self.offsets[i]:self.offsets[i + 1]] = np.array(probs, dtype=np.float64)[order]
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.ids
+    
+    # Interpolate the probabilities of several keys and excited orbitals
+    def evaluate(self, keys: List[str], orbitals: npt.NDArray[np.float64]) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+        """
+        Function to interpolate the shake-up probabilities of several keys and excited orbitals, between the nodes of each key
+        
+            Args:
+                keys: shake orbital and 2J key (orbital_2J) of each value
+                orbitals: excited orbital n of each value (NaN if it is not known)
+            
+            Returns:
+                values: interpolated probability of each value, 0 if it is outside the nodes of its key
+                inside: mask of the values inside the nodes of their key (False for keys without nodes)
+        """
+        ids = np.array([self.ids.get(key, -1) for key in keys], dtype=np.intp)
+        orbitals = np.asarray(orbitals, dtype=np.float64)
+        
+        values = np.zeros(len(ids))
+        inside = np.zeros(len(ids), dtype=np.bool_)
+        for i in np.unique(ids[ids >= 0]):
+            selected = np.flatnonzero(ids == i)
+            x = self.orbitals[self.offsets[i]:self.offsets[i + 1]]
+            y = self.probs[self.offsets[i]:self.offsets[i + 1]]
+            n = orbitals[selected]
+            
+            valid = (n >= x[0]) & (n <= x[-1])
+            values[selected] = np.where(valid, np.interp(np.where(valid, n, x[0]), x, y), 0.0)
+            inside[selected] = valid
+        
+        return values, inside
+
+
+class ChargeStateRates():
+    """
+    Class to hold the rates tables of the charge state files, used as a list of tables.
+    Each file is only read the first time its table is used, and several files can be read at once in parallel processes,
+    so only the charge states that are mixed in the simulation are kept in memory
+    """
+    def __init__(self, files: List[Path], reader: Callable[[Path], LineTable] | None = None):
+        """
+        Args:
+            files: paths of the charge state rates files, in the order of the charge states
+            reader: function that reads a rates file into a table, it has to be picklable to run in the loading processes
+        """
+        self.files = files
+        self.reader = reader
+        self.tables: List[LineTable | None] = [None] * len(files)
+    
+    def __len__(self) -> int:
+        return len(self.files)
+    
+    def __getitem__(self, index: int) -> LineTable:
+        table = self.tables[index]
+        if table is None:
+            table = self.reader(self.files[index]) # type: ignore
+            self.tables[index] = table
+        
+        return table
+    
+    def __iter__(self) -> Iterator[LineTable]:
+        # Iterating reads all the files
+        self.load(range(len(self)))
+        for index in range(len(self)):
+            yield self[index]
+    
+    # Tables already read
+    def loaded(self) -> List[LineTable]:
+        return [table for table in self.tables if table is not None]
+    
+    # Read several files in parallel
+    def load(self, indexes: Iterable[int], workers: int | None = None):
+        """
+        Function to read the files of several charge states that were not read yet, in a process pool when there is more than one
+        
+            Args:
+                indexes: indexes of the charge states to read
+                workers: number of worker processes (number of cores if None)
+        """
+        missing = [index for index in dict.fromkeys(indexes) if self.tables[index] is None]
+        if len(missing) < 2:
+            for index in missing:
+                self[index]
+            return
+        
+        workers = min(workers if workers is not None else os.cpu_count() or 1, len(missing))
+        # The workers are spawned instead of forked, as forking the interface process also copies the tkinter state and its threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for index, table in zip(missing, pool.map(self.reader, [self.files[index] for index in missing])): # type: ignore
+                self.tables[index] = table
+
+
+class ComponentStore():
+    """
+    Class to hold the simulated satellite components (shake-off and shake-up) of each transition.
+    Only the components with lines are stored, each one as the values inside its non-zero support range.
+    Dense rows are only materialised when requested (plotting, exporting), so most of the
+    (transitions x components x points) array is never allocated.
+    """
+    def __init__(self, n_transitions: int, n_components: int, n_points: int):
+        self.shape = (n_transitions, n_components, n_points)
+        self.data: Dict[Tuple[int, int], Tuple[int, int, npt.NDArray[np.float64]]] = {}
+    
+    def __len__(self):
+        return self.shape[0]
+    
+    def __getitem__(self, transition: int):
+        return ComponentView(self, transition)
+    
+    def __iter__(self):
+        for transition in range(self.shape[0]):
+            yield ComponentView(self, transition)
+    
+    def __array__(self, dtype=None, copy=None):
+        return self.dense() if dtype is None else self.dense().astype(dtype)
+    
+    def set(self, transition: int, component: int, values: npt.NDArray[np.float64], start: int = 0):
+        """
+        Function to store the values of a component, keeping only its non-zero support range
+            
+            Args:
+                transition: index of the transition
+                component: index of the component (shake-off components first, then shake-up)
+                values: values of the component for each of the simulated x values from the index start
+                start: index of the simulated x value of the first of the values (0 if the values are the dense row)
+        """
+        nonzero = np.flatnonzero(values)
+        if len(nonzero) == 0:
+            self.data.pop((transition, component), None)
+            return
+        
+        lo = int(nonzero[0])
+        hi = int(nonzero[-1]) + 1
+        self.data[(transition, component)] = (start + lo, start + hi, np.array(values[lo:hi], dtype=np.float64))
+    
+    def has(self, transition: int, component: int) -> bool:
+        return (transition, component) in self.data
+    
+    def components(self, transition: int) -> List[int]:
+        """
+        Function to get the indexes of the stored components of a transition
+            
+            Args:
+                transition: index of the transition
+            
+            Returns:
+                sorted list with the indexes of the stored components
+        """
+        return sorted(c for (t, c) in self.data if t == transition)
+    
+    def support(self, transition: int, component: int) -> Tuple[int, int]:
+        """
+        Function to get the non-zero support range of a component
+            
+            Returns:
+                lo, hi: first and one past the last index of the non-zero values (0, 0 if the component is empty)
+        """
+        if (transition, component) not in self.data:
+            return 0, 0
+        
+        lo, hi, _ = self.data[(transition, component)]
+        return lo, hi
+    
+    def values(self, transition: int, component: int) -> npt.NDArray[np.float64]:
+        """
+        Function to get the stored values of a component without materialising the dense row
+            
+            Returns:
+                values of the component inside its non-zero support range (empty if the component is empty)
+        """
+        if (transition, component) not in self.data:
+            return np.zeros(0)
+        
+        return self.data[(transition, component)][2]
+    
+    def row(self, transition: int, component: int) -> npt.NDArray[np.float64]:
+        """
+        Function to materialise the dense values of a component
+            
+            Returns:
+                dense values of the component for each of the simulated x values (zeros if the component is empty)
+        """
+        y = np.zeros(self.shape[2])
+        if (transition, component) in self.data:
+            lo, hi, values = self.data[(transition, component)]
+            y[lo:hi] = values
+        
+        return y
+    
+    def scale(self, weights: npt.NDArray[np.float64], components: range | List[int] | None = None):
+        """
+        Function to multiply the stored components by per-point weights (e.g. the detector efficiency) without materialising them
+            
+            Args:
+                weights: weight for each of the simulated x values
+                components: indexes of the components to scale (all if None)
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        for key, (lo, hi, values) in self.data.items():
+            if components is None or key[1] in components:
+                self.data[key] = (lo, hi, values * weights[lo:hi])
+    
+    def total(self, components: range | List[int] | None = None) -> npt.NDArray[np.float64]:
+        """
+        Function to sum the stored components of all transitions
+            
+            Args:
+                components: indexes of the components to include (all if None)
+            
+            Returns:
+                summed values for each of the simulated x values
+        """
+        y = np.zeros(self.shape[2])
+        for (t, c), (lo, hi, values) in self.data.items():
+            if components is None or c in components:
+                y[lo:hi] += values
+        
+        return y
+    
+    def dense(self) -> npt.NDArray[np.float64]:
+        """
+        Function to materialise the full dense (transitions x components x points) array
+        """
+        y = np.zeros(self.shape)
+        for (t, c), (lo, hi, values) in self.data.items():
+            y[t, c, lo:hi] = values
+        
+        return y
+    
+    def nbytes(self) -> int:
+        return sum(values.nbytes for (_, _, values) in self.data.values())
+
+
+class ComponentView():
+    """
+    Class to access the components of one transition in a ComponentStore as a sequence of dense rows, materialised on access
+    """
+    def __init__(self, store: ComponentStore, transition: int):
+        self.store = store
+        self.transition = transition
+    
+    def __len__(self):
+        return self.store.shape[1]
+    
+    def __getitem__(self, component: int) -> npt.NDArray[np.float64]:
+        return self.store.row(self.transition, component)
+    
+    def __iter__(self):
+        for component in range(self.store.shape[1]):
+            yield self.store.row(self.transition, component)
@@ -8,7 +8,7 @@ No functions should be defined in this module.
 from __future__ import annotations
 from typing import List, Dict
 
-from data.definitions import Line
+from data.definitions import Line, LineTable, BranchingRatios, ShakeTable, ShakeupSplines, ChargeStateRates, ComponentStore
 
 import numpy as np
 import numpy.typing as npt
@@ -18,6 +18,13 @@ chi_sqrd = 0
 """
 Current value of the reduced chi^2 calculated in the current simulation
 """
+#Spread of the starts of the last multi-start fit
+multistart_spread: Dict[str, List[float] | List[int | None] | Dict[str, float]] = {}
+"""
+Chi^2 of each start, the round after which each start was dropped and the minimum, maximum and standard deviation of each parameter
+across the starts that finished the last multi-start fit.
+Empty when the last fit was not a multi-start fit
+"""
 #Extra fitting components configured in the "Additional fitting functions" interface
 extra_fitting_functions: Dict[str, Dict[str, float]] = {}
 """
@@ -55,9 +62,10 @@ yshkuptot: List[float] | npt.NDArray[np.float64] = []
 Final total y values for all simulated shake-up transitions
 """
 #Final y of the simulated satellite lines for each Rad transition
-yfinals: List[List[List[float]]] | npt.NDArray[np.float64] = []
+yfinals: List[List[List[float]]] | npt.NDArray[np.float64] | ComponentStore = []
 """
-Final y values calculated for each of the possible satellite transitions in each of the simulated diagram transitions
+Final y values calculated for each of the possible satellite transitions in each of the simulated diagram transitions.
+Stored sparsely in a ComponentStore, use components(transition) and row(transition, component) to access them
 """
 #Total y of each extra component for fitting
 yextras: npt.NDArray[np.float64] = np.array([np.array([])])
@@ -69,6 +77,17 @@ yextrastot: npt.NDArray[np.float64] = np.array([])
 """
 Final total y of all extra fitting components
 """
+#Upper bound on the profile area left out when the profiles are evaluated in truncated windows
+truncatedArea: float = 0.0
+"""
+Upper bound on the total profile area left out of the last simulation when using truncated profiles
+"""
+#Relative error of the convolution mode estimated against the exact profiles
+convolutionError: float = 0.0
+"""
+Relative error of the last checked simulation in the convolution mode, estimated on a sample of lines against the exact profiles.
+The check is only done for single simulations, not for each evaluation of a fit
+"""
 #Final x of the simulated spectrum for each transition
 xfinal: npt.NDArray[np.float64] = np.array([])
 """
@@ -108,17 +127,17 @@ Names of the satellite rates files for each charge state found
 """
 
 #Raw data read from the radiative transitions file to be simulated
-lineradrates: List[Line] = []
+lineradrates: LineTable = LineTable.from_lines([])
 """
 Data from the radiative spectrum read from file
 """
 #Raw data read from the satellite transitions file to be simulated
-linesatellites: List[Line] = []
+linesatellites: LineTable = LineTable.from_lines([])
 """
 Data from the satellite spectrum read from file
 """
 #Raw data read from the auger transitions file to be simulated
-lineauger: List[Line] = []
+lineauger: LineTable = LineTable.from_lines([])
 """
 Data from the auger spectrum read from file
 """
@@ -132,6 +151,16 @@ ionizationssat: List[Line] = []
 """
 Data from the ionization energies file for 2 hole radiative transitions
 """
+#Branching ratios of the 1 hole levels indexed by level
+diagramBRs: BranchingRatios = BranchingRatios([])
+"""
+Branching ratios from the 1 hole ionization energies file, indexed by level to find the branching ratios of the diagram lines
+"""
+#Branching ratios of the 2 hole levels indexed by level
+satelliteBRs: BranchingRatios = BranchingRatios([])
+"""
+Branching ratios from the 2 hole ionization energies file, indexed by level to find the branching ratios of the satellite lines
+"""
 #Raw data read from the diagram rates file
 diagramwidths: List[Line] = []
 """
@@ -194,6 +223,16 @@ shakeoff: List[List[str]] = []
 """
 Shake-off probabilities read from file
 """
+#Numeric shake-off probabilities by orbital and 2J
+shakeoffTable: ShakeTable = ShakeTable([])
+"""
+Shake-off probabilities converted from the file rows, indexed by shake orbital and 2J value
+"""
+#Numeric shake-up probabilities by orbital and 2J
+shakeupTable: ShakeTable = ShakeTable([], True)
+"""
+Total shake-up probabilities (SUM rows) converted from the file rows, indexed by shake orbital and 2J value
+"""
 #Values of the missing shakeup probability calculated from the existing shakeup transitions
 #These values are added to the shakeup probability to fullfill 100% total spectral intensity
 missing_shakeup: Dict[str, float] = {}
@@ -226,7 +265,7 @@ List of labels corresponding to the shake probabilities we want to fit
 """
 
 #Raw data read from the shake-up transitions file to be simulated, for each orbital the shake-up electron is promoted to
-lineshakeup: List[Line] = []
+lineshakeup: LineTable = LineTable.from_lines([])
 """
 Data from the shake-up spectrum read from file for each orbital the shake-up electron is promoted to
 """
@@ -237,12 +276,12 @@ ionizationsshakeup: List[Line] = []
 Data from the shake-up ionization energies read from file for each orbital the shake-up electron is promoted to
 """
 
-#Raw data read from the radiative transitions files to be simulated, for each charge state split by positive and negative CS
-lineradrates_PCS: List[List[Line]] = []
+#Raw data read from the radiative transitions files to be simulated, for each charge state split by positive and negative CS (each file is only read when its rates are first used)
+lineradrates_PCS: ChargeStateRates = ChargeStateRates([])
 """
 Data from the radiative spectrum read from file for each of the positive charge states
 """
-lineradrates_NCS: List[List[Line]] = []
+lineradrates_NCS: ChargeStateRates = ChargeStateRates([])
 """
 Data from the radiative spectrum read from file for each of the negative charge states
 """
@@ -256,12 +295,12 @@ rad_NCS: List[str] = []
 List with the order that the negative charge states were read for the radiative rates
 """
 
-#Raw data read from the auger transitions files to be simulated, for each charge state split by positive and negative CS
-lineaugrates_PCS: List[List[Line]] = []
+#Raw data read from the auger transitions files to be simulated, for each charge state split by positive and negative CS (each file is only read when its rates are first used)
+lineaugrates_PCS: ChargeStateRates = ChargeStateRates([])
 """
 Data from the auger spectrum read from file for each of the positive charge states
 """
-lineaugrates_NCS: List[List[Line]] = []
+lineaugrates_NCS: ChargeStateRates = ChargeStateRates([])
 """
 Data from the auger spectrum read from file for each of the negative charge states
 """
@@ -275,12 +314,12 @@ aug_NCS: List[str] = []
 List with the order that the negative charge states were read for the auger rates
 """
 
-#Raw data read from the satellite transitions files to be simulated, for each charge state split by positive and negative CS
-linesatellites_PCS: List[List[Line]] = []
+#Raw data read from the satellite transitions files to be simulated, for each charge state split by positive and negative CS (each file is only read when its rates are first used)
+linesatellites_PCS: ChargeStateRates = ChargeStateRates([])
 """
 Data from the satellite spectrum read from file for each of the positive charge states
 """
-linesatellites_NCS: List[List[Line]] = []
+linesatellites_NCS: ChargeStateRates = ChargeStateRates([])
 """
 Data from the satellite spectrum read from file for each of the negative charge states
 """
@@ -370,6 +409,12 @@ element_name = None
 Element name to use when sending the data to plot
 """
 
+#Directory the current element data was read from
+element_dir: str | None = None
+"""
+Resolved path of the directory with the element data folders the current element was read from
+"""
+
 #Dictionary to hold the functions to calculate the MRBEB cross section with the parameters for each shell
 elementMRBEB = {}
 """
@@ -403,10 +448,10 @@ Shakeup_exists = False
 """
 Flag for if the shake-up file was found. Disables shake-up and uses full shake probabilities for shake-off lines
 """
-#Dictionary to hold the splines for the shake-up probabilities as a function of the excited orbital n
-shakeUPSplines = {}
+#Splines for the shake-up probabilities as a function of the excited orbital n
+shakeUPSplines: ShakeupSplines = ShakeupSplines([])
 """
-Splines for the shake-up probabilities as a function of the excited orbital n
+Splines for the shake-up probabilities as a function of the excited orbital n, for each shake orbital and 2J value
 """
 
 
@@ -8,6 +8,7 @@ functions to initialize interface elements, functions to update the elements and
 from tkinter import *
 from tkinter import messagebox
 from tkinter import ttk
+from tkinter.filedialog import askopenfilename, asksaveasfilename, askdirectory
 
 #Matplotlib imports for plotting and tkinter compatibility
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -32,6 +33,11 @@ from utils.misc.analysers import prepareBoostMatrices, prepareRateMatrices, comp
 
 import simulation.shake as shakes
 from simulation.fitting import setMaxTotalShake
+from simulation.batch import save_configuration, load_configuration, batch_fit
+from simulation.beamScan import beam_energy_scan
+
+from utils.misc.fileIO import exportScan
+from utils.misc.progress import ConsoleProgress
 
 #Import numpy
 import numpy as np
@@ -2232,6 +2238,169 @@ def configure_shake_params():
     
     applyButton.grid(column=3, row=max(len(shakeOffLabels), len(shakeUpLabels)) + 1, sticky="WE")
 
+# Initialize and configure the window to set the tail tolerance of the truncated profiles
+def configureProfileTolerance():
+    """
+    Function to initialize and configure the window where we set the tail tolerance of the truncated profiles.
+    Each line profile is only evaluated inside the window where it is above this fraction of its peak value.
+    """
+    tolWindow = Toplevel(guiVars._sim)
+    tolWindow.title("Truncated Profiles Tolerance")
+    tolWindow.grab_set()  # Make this window the only interactable one until its closed
+    
+    tolLabel = Label(tolWindow, text="Profile value where each line is cut (fraction of its peak): ")
+    tolEntry = Entry(tolWindow)
+    tolEntry.insert(0, str(guiVars.profile_tail_tol.get())) # type: ignore
+    
+    def applyFunction():
+        try:
+            tail_tol = float(tolEntry.get())
+        except ValueError:
+            messagebox.showerror("Tolerance Error", "The tail tolerance must be a number")
+            return
+        
+        if not 0.0 < tail_tol < 1.0:
+            messagebox.showerror("Tolerance Error", "The tail tolerance must be between 0 and 1")
+            return
+        
+        guiVars.profile_tail_tol.set(tail_tol) # type: ignore
+        tolWindow.destroy()
+    
+    applyButton = Button(tolWindow, text="Apply", command=lambda: applyFunction())
+    
+    tolLabel.grid(column=0, row=0, sticky="WE", padx=5, pady=5)
+    tolEntry.grid(column=1, row=0, sticky="WE", padx=5, pady=5)
+    applyButton.grid(column=1, row=1, sticky="WE", padx=5, pady=5)
+
+# Initialize and configure the multi-start options interface
+def configureMultiStart():
+    """
+    Function to initialize and configure the window where we set the number of starting points of the multi-start fit.
+    The starting points are spread over the bounds of the fit parameters and fitted in parallel.
+    """
+    startsWindow = Toplevel(guiVars._sim)
+    startsWindow.title("Multi-Start Options")
+    startsWindow.grab_set()  # Make this window the only interactable one until its closed
+    
+    startsLabel = Label(startsWindow, text="Number of starting points: ")
+    startsEntry = Entry(startsWindow)
+    startsEntry.insert(0, str(guiVars.multistart_count.get())) # type: ignore
+    
+    def applyFunction():
+        try:
+            n_starts = int(startsEntry.get())
+        except ValueError:
+            messagebox.showerror("Multi-Start Error", "The number of starting points must be an integer")
+            return
+        
+        if n_starts < 1:
+            messagebox.showerror("Multi-Start Error", "The number of starting points must be at least 1")
+            return
+        
+        guiVars.multistart_count.set(n_starts) # type: ignore
+        startsWindow.destroy()
+    
+    applyButton = Button(startsWindow, text="Apply", command=lambda: applyFunction())
+    
+    startsLabel.grid(column=0, row=0, sticky="WE", padx=5, pady=5)
+    startsEntry.grid(column=1, row=0, sticky="WE", padx=5, pady=5)
+    applyButton.grid(column=1, row=1, sticky="WE", padx=5, pady=5)
+
+# Initialize and configure the beam energy scan interface
+def startBeamScanWindow():
+    """
+    Function to initialize and configure the window where we set the beam energies of a beam energy scan.
+    The spectrum of the selected transitions is simulated for each beam energy and the intensity map is saved to a .npz file
+    """
+    scanWindow = Toplevel(guiVars._sim)
+    scanWindow.title("Beam Energy Scan")
+    scanWindow.grab_set()  # Make this window the only interactable one until its closed
+    
+    startLabel = Label(scanWindow, text="First beam energy (eV): ")
+    startEntry = Entry(scanWindow)
+    stopLabel = Label(scanWindow, text="Last beam energy (eV): ")
+    stopEntry = Entry(scanWindow)
+    numLabel = Label(scanWindow, text="Number of beam energies: ")
+    numEntry = Entry(scanWindow)
+    numEntry.insert(0, "100")
+    workersLabel = Label(scanWindow, text="Worker processes: ")
+    workersEntry = Entry(scanWindow)
+    workersEntry.insert(0, "1")
+    
+    def runFunction():
+        try:
+            start = float(startEntry.get())
+            stop = float(stopEntry.get())
+            num = int(numEntry.get())
+            workers = int(workersEntry.get())
+        except ValueError:
+            messagebox.showerror("Scan Error", "The beam energies must be numbers and the number of energies and workers must be integers")
+            return
+        
+        if start <= 0.0 or stop <= 0.0 or num < 1 or workers < 1:
+            messagebox.showerror("Scan Error", "The beam energies must be positive and the number of energies and workers at least 1")
+            return
+        
+        scan_file = asksaveasfilename(defaultextension=".npz", filetypes=(("Numpy files", "*.npz"), ("All files", "*.*")))
+        if not scan_file:
+            return
+        
+        beams = np.linspace(start, stop, num, endpoint=True)
+        try:
+            xfinal, intensity_map = beam_energy_scan(beams, workers)
+        except RuntimeError as error:
+            messagebox.showerror("Scan Error", str(error))
+            return
+        
+        exportScan(scan_file, beams, xfinal, intensity_map)
+        messagebox.showinfo("File Saved", "Beam energy scan has been saved")
+        scanWindow.destroy()
+    
+    runButton = Button(scanWindow, text="Run Scan", command=lambda: runFunction())
+    
+    startLabel.grid(column=0, row=0, sticky="WE", padx=5, pady=5)
+    startEntry.grid(column=1, row=0, sticky="WE", padx=5, pady=5)
+    stopLabel.grid(column=0, row=1, sticky="WE", padx=5, pady=5)
+    stopEntry.grid(column=1, row=1, sticky="WE", padx=5, pady=5)
+    numLabel.grid(column=0, row=2, sticky="WE", padx=5, pady=5)
+    numEntry.grid(column=1, row=2, sticky="WE", padx=5, pady=5)
+    workersLabel.grid(column=0, row=3, sticky="WE", padx=5, pady=5)
+    workersEntry.grid(column=1, row=3, sticky="WE", padx=5, pady=5)
+    runButton.grid(column=1, row=4, sticky="WE", padx=5, pady=5)
+
+# Save the current configuration for batch fits
+def saveFitConfiguration():
+    """
+    Function to request a file name and save the current simulation and fit configuration for the batch fits
+    """
+    config_file = asksaveasfilename(defaultextension=".json", filetypes=(("Configuration files", "*.json"), ("All files", "*.*")))
+    if config_file:
+        save_configuration(config_file)
+        messagebox.showinfo("File Saved", "Fit configuration has been saved")
+
+# Fit a directory of spectra with a saved configuration
+def startBatchFit():
+    """
+    Function to request a saved configuration and a directory of spectra, and fit all the spectra in parallel.
+    The reports and the parameter table are saved in a Batch_Fit folder inside the spectra directory
+    """
+    config_file = askopenfilename(filetypes=(("Configuration files", "*.json"), ("All files", "*.*")))
+    if not config_file:
+        return
+    
+    spectra_dir = askdirectory()
+    if not spectra_dir:
+        return
+    
+    try:
+        rows = batch_fit(spectra_dir, load_configuration(config_file), progress=ConsoleProgress())
+    except RuntimeError as error:
+        messagebox.showerror("Batch Fit Error", str(error))
+        return
+    
+    failed = len([row for row in rows if not row['success']])
+    messagebox.showinfo("Batch Fit", str(len(rows) - failed) + " spectra fitted, " + str(failed) + " failed")
+
 # Initialize and configure the extra fitting options interface
 def fitOptionsWindow():
     """
@@ -12,7 +12,9 @@ from interface.base import _quit, restarter
 from interface.extras import startMatrixWindow, startBoostWindow, \
                             startCascadeDiagram, startCascadeSatellite, startCascadeAuger, \
                             startConvergenceWindow, configureCSMix, fitOptionsWindow, \
-                            configure_shake_params
+                            configure_shake_params, configureProfileTolerance, \
+                            configureMultiStart, saveFitConfiguration, startBatchFit, \
+                            startBeamScanWindow
 
 from utils.misc.fileIO import load, load_effic_file, write_to_xls
 
@@ -239,6 +241,14 @@ def setupVars(p: Tk):
     guiVars.choice_var = StringVar(value='Simulation')
     # Initialize the profile type to lorentzian
     guiVars.type_var = StringVar(value='Lorentzian')
+    # Initialize the Voigt backend to the exact Faddeeva function
+    guiVars.voigt_method = StringVar(value='Exact')
+    # Initialize the profile evaluation mode to exact
+    guiVars.profile_mode = StringVar(value='Exact')
+    # Initialize the tail tolerance for the truncated profiles
+    guiVars.profile_tail_tol = DoubleVar(value=1E-4)
+    # Initialize the number of starting points of the multi-start fit
+    guiVars.multistart_count = IntVar(value=16)
     # Initialize the exitation mechanism to empty as this is not yet implemented
     guiVars.exc_mech_var = StringVar(value='')
     
@@ -418,6 +428,14 @@ def setupMenus(CS_exists: bool):
     line_type_menu.add_checkbutton(label='Voigt', variable=guiVars.type_var, onvalue='Voigt', offvalue='') # type: ignore
     line_type_menu.add_checkbutton(label='Lorentzian', variable=guiVars.type_var, onvalue='Lorentzian', offvalue='') # type: ignore
     line_type_menu.add_checkbutton(label='Gaussian', variable=guiVars.type_var, onvalue='Gaussian', offvalue='') # type: ignore
+    line_type_menu.add_separator()
+    line_type_menu.add_checkbutton(label='Voigt: Exact (Faddeeva)', variable=guiVars.voigt_method, onvalue='Exact', offvalue='') # type: ignore
+    line_type_menu.add_checkbutton(label='Voigt: Pseudo-Voigt (error 1.3%)', variable=guiVars.voigt_method, onvalue='Pseudo', offvalue='') # type: ignore
+    line_type_menu.add_separator()
+    line_type_menu.add_checkbutton(label='Exact Profiles', variable=guiVars.profile_mode, onvalue='Exact', offvalue='') # type: ignore
+    line_type_menu.add_checkbutton(label='Truncated Profiles (Narrow Gaussian Lines)', variable=guiVars.profile_mode, onvalue='Truncated', offvalue='') # type: ignore
+    line_type_menu.add_checkbutton(label='Convolution (Dense Line Forests)', variable=guiVars.profile_mode, onvalue='Convolution', offvalue='') # type: ignore
+    line_type_menu.add_command(label='Truncated Profiles Tolerance', command=lambda: configureProfileTolerance())
     
     # ---------------------------------------------------------------------------------------------------------------
     # Add the Fitting dropdown menu and the buttons bound to the corresponding variables and functions
@@ -425,7 +443,12 @@ def setupMenus(CS_exists: bool):
     fitting_menu.add_cascade(label = "Fit Method", menu = fitting_method)
     fitting_method.add_checkbutton(label='LMFit', variable=guiVars.autofitvar, onvalue='LMFit', offvalue='') # type: ignore
     fitting_method.add_checkbutton(label='iminuit', variable=guiVars.autofitvar, onvalue='iminuit', offvalue='')
+    fitting_method.add_checkbutton(label='LMFit (Variable Projection)', variable=guiVars.autofitvar, onvalue='VarPro', offvalue='') # type: ignore
+    fitting_method.add_checkbutton(label='LMFit (Multi-Start)', variable=guiVars.autofitvar, onvalue='MultiStart', offvalue='') # type: ignore
+    fitting_menu.add_command(label='Multi-Start Options', command=lambda: configureMultiStart())
     fitting_menu.add_command(label='Aditional Fitting Options', command=lambda: fitOptionsWindow())
+    fitting_menu.add_command(label='Save Fit Configuration', command=lambda: saveFitConfiguration())
+    fitting_menu.add_command(label='Batch Fit Directory', command=lambda: startBatchFit())
     
     # ---------------------------------------------------------------------------------------------------------------
     # Add the Normalization options dropdown menu and the buttons bound to the corresponding variables and functions
@@ -457,4 +480,5 @@ def setupMenus(CS_exists: bool):
     cascade_analysis.add_command(label="Auger Cascade", command=lambda: startCascadeAuger(), state=DISABLED)
     
     tool_menu.add_command(label="Convergence Analysis", command=lambda: startConvergenceWindow())
+    tool_menu.add_command(label="Beam Energy Scan", command=lambda: startBeamScanWindow())
     
\ No newline at end of file
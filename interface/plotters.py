@@ -205,8 +205,9 @@ def simu_plot(sat: str, graph_area: Axes, normalization_var: float, y0: float, p
         totalShakeupInt = []
         for index, key in enumerate(generalVars.the_dictionary):
             if generalVars.the_dictionary[key]["selected_state"]:
-                for l, m in enumerate(generalVars.yfinals[index]):
-                    # Dont plot the satellites that have a max y value of 0
+                # Only the satellites with a non-zero y value are stored
+                for l in generalVars.yfinals.components(index):
+                    m = generalVars.yfinals.row(index, l)
                     if max(m) != 0:
                         if l < len(generalVars.label1):
                             totalShakeoffInt.append(sum(m))
@@ -215,9 +216,9 @@ def simu_plot(sat: str, graph_area: Axes, normalization_var: float, y0: float, p
                         if plotSimu:
                             # Plot the selected transition
                             if l < len(generalVars.label1):
-                                graph_area.plot(generalVars.xfinal, (np.array(generalVars.yfinals[index][l]) * normalization_var) + y0, label=key + ' - ' + generalVars.labeldict[generalVars.label1[l]], gid=key + ' - ' + generalVars.labeldict[generalVars.label1[l]], color=str(col2[np.random.randint(0, len(col2))][0]))  # Plot the simulation of all lines
+                                graph_area.plot(generalVars.xfinal, (m * normalization_var) + y0, label=key + ' - ' + generalVars.labeldict[generalVars.label1[l]], gid=key + ' - ' + generalVars.labeldict[generalVars.label1[l]], color=str(col2[np.random.randint(0, len(col2))][0]))  # Plot the simulation of all lines
                             else:
-                                graph_area.plot(generalVars.xfinal, (np.array(generalVars.yfinals[index][l]) * normalization_var) + y0, label=key + ' - ' + generalVars.labeldict[generalVars.label1[l - len(generalVars.label1)]] + ' - shake-up', gid=key + ' - ' + generalVars.labeldict[generalVars.label1[l - len(generalVars.label1)]] + ' - shake-up', color=str(col2[np.random.randint(0, len(col2))][0]))  # Plot the simulation of all lines
+                                graph_area.plot(generalVars.xfinal, (m * normalization_var) + y0, label=key + ' - ' + generalVars.labeldict[generalVars.label1[l - len(generalVars.label1)]] + ' - shake-up', gid=key + ' - ' + generalVars.labeldict[generalVars.label1[l - len(generalVars.label1)]] + ' - shake-up', color=str(col2[np.random.randint(0, len(col2))][0]))  # Plot the simulation of all lines
                             graph_area.legend()
         print(str(guiVars.excitation_energy.get()) + "; " + str(sum(totalDiagInt)) + "; " + str(sum(totalShakeoffInt)) + "; " + str(sum(totalShakeupInt))) # type: ignore
     if sat == 'Auger':
@@ -295,11 +296,12 @@ def Msimu_plot(ploted_cs: List[str], sat: str, graph_area: Axes,
         for cs_index, cs in enumerate(ploted_cs):
             for index, key in enumerate(generalVars.the_dictionary):
                 if generalVars.the_dictionary[key]["selected_state"]:
-                    for l, m in enumerate(generalVars.yfinals[cs_index * len(generalVars.the_dictionary) + index]):
-                        # Dont plot the satellites that have a max y value of 0
+                    # Only the satellites with a non-zero y value are stored
+                    for l in generalVars.yfinals.components(cs_index * len(generalVars.the_dictionary) + index):
+                        m = generalVars.yfinals.row(cs_index * len(generalVars.the_dictionary) + index, l)
                         if max(m) != 0:
                             # Plot the selected transition
-                            graph_area.plot(generalVars.xfinal, (np.array(generalVars.yfinals[cs_index * len(generalVars.the_dictionary) + index][l]) * normalization_var) + y0, label=cs + ' ' + key + ' - ' + generalVars.labeldict[generalVars.label1[l]], gid=cs + ' ' + key + ' - ' + generalVars.labeldict[generalVars.label1[l]], color=str(col2[np.random.randint(0, len(col2))][0]))  # Plot the simulation of all lines
+                            graph_area.plot(generalVars.xfinal, (m * normalization_var) + y0, label=cs + ' ' + key + ' - ' + generalVars.labeldict[generalVars.label1[l]], gid=cs + ' ' + key + ' - ' + generalVars.labeldict[generalVars.label1[l]], color=str(col2[np.random.randint(0, len(col2))][0]))  # Plot the simulation of all lines
                             graph_area.legend()
     if sat == 'Auger':
         for cs_index, cs in enumerate(ploted_cs):
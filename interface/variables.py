@@ -227,6 +227,26 @@ type_var = None
 """
 Variable to know which type of profile we want to simulate fro each line
 """
+# Variable to know which Voigt backend to use (exact Faddeeva function or pseudo-Voigt)
+voigt_method = None
+"""
+Variable to know which Voigt backend to use (exact Faddeeva function or pseudo-Voigt)
+"""
+# Variable to know how the line profiles are evaluated (exact over the full grid, truncated to a window around each line or binned convolution)
+profile_mode = None
+"""
+Variable to know how the line profiles are evaluated (exact over the full grid, truncated to a window around each line or binned convolution)
+"""
+# Variable to hold the maximum fraction of each line area that can be left out when the profiles are truncated
+profile_tail_tol = None
+"""
+Variable to hold the maximum fraction of each line area that can be left out when the profiles are truncated
+"""
+# Variable to hold the number of starting points of the multi-start fit
+multistart_count = None
+"""
+Variable to hold the number of starting points of the multi-start fit
+"""
 # Variable to know which type of exiting mechanism we want to consider in the simulation (currently not implemented)
 exc_mech_var = None
 """
@@ -0,0 +1,69 @@
+"""
+Benchmark of the Voigt profile backends on production sized line sets.
+Compares the original per-line loop with the batched engine using the exact and pseudo-Voigt backends.
+The batched exact path evaluates the same profile values as the loop, only without the Python loop over the lines,
+so it is not faster: the time is spent in the Faddeeva function. The Convolution mode and the Pseudo backend are the fast options.
+
+Usage: python profileBenchmark.py [number of lines] [number of points]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from simulation.profiles import V, voigt_profile
+from simulation.profileEngine import flatten_lines, batched_profile, window_halfwidths, windowed_profile, convolved_profile, truncation_bound
+
+
+# Production sized defaults (heavy element satellite + shake-up set on a fine grid)
+n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+rng = np.random.default_rng(0)
+
+xfinal = np.linspace(8000, 9000, n_points)
+x = [list(rng.uniform(8000, 9000, n_lines // 10)) for _ in range(10)]
+y = [list(rng.uniform(0, 1, len(k))) for k in x]
+w = [list(rng.uniform(0.5, 5, len(k))) for k in x]
+res = 1.0
+
+energies, intens, widths, segments = flatten_lines(x, y, w)
+
+print("Lines: " + str(len(energies)) + "; Points: " + str(n_points))
+
+# The per-line loop is timed on a subset and extrapolated to the full line count
+n_loop = min(len(energies), 2000)
+start = time.perf_counter()
+for i in range(n_loop):
+    V(xfinal, energies[i], intens[i], res, widths[i])
+loop_time = (time.perf_counter() - start) * len(energies) / n_loop
+print("Per-line loop (exact): " + "{:.3f}".format(loop_time) + " s (extrapolated from " + str(n_loop) + " lines)")
+
+reference = None
+for method in ['Exact', 'Pseudo']:
+    start = time.perf_counter()
+    yseg = batched_profile(voigt_profile(method), xfinal, energies, intens, widths, segments, len(x), res)
+    elapsed = time.perf_counter() - start
+
+    if reference is None:
+        reference = yseg
+
+    error = np.max(np.abs(yseg - reference)) / np.max(np.abs(reference))
+    print("Batched " + method + ": " + "{:.3f}".format(elapsed) + " s; " + "{:.1f}".format(loop_time / elapsed) + "x the speed of the loop; max relative error " + "{:.2e}".format(error))
+
+# The truncated and convolution modes with the exact backend, for reference
+start = time.perf_counter()
+yseg = windowed_profile(V, xfinal, energies, intens, widths, segments, len(x), res, window_halfwidths('Voigt', res, widths, 1E-3))
+elapsed = time.perf_counter() - start
+error = np.max(np.abs(yseg - reference)) / np.max(np.abs(reference))
+bound = truncation_bound('Voigt', res, widths, intens, 1E-3) / np.sum(intens)
+print("Truncated Exact (lines cut at 1e-3 of their peak): " + "{:.3f}".format(elapsed) + " s; " + "{:.1f}".format(loop_time / elapsed) + "x the speed of the loop; max relative error " + "{:.2e}".format(error) + "; area left out below " + "{:.2e}".format(bound))
+
+start = time.perf_counter()
+yseg = convolved_profile(V, 'Voigt', xfinal, energies, intens, widths, segments, len(x), res)
+elapsed = time.perf_counter() - start
+error = np.max(np.abs(yseg - reference)) / np.max(np.abs(reference))
+print("Convolution Exact: " + "{:.3f}".format(elapsed) + " s; " + "{:.1f}".format(loop_time / elapsed) + "x the speed of the loop; max relative error " + "{:.2e}".format(error))
+
+print("The exact profiles are no faster than the per-line loop, use the Convolution mode or the Pseudo backend for speed")
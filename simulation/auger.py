@@ -12,9 +12,8 @@ from simulation.shake import calculateTotalShake
 
 from simulation.mults import get_cascadeBoost
 
-from data.definitions import Line
+from data.definitions import Line, LineTable
 
-from typing import List
 
 #GUI Imports for warnings
 from tkinter import messagebox
@@ -28,7 +27,7 @@ from matplotlib.pyplot import Axes
 # ---------------------------------------------------------------------- #
 
 
-def stick_auger(graph_area: Axes, aug_stick_val: List[Line], transition: str, bad_selection: int, cs: str = ''):
+def stick_auger(graph_area: Axes, aug_stick_val: LineTable, transition: str, bad_selection: int, cs: str = ''):
     """
     Function to check and send the data to the stick plotter function for auger transitions.
     
@@ -46,13 +45,13 @@ def stick_auger(graph_area: Axes, aug_stick_val: List[Line], transition: str, ba
     # Check if there is no data for the selected transition
     if not aug_stick_val:
         # Make a 0 vector to still have data to plot
-        aug_stick_val = [Line() for i in range(16)]
+        aug_stick_val = LineTable.from_lines([Line() for i in range(16)])
         # Show a warning that this transition has no data and add it to the bad selection count
         messagebox.showwarning("Wrong Transition", "Auger info. for " + transition + " is not Available")
         bad += 1
     
     # Extract the energy values
-    x = [row.energy for row in aug_stick_val]
+    x = aug_stick_val.energy.tolist()
     """
     Energy values for the selected transition
     """
@@ -63,12 +62,12 @@ def stick_auger(graph_area: Axes, aug_stick_val: List[Line], transition: str, ba
     
     
     # Plot the transition
-    y = [row.effectiveIntensity(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'auger') for row in aug_stick_val] # type: ignore
+    y = aug_stick_val.effectiveIntensities(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'auger').tolist() # type: ignore
     """
     Intensity values for the selected diagram or auger transition
     """
     
-    JJ = [row.jji for row in aug_stick_val]
+    JJ = aug_stick_val.jji.tolist()
     
     graph_area = stem_ploter(graph_area, x, y, JJ,
                 transition if cs == '' else cs + '' + transition,
@@ -77,7 +76,7 @@ def stick_auger(graph_area: Axes, aug_stick_val: List[Line], transition: str, ba
     return bad, graph_area
 
 
-def simu_auger(aug_sim_val: List[Line], beam: float, FWHM: float, shake_amps: dict = {}):
+def simu_auger(aug_sim_val: LineTable, beam: float, FWHM: float, shake_amps: dict = {}):
     """
     Function to organize the data to be sent to the plotter function for diagram transitions.
     
@@ -92,8 +91,8 @@ def simu_auger(aug_sim_val: List[Line], beam: float, FWHM: float, shake_amps: di
             w1: width values for every line possible within the selected transition
     """
     # Extract the energies, intensities and widths of the transition (different j and eigv)
-    x1 = [row.energy for row in aug_sim_val]
-    w1 = [row.totalWidth for row in aug_sim_val]
+    x1 = aug_sim_val.energy.tolist()
+    w1 = aug_sim_val.totalWidth.tolist()
     
     if guiVars.include_cascades.get(): # type: ignore
         if len(generalVars.augBoostMatrixDict) == 0:
@@ -108,7 +107,7 @@ def simu_auger(aug_sim_val: List[Line], beam: float, FWHM: float, shake_amps: di
     else:
         crossSection = 1.0
     
-    y1 = [row.effectiveIntensity(beam, FWHM, crossSection, guiVars.include_cascades.get(), 'auger', shake_amps = shake_amps) for row in aug_sim_val] # type: ignore
+    y1 = aug_sim_val.effectiveIntensities(beam, FWHM, crossSection, guiVars.include_cascades.get(), 'auger', shake_amps = shake_amps).tolist() # type: ignore
     
     return x1, y1, w1
 
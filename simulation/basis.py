@@ -0,0 +1,326 @@
+"""
+Module with the component basis cache used to speed up the fitting.
+The profiles are only recalculated when the resolution, the offsets or the simulated grid change,
+while the linear parameters (shake amplitudes, intensity offset and normalization) only reweight the cached spectra.
+"""
+
+from __future__ import annotations
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from data.definitions import ComponentStore
+
+from simulation.ycalc import y_calculator, apply_detector_efficiency
+from simulation.profiles import profile_derivative
+from simulation.profileEngine import flatten_lines, batched_profile
+
+from utils.experimental.detector import efficiency_model
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from tkinter import Toplevel
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                  COMPONENT BASIS CACHE                    #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Sum the satellite components of all transitions
+def component_totals(store: ComponentStore) -> npt.NDArray[np.float64]:
+    """
+    Function to sum each satellite component over all the transitions
+
+        Args:
+            store: sparse store with the simulated satellite components
+
+        Returns:
+            array with the summed values of each component (components x points)
+    """
+    totals = np.zeros(store.shape[1:])
+    for (t, c), (lo, hi, values) in store.data.items():
+        totals[c, lo:hi] += values
+
+    return totals
+
+
+class ComponentBasis():
+    """
+    Class to cache the simulated spectra of a fit, split into the diagram spectrum and the spectrum of each satellite component.
+    The line intensities are affine in the shake amplitudes, so each component is stored for all amplitudes at 1 and at 0
+    and any other amplitudes are a weighted sum of the two. The diagram lines do not depend on the fitted shake amplitudes.
+    """
+    def __init__(self, max_cached: int = 8):
+        """
+        Args:
+            max_cached: maximum number of (resolution, offsets, grid) bases to keep, the finite difference steps of the offsets alternate between a few
+        """
+        self.max_cached = max_cached
+        self.cache: Dict[tuple, dict] = {}
+        self.lines: Tuple[tuple, tuple] | None = None
+        """
+        Line lists simulated with all the fitted shake amplitudes at 1 and at 0
+        """
+
+    # Simulate the line lists for the amplitude extremes
+    def build_lines(self, shake_amps: dict):
+        """
+        Function to simulate the line lists with all the fitted shake amplitudes at 1 and at 0.
+        The energies and widths of the lines do not depend on the amplitudes, only the intensities
+
+            Args:
+                shake_amps: dictionary with the fitted shake amplitudes
+        """
+        # The preprocessors import the plotting modules, so they are only imported when the amplitudes are fitted
+        from simulation.preprocessors import process_simulation, process_Msimulation
+
+        if guiVars.choice_var.get()[:2] == "M_": # type: ignore
+            process = process_Msimulation
+        else:
+            process = process_simulation
+
+        lines1 = process({key: 1.0 for key in shake_amps}, False)[:6]
+        lines0 = process({key: 0.0 for key in shake_amps}, False)[:6]
+
+        self.lines = (lines1, lines0)
+
+    # Get the basis spectra for a resolution, offsets and grid
+    def basis(self, sim: Toplevel, sat: str, peak: str, xfinal: npt.NDArray[np.float64],
+              x: List[List[float]], y: List[List[float]], w: List[List[float]],
+              xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+              res: float, energy_values: List[float], efficiency_values: List[float],
+              enoffset: float, sat_enoffset: float, shkoff_enoffset: float, shkup_enoffset: float) -> dict:
+        """
+        Function to get the cached basis spectra, simulating the profiles only if the resolution, offsets or grid changed
+
+            Args:
+                same as y_calculator
+
+            Returns:
+                dictionary with the diagram spectra (ydiag, yfinal), the satellite components for the amplitudes at 1 (S1, store1)
+                and at 0 (S0, store0), without the detector efficiency weights
+        """
+        grid = np.ascontiguousarray(xfinal, dtype=np.float64)
+        key = (sat, peak, float(res), float(enoffset), float(sat_enoffset), float(shkoff_enoffset), float(shkup_enoffset), len(grid), hash(grid.tobytes()))
+
+        if key in self.cache:
+            return self.cache[key]
+
+        if self.lines is not None:
+            x, y, w, xs, ys, ws = self.lines[0]
+
+        _, ydiag, _, _, _, yfinal, store1 = y_calculator(sim, sat, peak, grid, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                                                         enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, apply_efficiency=False)
+        entry = {'ydiag': ydiag, 'yfinal': yfinal, 'S1': component_totals(store1), 'store1': store1, 'S0': None, 'store0': None}
+
+        if self.lines is not None and 'Satellites' in sat:
+            x, y, w, xs, ys, ws = self.lines[1]
+            _, _, _, _, _, _, store0 = y_calculator(sim, 'Satellites', peak, grid, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                                                    enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, apply_efficiency=False)
+            entry['S0'] = component_totals(store0)
+            entry['store0'] = store0
+
+        if len(self.cache) >= self.max_cached:
+            self.cache.pop(next(iter(self.cache)))
+        self.cache[key] = entry
+
+        return entry
+
+    # Calculate the simulated values from the basis
+    def evaluate(self, sim: Toplevel, sat: str, peak: str, xfinal: npt.NDArray[np.float64],
+                 x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                 xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                 res: float, energy_values: List[float], efficiency_values: List[float],
+                 enoffset: float, sat_enoffset: float, shkoff_enoffset: float, shkup_enoffset: float,
+                 shake_amps: dict = {}) -> \
+                    Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64],
+                        npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64],
+                        ComponentStore]:
+        """
+        Function to calculate the simulated intensities as y_calculator does, reusing the cached profiles when possible
+
+            Args:
+                same as y_calculator, x, y, w, xs, ys, ws are ignored when shake amplitudes are fitted
+                shake_amps: dictionary with the fitted shake amplitudes (empty if they are not fitted)
+
+            Returns:
+                same as y_calculator
+        """
+        if len(shake_amps) > 0 and self.lines is None:
+            self.build_lines(shake_amps)
+
+        entry = self.basis(sim, sat, peak, xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                           enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
+
+        n_labels = len(generalVars.label1)
+
+        generalVars.ydiagtot = entry['ydiag']
+        generalVars.yfinal = entry['yfinal']
+
+        if entry['S0'] is None:
+            comps = entry['S1']
+            generalVars.yfinals = ComponentStore(*entry['store1'].shape)
+            generalVars.yfinals.data = dict(entry['store1'].data)
+        else:
+            # The shake-off and shake-up lines of a label are multiplied by both amplitudes of that label
+            label_amps = np.array([shake_amps.get('shake_amp_' + label, 1.0) * shake_amps.get('shakeup_amp_' + label, 1.0) for label in generalVars.label1])
+            coeffs = np.concatenate((label_amps, label_amps))
+
+            comps = entry['S0'] + coeffs[:, np.newaxis] * (entry['S1'] - entry['S0'])
+
+            store0: ComponentStore = entry['store0']
+            store1: ComponentStore = entry['store1']
+            generalVars.yfinals = ComponentStore(*store1.shape)
+            for (t, c) in set(store0.data) | set(store1.data):
+                row0 = store0.row(t, c)
+                generalVars.yfinals.set(t, c, row0 + coeffs[c] * (store1.row(t, c) - row0))
+
+        generalVars.yshkofftot = comps[:n_labels].sum(axis=0)
+        generalVars.yshkuptot = comps[n_labels:].sum(axis=0)
+        generalVars.ysattot = np.add(generalVars.yshkofftot, generalVars.yshkuptot)
+        generalVars.ytot = np.add(generalVars.ydiagtot, generalVars.ysattot)
+
+        apply_detector_efficiency(energy_values, efficiency_values, xfinal, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
+
+        return generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+                generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals
+
+    # Calculate the derivatives of the simulated lines with respect to their energy and the resolution
+    def line_derivatives(self, sat: str, peak: str, xfinal: npt.NDArray[np.float64],
+                         x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                         xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                         res: float, enoffset: float, comp_offsets: npt.NDArray[np.float64]) -> dict:
+        """
+        Function to calculate the summed derivatives of the diagram lines and of each satellite component,
+        with respect to the line energies and to the resolution. The derivatives are always calculated with the exact batched profiles
+
+            Args:
+                sat, peak, xfinal, x, y, w, xs, ys, ws, res, enoffset: same as y_calculator
+                comp_offsets: energy offset of each satellite component
+
+            Returns:
+                dictionary with the energy and resolution derivatives of the diagram lines (dE_diag, dres_diag)
+                and of each satellite component (dE, dres, components x points)
+        """
+        d_energy = profile_derivative(peak, 'energy')
+        d_res = profile_derivative(peak, 'res')
+
+        n_comps = len(comp_offsets)
+        derivs = {'dE_diag': np.zeros(len(xfinal)), 'dres_diag': np.zeros(len(xfinal)),
+                  'dE': np.zeros((n_comps, len(xfinal))), 'dres': np.zeros((n_comps, len(xfinal)))}
+
+        if 'Diagram' in sat or 'Auger' in sat:
+            energies, intens, widths, segments = flatten_lines(x, y, w, enoffset)
+            segments = np.zeros(len(energies), dtype=np.int64)
+            derivs['dE_diag'] = batched_profile(d_energy, xfinal, energies, intens, widths, segments, 1, res)[0]
+            derivs['dres_diag'] = batched_profile(d_res, xfinal, energies, intens, widths, segments, 1, res)[0]
+
+        if 'Satellites' in sat:
+            # Each satellite component of each transition is one segment (j * n_comps + l), summed over the transitions
+            xs_flat: List[List[float]] = [[] for _ in range(len(xs) * n_comps)]
+            ys_flat: List[List[float]] = [[] for _ in range(len(xs) * n_comps)]
+            ws_flat: List[List[float]] = [[] for _ in range(len(xs) * n_comps)]
+            for j, k in enumerate(ys):
+                for l, m in enumerate(k):
+                    xs_flat[j * n_comps + l] = xs[j][l]
+                    ys_flat[j * n_comps + l] = m
+                    ws_flat[j * n_comps + l] = ws[j][l]
+
+            energies, intens, widths, segments = flatten_lines(xs_flat, ys_flat, ws_flat, np.tile(comp_offsets, len(xs)))
+            shape = (len(xs), n_comps, len(xfinal))
+            derivs['dE'] = batched_profile(d_energy, xfinal, energies, intens, widths, segments, len(xs) * n_comps, res).reshape(shape).sum(axis=0)
+            derivs['dres'] = batched_profile(d_res, xfinal, energies, intens, widths, segments, len(xs) * n_comps, res).reshape(shape).sum(axis=0)
+
+        return derivs
+
+    # Calculate the derivatives of the total simulated spectrum
+    def derivatives(self, sim: Toplevel, sat: str, peak: str, xfinal: npt.NDArray[np.float64],
+                    x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                    xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                    res: float, energy_values: List[float], efficiency_values: List[float],
+                    enoffset: float, sat_enoffset: float, shkoff_enoffset: float, shkup_enoffset: float,
+                    shake_amps: dict = {}) -> Dict[str, npt.NDArray[np.float64]]:
+        """
+        Function to calculate the analytic derivatives of the total simulated spectrum (ytot) with respect to the fit parameters
+        that enter the simulated lines: the energy offsets, the resolution and the shake amplitudes
+
+            Args:
+                same as evaluate
+
+            Returns:
+                dictionary with the derivative of ytot for each of the x values, keyed by the fit parameter name
+        """
+        if len(shake_amps) > 0 and self.lines is None:
+            self.build_lines(shake_amps)
+
+        entry = self.basis(sim, sat, peak, xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                           enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
+
+        n_labels = len(generalVars.label1)
+
+        # Energy offset of each satellite component, shake-off components come first and shake-up after
+        if guiVars.separate_offsets.get(): # type: ignore
+            comp_offsets = np.array([enoffset + shkoff_enoffset] * n_labels + [enoffset + shkup_enoffset] * n_labels)
+        else:
+            comp_offsets = np.full(2 * n_labels, enoffset + sat_enoffset)
+
+        # The line derivatives are also affine in the shake amplitudes, so they are cached for the amplitudes at 1 and at 0
+        if 'derivs1' not in entry:
+            lines1 = self.lines[0] if self.lines is not None else (x, y, w, xs, ys, ws)
+            entry['derivs1'] = self.line_derivatives(sat, peak, xfinal, *lines1, res, enoffset, comp_offsets)
+            if entry['S0'] is not None:
+                entry['derivs0'] = self.line_derivatives('Satellites', peak, xfinal, *self.lines[1], res, enoffset, comp_offsets) # type: ignore
+
+        derivs1 = entry['derivs1']
+        label_amps = np.array([shake_amps.get('shake_amp_' + label, 1.0) * shake_amps.get('shakeup_amp_' + label, 1.0) for label in generalVars.label1])
+        coeffs = np.concatenate((label_amps, label_amps))
+
+        if entry['S0'] is None:
+            comps = entry['S1']
+            dE = derivs1['dE']
+            dres = derivs1['dres']
+        else:
+            derivs0 = entry['derivs0']
+            comps = entry['S0'] + coeffs[:, np.newaxis] * (entry['S1'] - entry['S0'])
+            dE = derivs0['dE'] + coeffs[:, np.newaxis] * (derivs1['dE'] - derivs0['dE'])
+            dres = derivs0['dres'] + coeffs[:, np.newaxis] * (derivs1['dres'] - derivs0['dres'])
+
+        dE_shkoff = dE[:n_labels].sum(axis=0)
+        dE_shkup = dE[n_labels:].sum(axis=0)
+
+        raw = {'xoff': derivs1['dE_diag'] + dE_shkoff + dE_shkup,
+               'sat_xoff': dE_shkoff + dE_shkup,
+               'shkoff_xoff': dE_shkoff,
+               'shkup_xoff': dE_shkup,
+               'res': derivs1['dres_diag'] + dres.sum(axis=0)}
+
+        # The amplitudes multiply the shake-off and shake-up components of their label
+        for key in shake_amps:
+            label = key.split('_amp_')[1]
+            other = 'shakeup_amp_' + label if key.startswith('shake_amp_') else 'shake_amp_' + label
+            index = generalVars.label1.index(label)
+            if entry['S0'] is None:
+                raw[key] = np.zeros(len(xfinal))
+            else:
+                dS = entry['S1'] - entry['S0']
+                raw[key] = shake_amps.get(other, 1.0) * (dS[index] + dS[index + n_labels])
+
+        # The total spectrum is weighted by the efficiency at the main offset, which also moves with it
+        if guiVars.effic_var.get() != 'No': # type: ignore
+            model = efficiency_model(energy_values, efficiency_values)
+            effic = model.evaluate(xfinal, enoffset)
+            step = 1E-6 * max(1.0, abs(float(xfinal[-1] - xfinal[0])))
+            d_effic = (model.evaluate(xfinal, enoffset + step) - model.evaluate(xfinal, enoffset - step)) / (2 * step)
+
+            ytot_raw = entry['ydiag'] + comps.sum(axis=0)
+            for key in raw:
+                raw[key] = raw[key] * effic
+            raw['xoff'] = raw['xoff'] + ytot_raw * d_effic
+
+        return raw
+
@@ -0,0 +1,255 @@
+"""
+Module with the batch fit of a directory of experimental spectra.
+A fit configuration saved from the interface is applied in worker processes that share the parsed rates,
+and each worker fits a contiguous run of the sorted spectra, starting each fit from the result of the previous spectrum.
+"""
+
+from __future__ import annotations
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from simulation.multistart import general_snapshot, init_worker, worker_context
+from simulation.headless import SimulationConfig
+from simulation.preprocessors import process_simulation, process_Msimulation
+from simulation.bounds import getBoundedExp
+from simulation.fitting import initializeFitParameters, minimize_lmfit, func2min
+from simulation.varpro import varpro_fit
+
+from utils.experimental.detector import initialize_detectorEfficiency
+from utils.experimental.expSpectra import extractExpVals
+from utils.misc.fileIO import loadExp, exportFit, exportBatchTable
+from utils.misc.progress import ProgressReporter, NullProgress
+
+from lmfit import fit_report
+
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import glob
+import json
+import os
+from pathlib import Path
+from datetime import datetime
+
+from typing import Dict, List
+
+import numpy as np
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                 SAVED FIT CONFIGURATION                   #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Save the current simulation and fit configuration
+def save_configuration(file_name: str | Path):
+    """
+    Function to save the interface values, the selected transitions and the extra fitting components to a json file
+
+        Args:
+            file_name: path of the configuration file
+    """
+    SimulationConfig.from_interface().save(file_name)
+
+# Read a saved configuration
+def load_configuration(file_name: str | Path) -> dict:
+    """
+    Function to read a configuration saved with save_configuration
+
+        Args:
+            file_name: path of the configuration file
+
+        Returns:
+            dictionary with the saved configuration
+    """
+    with open(file_name, 'r') as file:
+        return json.load(file)
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                        BATCH FIT                          #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Fit methods that can be used in a batch fit
+batch_methods = ['LMFit', 'VarPro']
+"""
+Fit methods of the saved configurations that the batch fit can run in its workers
+"""
+
+# List the spectra to fit
+def find_spectra(spectra: str | Path) -> List[str]:
+    """
+    Function to list the spectra files to fit, sorted by name so that neighbouring files are fitted one after the other
+
+        Args:
+            spectra: directory with the spectra (all the csv and txt files are used) or glob pattern of the files
+
+        Returns:
+            sorted list with the paths of the spectra files
+    """
+    if os.path.isdir(spectra):
+        files = glob.glob(os.path.join(spectra, '*.csv')) + glob.glob(os.path.join(spectra, '*.txt'))
+    else:
+        files = glob.glob(str(spectra))
+
+    return sorted(files)
+
+# Fit a single spectrum
+def fit_spectrum(file_name: str, start: Dict[str, float] | None, lines: tuple,
+                 energy_values: List[float], efficiency_values: List[float], output_dir: Path) -> dict:
+    """
+    Function to fit one experimental spectrum with the configuration of the worker, as execute_autofit does without the interface
+
+        Args:
+            file_name: path of the spectrum file
+            start: fitted parameters of the previous spectrum to start from (interface values if None)
+            lines: x, y, w, xs, ys, ws lists of the simulated lines
+            energy_values: energy values read from the detector efficiency data
+            efficiency_values: efficiency values read from the detector efficiency data
+            output_dir: directory where the fit report is saved
+
+        Returns:
+            dictionary with the spectrum file, the fit statistics and the fitted values and errors of each parameter
+    """
+    x, y, w, xs, ys, ws = lines
+
+    sat = guiVars.satelite_var.get() # type: ignore
+    peak = guiVars.type_var.get() # type: ignore
+    num_of_points = guiVars.number_points.get() # type: ignore
+
+    enoffset = start['xoff'] if start is not None else guiVars.energy_offset.get() # type: ignore
+    sat_enoffset = start.get('sat_xoff', 0.0) if start is not None else guiVars.sat_energy_offset.get() # type: ignore
+    shkoff_enoffset = start.get('shkoff_xoff', 0.0) if start is not None else guiVars.shkoff_energy_offset.get() # type: ignore
+    shkup_enoffset = start.get('shkup_xoff', 0.0) if start is not None else guiVars.shkup_energy_offset.get() # type: ignore
+    y0 = start['yoff'] if start is not None else guiVars.yoffset.get() # type: ignore
+    res = start['res'] if start is not None else guiVars.exp_resolution.get() # type: ignore
+
+    # Read the spectrum and bind it to the configured bounds, the errors of a file that can not be read or parsed are raised as RuntimeError
+    try:
+        exp_spectrum = loadExp(file_name)
+        if len(exp_spectrum) == 0 or min(len(row) for row in exp_spectrum) < 2:
+            raise RuntimeError(file_name + " does not have an energy and an intensity column in every row")
+        xe, ye, sigma_exp = extractExpVals(exp_spectrum)
+    except (OSError, ValueError, csv.Error) as error:
+        raise RuntimeError(file_name + " could not be read: " + str(error)) from error
+    exp_x, exp_y, _ = getBoundedExp(xe, ye, sigma_exp, enoffset + max([sat_enoffset, shkoff_enoffset, shkup_enoffset]), num_of_points, guiVars.x_max.get(), guiVars.x_min.get()) # type: ignore
+
+    params = initializeFitParameters(exp_x, exp_y, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, y0, res)
+    # Warm start the remaining parameters from the previous spectrum
+    if start is not None:
+        for name in params:
+            if name in start:
+                params[name].value = min(max(start[name], params[name].min), params[name].max)
+
+    fit_args = (exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+
+    # The variable projection only minimizes the nonlinear parameters and solves the linear ones
+    try:
+        if guiVars.autofitvar.get() == 'VarPro': # type: ignore
+            result = varpro_fit(params, None, *fit_args) # type: ignore
+        else:
+            result = minimize_lmfit(params, None, fit_args)
+    except ValueError as error:
+        # lmfit raises a ValueError when the model of this spectrum gives invalid values
+        raise RuntimeError("The fit of " + file_name + " failed: " + str(error)) from error
+
+    # Simulate the fitted spectrum for the intensity multiplier of the report
+    func2min(result.params, None, *fit_args) # type: ignore
+    exportFit(datetime.now(), fit_report(result), output_dir / (Path(file_name).stem + "_fit.txt"))
+
+    row = {'file': file_name, 'success': result.success, 'nfev': result.nfev, 'chisqr': result.chisqr, 'redchi': result.redchi}
+    for name in result.params: # type: ignore
+        row[name] = result.params[name].value # type: ignore
+        row[name + '_stderr'] = result.params[name].stderr # type: ignore
+
+    return row
+
+# Fit a contiguous run of spectra
+def fit_chunk(files: List[str], output_dir: Path) -> List[dict]:
+    """
+    Function to fit a run of spectra in a worker process, each fit starts from the result of the previous spectrum
+
+        Args:
+            files: paths of the spectra files, in order
+            output_dir: directory where the fit reports are saved
+
+        Returns:
+            list with the fit results of each spectrum, as returned by fit_spectrum
+    """
+    # The simulated lines only depend on the configuration, so they are the same for all the spectra
+    if guiVars.choice_var.get()[:2] == "M_": # type: ignore
+        x, y, w, xs, ys, ws, _ = process_Msimulation({}, False)
+    else:
+        x, y, w, xs, ys, ws, _ = process_simulation({}, False)
+
+    energy_values: List[float] = []
+    efficiency_values: List[float] = []
+    if guiVars.effic_var.get() != 'No': # type: ignore
+        energy_values, efficiency_values = initialize_detectorEfficiency(guiVars.effic_var.get()) # type: ignore
+
+    rows = []
+    start = None
+    for file_name in files:
+        try:
+            row = fit_spectrum(file_name, start, (x, y, w, xs, ys, ws), energy_values, efficiency_values, output_dir)
+            start = {name: row[name] for name in row if name not in ['file', 'success', 'nfev', 'chisqr', 'redchi'] and not name.endswith('_stderr')}
+        except RuntimeError as error:
+            # A bad spectrum (unreadable file, invalid values or a failed fit) should not stop the rest of the batch
+            row = {'file': file_name, 'success': False, 'error': repr(error)}
+        rows.append(row)
+
+    return rows
+
+# Fit all the spectra in parallel
+def batch_fit(spectra: str | Path, config: dict, output_dir: str | Path | None = None, workers: int | None = None,
+              progress: ProgressReporter | None = None) -> List[dict]:
+    """
+    Function to fit all the spectra in a directory with a saved configuration, using a process pool.
+    The sorted spectra are split into one contiguous run per worker, so each fit can start from its neighbour's result
+
+        Args:
+            spectra: directory with the spectra or glob pattern of the files
+            config: saved configuration, as returned by load_configuration
+            output_dir: directory where the fit reports and the parameter table are saved (Batch_Fit in the spectra directory if None)
+            workers: number of worker processes (number of cores if None)
+            progress: reporter of the fitted spectra, updated when each run of spectra finishes (nothing is reported if None)
+
+        Returns:
+            list with the fit results of each spectrum, also saved in the parameter table
+    """
+    if config['Z'] != generalVars.Z:
+        raise RuntimeError("The configuration was saved for Z = " + str(config['Z']) + " but the loaded element is Z = " + str(generalVars.Z))
+
+    # The spectra are fitted with lmfit in the workers, the multi-start and iminuit fits are not run in a batch
+    method = SimulationConfig.from_dict(config).get('autofitvar')
+    if method not in batch_methods:
+        raise RuntimeError("The batch fit only supports the " + " and ".join(batch_methods) + " fit methods, the configuration selects " + repr(method))
+
+    files = find_spectra(spectra)
+    if len(files) == 0:
+        raise RuntimeError("No spectra found in " + str(spectra))
+
+    if output_dir is None:
+        output_dir = Path(os.path.dirname(files[0])) / "Batch_Fit"
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    workers = min(workers if workers is not None else os.cpu_count() or 1, len(files))
+    progress = progress if progress is not None else NullProgress()
+
+    bounds = np.linspace(0, len(files), workers + 1).astype(int)
+    chunks = [files[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    rows = []
+    progress.report("Batch fit", 0, len(files))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(), initializer=init_worker, initargs=(general_snapshot(), config)) as pool:
+        for chunk_rows in pool.map(fit_chunk, chunks, [output_dir] * len(chunks)):
+            rows += chunk_rows
+            progress.report("Batch fit", len(rows), len(files))
+
+    exportBatchTable(output_dir / "batch_fit_parameters.csv", rows)
+
+    return rows
@@ -0,0 +1,236 @@
+"""
+Module with the beam energy scan mode.
+The line selection, energies, widths and cascade boosts do not depend on the beam energy, so they are calculated once
+and the overlaps of all the beam energies are calculated as arrays. The profile of each line is also calculated once
+and weighted by its intensity at each beam energy, giving a (beam energies x simulated energies) intensity map.
+"""
+
+from __future__ import annotations
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from simulation.multistart import general_snapshot, init_worker, worker_context
+from simulation.bounds import calculate_xfinal
+from simulation.profiles import G, L, voigt_profile
+from simulation.profileEngine import max_chunk_elements, window_halfwidths, windowed_profile, convolved_profile
+
+from utils.experimental.detector import initialize_detectorEfficiency, efficiency_model
+from utils.misc.progress import ProgressReporter, NullProgress
+
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                   BEAM ENERGY SCAN                        #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Simulate the line lists for an array of beam energies
+def scan_lines(beams: npt.NDArray[np.float64]) -> tuple:
+    """
+    Function to get the line lists of the selected transitions for an array of beam energies.
+    The energies and widths are the same as in a normal simulation, while each intensity is an array with one value per beam energy
+
+        Args:
+            beams: array with the beam energies of the scan
+
+        Returns:
+            x, y, w, xs, ys, ws lists as returned by process_simulation
+    """
+    # The preprocessors import the plotting modules, so the intensity maps can be calculated without them
+    from simulation.preprocessors import process_simulation, process_Msimulation
+
+    if guiVars.choice_var.get()[:2] == "M_": # type: ignore
+        return process_Msimulation({}, False, beams)[:6]
+    else:
+        return process_simulation({}, False, beams)[:6]
+
+# Flatten the line lists into arrays with the intensities of each line at each beam energy
+def flatten_scan_lines(lines: tuple, n_beams: int) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Function to flatten the simulated line lists into flat arrays, applying the energy offsets selected in the interface
+    to the diagram (or auger) lines and to each shake-off and shake-up component, as y_calculator does
+
+        Args:
+            lines: x, y, w, xs, ys, ws lists from scan_lines
+            n_beams: number of beam energies in the scan
+
+        Returns:
+            energies: flat array with the offset energies of all lines
+            widths: flat array with the natural widths of all lines
+            intens: array with the intensity of each line (rows) at each beam energy (columns)
+    """
+    x, y, w, xs, ys, ws = lines
+
+    sat = guiVars.satelite_var.get() # type: ignore
+    enoffset = guiVars.energy_offset.get() # type: ignore
+
+    energies: List[float] = []
+    widths: List[float] = []
+    intens: List[npt.NDArray[np.float64]] = []
+
+    def add_lines(x1: List[float], y1: list, w1: List[float], offset: float):
+        energies.extend(np.asarray(x1, dtype=np.float64) + offset)
+        widths.extend(w1)
+        intens.extend(np.broadcast_to(np.asarray(value, dtype=np.float64), n_beams) for value in y1)
+
+    if 'Diagram' in sat or 'Auger' in sat:
+        for j in range(len(y)):
+            add_lines(x[j], y[j], w[j], enoffset)
+
+    if 'Satellites' in sat:
+        n_labels = len(generalVars.label1)
+        for j in range(len(ys)):
+            for l in range(len(ys[j])):
+                # Shake-off components come first and shake-up after, as in y_calculator
+                if guiVars.separate_offsets.get(): # type: ignore
+                    offset = enoffset + (guiVars.shkoff_energy_offset.get() if l < n_labels else guiVars.shkup_energy_offset.get()) # type: ignore
+                else:
+                    offset = enoffset + guiVars.sat_energy_offset.get() # type: ignore
+                add_lines(xs[j][l], ys[j][l], ws[j][l], offset)
+
+    if len(intens) == 0:
+        return np.zeros(0), np.zeros(0), np.zeros((0, n_beams))
+
+    return np.array(energies), np.array(widths, dtype=np.float64), np.array(intens)
+
+# Calculate the intensity map of a set of beam energies
+def scan_map(lines: tuple, n_beams: int, xfinal: npt.NDArray[np.float64],
+             energy_values: List[float], efficiency_values: List[float],
+             progress: ProgressReporter | None = None) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the simulated intensities for each beam energy, with the profile evaluation mode selected in the interface.
+    In the exact and truncated modes the profile of each line is calculated once, in memory-bounded chunks, and the map is the product
+    of the (beam energies x lines) intensities with the (lines x simulated energies) profiles.
+    In the convolution mode each beam energy is one segment of the binned convolution, with the line intensities of that beam energy
+
+        Args:
+            lines: x, y, w, xs, ys, ws lists from scan_lines
+            n_beams: number of beam energies in the scan
+            xfinal: simulated energy values
+            energy_values: energy values read from the detector efficiency data
+            efficiency_values: efficiency values read from the detector efficiency data
+            progress: progress reporter for the profile chunks (no reporting if None)
+
+        Returns:
+            array with the total simulated intensity (columns) for each beam energy (rows)
+    """
+    if progress is None:
+        progress = NullProgress()
+
+    energies, widths, intens = flatten_scan_lines(lines, n_beams)
+
+    # Profile and evaluation mode selected in the interface, as in y_calculator
+    peak = guiVars.type_var.get() # type: ignore
+    if peak == 'Lorentzian':
+        profile = L
+    elif peak == 'Gaussian':
+        profile = G
+    else:
+        profile = voigt_profile(guiVars.voigt_method.get()) # type: ignore
+
+    profile_mode = guiVars.profile_mode.get() # type: ignore
+    res = guiVars.exp_resolution.get() # type: ignore
+
+    T = np.asarray(xfinal, dtype=np.float64)
+    n_lines = len(energies)
+
+    if profile_mode == 'Convolution':
+        # The lines are repeated for each beam energy, which is the segment they are summed into
+        intensity_map = convolved_profile(profile, peak, T, np.tile(energies, n_beams), intens.T.ravel(), np.tile(widths, n_beams),
+                                          np.repeat(np.arange(n_beams), n_lines), n_beams, res,
+                                          callback=lambda done, total: progress.report('Beam energy scan', done, total)) # type: ignore
+    else:
+        intensity_map = np.zeros((n_beams, len(T)))
+        if profile_mode == 'Truncated':
+            halfwidths = window_halfwidths(peak, res, widths, guiVars.profile_tail_tol.get()) # type: ignore
+
+        chunk = max(1, max_chunk_elements // max(len(T), 1))
+        for start in range(0, n_lines, chunk):
+            stop = min(start + chunk, n_lines)
+
+            # Unit intensity profiles of the lines in the chunk, each line is its own segment
+            if profile_mode == 'Truncated':
+                block = windowed_profile(profile, T, energies[start:stop], np.ones(stop - start), widths[start:stop],
+                                         np.arange(stop - start), stop - start, res, halfwidths[start:stop])
+            else:
+                block = profile(T[np.newaxis, :], energies[start:stop, np.newaxis], np.ones((stop - start, 1)), res, widths[start:stop, np.newaxis])
+            intensity_map += intens[start:stop].T @ block
+
+            progress.report('Beam energy scan', stop, n_lines)
+
+    # The total intensity is weighted by the efficiency at the main offset, as in y_calculator
+    if guiVars.effic_var.get() != 'No': # type: ignore
+        intensity_map *= efficiency_model(energy_values, efficiency_values).evaluate(xfinal, guiVars.energy_offset.get()) # type: ignore
+
+    return intensity_map
+
+# Calculate the intensity map of a chunk of beam energies in a worker process
+def scan_chunk(beams: npt.NDArray[np.float64], xfinal: npt.NDArray[np.float64],
+               energy_values: List[float], efficiency_values: List[float]) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the intensity map of a chunk of beam energies, used by the worker processes
+
+        Args:
+            beams: array with the beam energies of the chunk
+            remaining arguments: same as scan_map
+
+        Returns:
+            array with the total simulated intensity for each beam energy of the chunk
+    """
+    return scan_map(scan_lines(beams), len(beams), xfinal, energy_values, efficiency_values)
+
+# Simulate the spectra for an array of beam energies
+def beam_energy_scan(beams: List[float] | npt.NDArray[np.float64], workers: int = 1,
+                     progress: ProgressReporter | None = None) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Function to simulate the spectrum of the selected transitions for each beam energy, with the other values selected in the interface.
+    With more than one worker the beam energies are split into contiguous chunks that are simulated in parallel processes
+
+        Args:
+            beams: beam energies of the scan (all must be positive, a beam energy <= 0 disables the overlap)
+            workers: number of worker processes
+            progress: progress reporter for the profile chunks of a single process scan (no reporting if None)
+
+        Returns:
+            xfinal: simulated energy values, the same for all beam energies
+            intensity_map: array with the total simulated intensity (columns) for each beam energy (rows)
+    """
+    # The headless configuration imports the plotting modules through the fitting, it is only needed to start the worker processes
+    from simulation.headless import SimulationConfig
+
+    beams = np.asarray(beams, dtype=np.float64)
+    if len(beams) == 0 or np.any(beams <= 0.0):
+        raise RuntimeError("The beam energies of the scan must be positive")
+
+    workers = max(1, min(workers, len(beams)))
+
+    # The line energies and widths do not depend on the beam, so the grid is calculated from any of the beam energies
+    lines = scan_lines(beams if workers == 1 else beams[:1])
+    x, _, w, xs, _, ws = lines
+    calculate_xfinal(guiVars.satelite_var.get(), x, w, xs, ws, guiVars.x_max.get(), guiVars.x_min.get(), guiVars.exp_resolution.get(), # type: ignore
+                     guiVars.energy_offset.get(), guiVars.sat_energy_offset.get(), guiVars.shkoff_energy_offset.get(), guiVars.shkup_energy_offset.get(), # type: ignore
+                     guiVars.number_points.get(), 0) # type: ignore
+    xfinal = np.array(generalVars.xfinal, dtype=np.float64)
+
+    energy_values: List[float] = []
+    efficiency_values: List[float] = []
+    if guiVars.effic_var.get() != 'No': # type: ignore
+        energy_values, efficiency_values = initialize_detectorEfficiency(guiVars.effic_var.get()) # type: ignore
+
+    if workers == 1:
+        return xfinal, scan_map(lines, len(beams), xfinal, energy_values, efficiency_values, progress)
+
+    chunks = np.array_split(beams, workers)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(), initializer=init_worker, initargs=(general_snapshot(), SimulationConfig.from_interface().to_dict())) as pool:
+        maps = list(pool.map(scan_chunk, chunks, [xfinal] * workers, [energy_values] * workers, [efficiency_values] * workers))
+
+    return xfinal, np.vstack(maps)
@@ -11,9 +11,8 @@ from simulation.mults import get_cascadeBoost
 
 from simulation.shake import calculateTotalShake
 
-from data.definitions import Line
+from data.definitions import Line, LineTable
 
-from typing import List
 
 #GUI Imports for warnings
 from tkinter import messagebox
@@ -26,7 +25,7 @@ from matplotlib.pyplot import Axes
 #                                                                        #
 # ---------------------------------------------------------------------- #
 
-def stick_diagram(graph_area: Axes, diag_stick_val: List[Line], transition: str, bad_selection: int, cs: str = ''):
+def stick_diagram(graph_area: Axes, diag_stick_val: LineTable, transition: str, bad_selection: int, cs: str = ''):
     """
     Function to check and send the data to the stick plotter function for diagram transitions.
     
@@ -44,13 +43,13 @@ def stick_diagram(graph_area: Axes, diag_stick_val: List[Line], transition: str,
     # Check if there is no data for the selected transition
     if not diag_stick_val:
         # Make a 0 vector to still have data to plot
-        diag_stick_val = [Line() for i in range(16)]
+        diag_stick_val = LineTable.from_lines([Line() for i in range(16)])
         # Show a warning that this transition has no data and add it to the bad selection count
         messagebox.showwarning("Wrong Transition", transition + " is not Available")
         bad += 1
     
     # Extract the energy values
-    x = [row.energy for row in diag_stick_val]
+    x = diag_stick_val.energy.tolist()
     """
     Energy values for the selected transition
     """
@@ -60,12 +59,12 @@ def stick_diagram(graph_area: Axes, diag_stick_val: List[Line], transition: str,
             get_cascadeBoost('diagram')
     
     # Plot the transition
-    y = [row.effectiveIntensity(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'diagram') for row in diag_stick_val] # type: ignore
+    y = diag_stick_val.effectiveIntensities(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'diagram').tolist() # type: ignore
     """
     Intensity values for the selected diagram or auger transition
     """
     
-    JJ = [row.jji for row in diag_stick_val]
+    JJ = diag_stick_val.jji.tolist()
     
     graph_area = stem_ploter(graph_area, x, y, JJ,
                              transition if cs == '' else cs + ' ' + transition,
@@ -74,7 +73,7 @@ def stick_diagram(graph_area: Axes, diag_stick_val: List[Line], transition: str,
     return bad, graph_area
 
 
-def simu_diagram(diag_sim_val: List[Line], beam: float, FWHM: float, shake_amps: dict = {}):
+def simu_diagram(diag_sim_val: LineTable, beam: float, FWHM: float, shake_amps: dict = {}):
     """
     Function to organize the data to be sent to the plotter function for diagram transitions.
     
@@ -89,8 +88,8 @@ def simu_diagram(diag_sim_val: List[Line], beam: float, FWHM: float, shake_amps:
             w1: width values for every line possible within the selected transition
     """
     # Extract the energies, intensities and widths of the transition (different j and eigv)
-    x1 = [row.energy for row in diag_sim_val]
-    w1 = [row.totalWidth for row in diag_sim_val]
+    x1 = diag_sim_val.energy.tolist()
+    w1 = diag_sim_val.totalWidth.tolist()
     
     if guiVars.include_cascades.get(): # type: ignore
         if len(generalVars.radBoostMatrixDict) == 0:
@@ -105,7 +104,7 @@ def simu_diagram(diag_sim_val: List[Line], beam: float, FWHM: float, shake_amps:
     else:
         crossSection = 1.0
     
-    y1 = [row.effectiveIntensity(beam, FWHM, crossSection, guiVars.include_cascades.get(), 'diagram', shake_amps = shake_amps) for row in diag_sim_val] # type: ignore
+    y1 = diag_sim_val.effectiveIntensities(beam, FWHM, crossSection, guiVars.include_cascades.get(), 'diagram', shake_amps = shake_amps).tolist() # type: ignore
     
     return x1, y1, w1
 
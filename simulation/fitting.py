@@ -14,10 +14,16 @@ from simulation.preprocessors import process_simulation, process_Msimulation
 import simulation.shake as shakes
 
 from simulation.ycalc import y_calculator, normalizer, add_fitting_components
+from simulation.basis import ComponentBasis
+from simulation.jacobian import has_analytic_jacobian, model_jacobian, nll_gradient
+from simulation.varpro import varpro_fit
+from simulation.multistart import multistart_fit, spread_report
 
 from utils.misc.fileIO import exportFit
+from utils.misc.progress import ProgressReporter, ConsoleProgress
 
 from datetime import datetime
+from pathlib import Path
 
 from scipy.interpolate import interp1d
 
@@ -602,7 +608,8 @@ def func2min(params: Parameters, sim: Toplevel,
              sat: str, peak: str,
              x: List[List[float]], y: List[List[float]], w: List[List[float]],
              xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
-             energy_values: List[float], efficiency_values: List[float]):
+             energy_values: List[float], efficiency_values: List[float],
+             progress: ProgressReporter | None = None, basis: ComponentBasis | None = None):
     """
     Function to be minimized in the fitting
         
@@ -622,6 +629,8 @@ def func2min(params: Parameters, sim: Toplevel,
             ws: natural width values for each satellite transition in each radiative transition to simulate
             energy_values: energy values read from the detector efficiency data
             efficiency_values: efficiency values read from the detector efficiency data
+            progress: progress reporter for the function evaluations (no reporting if None)
+            basis: cache of the simulated component spectra, the profiles are only recalculated when the resolution or offsets change (no caching if None)
             
         Returns:
             list with the differences between the simulated y values and the experimental intensities
@@ -629,9 +638,9 @@ def func2min(params: Parameters, sim: Toplevel,
     global totalEvals
     # Track the total function evaluations during the fitting
     totalEvals += 1
-    # Console feedback for long fits
-    # print('\r\x1b[K' + "Function evaluations: " + str(totalEvals), end='')
-    print("Function evaluations: " + str(totalEvals), end='')
+    # Feedback for long fits, throttled by the progress reporter
+    if progress is not None:
+        progress.report("Function evaluations", totalEvals, None)
     
     # Normalizer for the function to match the plotted values
     normalize = guiVars.normalizevar.get() # type: ignore
@@ -650,18 +659,6 @@ def func2min(params: Parameters, sim: Toplevel,
     res = params['res'].value
     ytot_max = params['ytot_max'].value
     
-    print(" (", end='')
-    print(xoff, end='')
-    print(" , ", end='')
-    print(sat_xoff, end='')
-    print(" , ", end='')
-    print(res, end='')
-    print(" , ", end='')
-    print(y0, end='')
-    print(" , ", end='')
-    print(ytot_max, end='')
-    print(")")
-    # print(") = ", end='')
     
     
     # Initialize the xfinal from which to interpolate
@@ -674,8 +671,6 @@ def func2min(params: Parameters, sim: Toplevel,
                 shake_amps[key] = params[key].value
             if 'shakeup_amp_' in key:
                 shake_amps[key] = params[key].value
-
-        print(shake_amps)
         
         # shake_pars = {}
         # for key in shakes.existing_shakeups:
@@ -711,15 +706,23 @@ def func2min(params: Parameters, sim: Toplevel,
                     
         #             return res
         
-        if guiVars.choice_var.get()[:2] == "M_": # type: ignore
-            x, y, w, xs, ys, ws, _ = process_Msimulation(shake_amps, False) ##  para vários estados de carga
-        else:
-            x, y, w, xs, ys, ws, _ = process_simulation(shake_amps, False) ## consideramos apenas o átomo
+        if basis is None:
+            if guiVars.choice_var.get()[:2] == "M_": # type: ignore
+                x, y, w, xs, ys, ws, _ = process_Msimulation(shake_amps, False) ##  para vários estados de carga
+            else:
+                x, y, w, xs, ys, ws, _ = process_simulation(shake_amps, False) ## consideramos apenas o átomo
+    else:
+        shake_amps = {}
     
     
     # Calculate the simulated values
-    generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
-        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, xoff, sat_xoff, shkoff_xoff, shkup_xoff)
+    if basis is None:
+        generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+            generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, xoff, sat_xoff, shkoff_xoff, shkup_xoff)
+    else:
+        # Only the shake amplitudes changed if the resolution and offsets are cached, then the components are just reweighted
+        generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+            generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = basis.evaluate(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, xoff, sat_xoff, shkoff_xoff, shkup_xoff, shake_amps)
     
     if len(generalVars.extra_fitting_functions) > 0:
         for key in generalVars.extra_fitting_functions:
@@ -772,12 +775,6 @@ def func2min(params: Parameters, sim: Toplevel,
             y_interp.append(f_interpolate(h)) ## para cada valor do energia experimental vai buscar o valor de intensidade da interpolação
             exp_y_f.append(exp_y[g])  ## para cada valor de energia experimmental vai buscar o seu valor de intensidade correspondente
     
-    if normalize == 'One':  ## soma dos desvios quadrados que depois pretendemos minimizar
-        print(sum(np.square(np.array(y_interp) - np.array(exp_y_f) / max(exp_y_f))))
-    else:
-        print(sum(np.square(np.array(y_interp) - np.array(exp_y_f))))
-
-    
     # Return the normalized function
     if normalize == 'One':
         return np.array(y_interp) - np.array(exp_y_f) / max(exp_y_f)
@@ -795,7 +792,8 @@ def func2min_minuit(params: tuple, name: tuple, sim: Toplevel,
              sat: str, peak: str,
              x: List[List[float]], y: List[List[float]], w: List[List[float]],
              xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
-             energy_values: List[float], efficiency_values: List[float]):
+             energy_values: List[float], efficiency_values: List[float],
+             progress: ProgressReporter | None = None, basis: ComponentBasis | None = None):
     """
     Function to be minimized in the fitting
         
@@ -817,6 +815,8 @@ def func2min_minuit(params: tuple, name: tuple, sim: Toplevel,
             ws: natural width values for each satellite transition in each radiative transition to simulate
             energy_values: energy values read from the detector efficiency data
             efficiency_values: efficiency values read from the detector efficiency data
+            progress: progress reporter for the function evaluations (no reporting if None)
+            basis: cache of the simulated component spectra, the profiles are only recalculated when the resolution or offsets change (no caching if None)
             
         Returns:
             list with the differences between the simulated y values and the experimental intensities
@@ -825,9 +825,9 @@ def func2min_minuit(params: tuple, name: tuple, sim: Toplevel,
     global totalEvals
     # Track the total function evaluations during the fitting
     totalEvals += 1
-    # Console feedback for long fits
-    # print('\r\x1b[K' + "Function evaluations: " + str(totalEvals), end='')
-    print("Function evaluations: " + str(totalEvals), end='')
+    # Feedback for long fits, throttled by the progress reporter
+    if progress is not None:
+        progress.report("Function evaluations", totalEvals, None)
     
     # Normalizer for the function to match the plotted values
     normalize = guiVars.normalizevar.get() # type: ignore
@@ -854,42 +854,36 @@ def func2min_minuit(params: tuple, name: tuple, sim: Toplevel,
     ind_ytot_max = name.index('ytot_max')
     ytot_max = params[ind_ytot_max]
     
-    print(" (", end='')
-    print(xoff, end='')
-    print(" , ", end='')
-    print(sat_xoff, end='')
-    print(" , ", end='')
-    print(res, end='')
-    print(" , ", end='')
-    print(y0, end='')
-    print(" , ", end='')
-    print(ytot_max, end='')
-    print(")")
-    # print(") = ", end='')
     
     # Initialize the xfinal from which to interpolate
     generalVars.xfinal = np.array(np.linspace(min(exp_x), max(exp_x), num=num_of_points))  ## está a criar uma matriz de numeros igualmente espaçados dentro daquele intervalo
     
     if guiVars.fit_shake_prob.get(): # type: ignore
         shake_amps = {}
-        for key in params:
+        for key in name:
             if 'shake_amp_' in key:
                 ind_key = name.index(key)
                 shake_amps[key] = params[ind_key]
             if 'shakeup_amp_' in key:
                 ind_key1 = name.index(key)
                 shake_amps[key] = params[ind_key1]
-
-        print(shake_amps)
         
-        if guiVars.choice_var.get()[:2] == "M_": # type: ignore
-            x, y, w, xs, ys, ws, _ = process_Msimulation(shake_amps, False) ##  para vários estados de carga
-        else:
-            x, y, w, xs, ys, ws, _ = process_simulation(shake_amps, False) ## consideramos apenas o átomo
+        if basis is None:
+            if guiVars.choice_var.get()[:2] == "M_": # type: ignore
+                x, y, w, xs, ys, ws, _ = process_Msimulation(shake_amps, False) ##  para vários estados de carga
+            else:
+                x, y, w, xs, ys, ws, _ = process_simulation(shake_amps, False) ## consideramos apenas o átomo
+    else:
+        shake_amps = {}
     
     # Calculate the simulated values
-    generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
-        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, xoff, sat_xoff, shkoff_xoff, shkup_xoff)
+    if basis is None:
+        generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+            generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, xoff, sat_xoff, shkoff_xoff, shkup_xoff)
+    else:
+        # Only the shake amplitudes changed if the resolution and offsets are cached, then the components are just reweighted
+        generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+            generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = basis.evaluate(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, xoff, sat_xoff, shkoff_xoff, shkup_xoff, shake_amps)
     
     if len(generalVars.extra_fitting_functions) > 0:
         for key in generalVars.extra_fitting_functions:
@@ -959,6 +953,57 @@ def func2min_minuit(params: tuple, name: tuple, sim: Toplevel,
     
     
 
+# Create the Jacobian of the function to be minimized for the fitting
+def jac2min(params: Parameters, sim: Toplevel,
+            exp_x: List[float], exp_y: List[float], num_of_points: int,
+            sat: str, peak: str,
+            x: List[List[float]], y: List[List[float]], w: List[List[float]],
+            xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+            energy_values: List[float], efficiency_values: List[float],
+            progress: ProgressReporter | None = None, basis: ComponentBasis | None = None):
+    """
+    Function to calculate the analytic Jacobian of func2min, passed to lmfit as Dfun
+        
+        Args:
+            same as func2min, the basis is required
+            
+        Returns:
+            Jacobian with the derivatives of each residue (rows) with respect to each varying parameter (columns)
+    """
+    names = [name for name in params if params[name].vary]
+    values = {name: params[name].value for name in params}
+    
+    _, jacobian = model_jacobian(names, values, basis, sim, exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values) # type: ignore
+    
+    return jacobian
+
+# Create the gradient of the function to be minimized for the fitting
+def grad2min_minuit(params: tuple, name: tuple, sim: Toplevel,
+             exp_x: List[float], exp_y: List[float], num_of_points: int,
+             sat: str, peak: str,
+             x: List[List[float]], y: List[List[float]], w: List[List[float]],
+             xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+             energy_values: List[float], efficiency_values: List[float],
+             progress: ProgressReporter | None = None, basis: ComponentBasis | None = None):
+    """
+    Function to calculate the analytic gradient of func2min_minuit, passed to iminuit as grad
+        
+        Args:
+            same as func2min_minuit, the basis is required
+            
+        Returns:
+            gradient of the likelihood with respect to each parameter
+    """
+    values = dict(zip(name, params))
+    
+    model, jacobian = model_jacobian(list(name), values, basis, sim, exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values) # type: ignore
+    
+    # Same experimental points as the function to minimize
+    exp_y_f = np.asarray(exp_y)[(np.asarray(exp_x) > min(exp_x)) & (np.asarray(exp_x) < max(exp_x))]
+    
+    return nll_gradient(model, exp_y_f, np.sqrt(exp_y_f)) @ jacobian
+
+
 # Calculate the residues, reduced chi^2 and update the respective graph
 def calculateResidues(exp_x: List[float], exp_y: List[float], exp_sigma: List[float],
                       xfinal: List[float] | npt.NDArray[np.float64], normalization_var: float,
@@ -1033,6 +1078,29 @@ def report_minuit(result,num_data,num_var):
     
     return report
 
+# Minimize the function for the fitting with lmfit
+def minimize_lmfit(params: Parameters, sim: Toplevel | None, fit_args: tuple,
+                   progress: ProgressReporter | None = None, max_nfev: int | None = None) -> MinimizerResult:
+    """
+    Function to minimize func2min with lmfit, using the component basis cache and the analytic Jacobian when possible
+        
+        Args:
+            params: initialized fit parameters
+            sim: tkinter window object to update the progress bar (None when running outside the interface)
+            fit_args: arguments of func2min after the window (exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+            progress: progress reporter for the function evaluations (no reporting if None)
+            max_nfev: maximum number of function evaluations (lmfit default if None)
+        
+        Returns:
+            result object from the fitting
+    """
+    minner = Minimizer(func2min, params, fcn_args=(sim,) + tuple(fit_args) + (progress, ComponentBasis()))
+    # Use the analytic Jacobian unless some parameters (extra fitting components or lines with approximate profiles) need finite differences
+    if has_analytic_jacobian([key for key in params if params[key].vary], fit_args[4]):
+        return minner.minimize(Dfun=jac2min, max_nfev=max_nfev) # type: ignore
+    else:
+        return minner.minimize(max_nfev=max_nfev) # type: ignore
+
 def execute_autofit(sim: Toplevel, sat: str, enoffset: float, sat_enoffset: float,
                     
                     
@@ -1040,7 +1108,8 @@ def execute_autofit(sim: Toplevel, sat: str, enoffset: float, sat_enoffset: floa
                     num_of_points: int, peak: str, x: List[List[float]], y: List[List[float]],
                     w: List[List[float]], xs: List[List[List[float]]], ys: List[List[List[float]]],
                     ws: List[List[List[float]]], energy_values: List[float],
-                    efficiency_values: List[float], time_of_click: datetime):
+                    efficiency_values: List[float], time_of_click: datetime,
+                    prompt: bool = True, fit_file: str | Path | None = None):
     """
     Execute the autofit for the current simulation to the loaded experimental values.
     Fitting is currently performed with the LMfit package.
@@ -1064,6 +1133,8 @@ def execute_autofit(sim: Toplevel, sat: str, enoffset: float, sat_enoffset: floa
             energy_values: list of energy values in the efficiency file
             efficiency_values: list of efficiency values in the efficiency file
             time_of_click: timestamp to use when saving files for this simulation plot
+            prompt: if we ask to save the fit (otherwise it is only saved when a fit_file is given)
+            fit_file: path where the fit report is saved without asking
         
         Returns:
             number_of_fit_variables: number of fitted variables
@@ -1079,10 +1150,20 @@ def execute_autofit(sim: Toplevel, sat: str, enoffset: float, sat_enoffset: floa
     # Initialize the fit parameters
     params= initializeFitParameters(generalVars.exp_x, generalVars.exp_y, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, y0, res)
     
+    # The spread of the starts is only kept for a multi-start fit
+    generalVars.multistart_spread = {}
+    
+    # In the multi-start mode the parameters start from the best of several local fits run in parallel
+    if guiVars.autofitvar.get() == 'MultiStart': # type: ignore
+        params, generalVars.multistart_spread = multistart_fit(params, (generalVars.exp_x, generalVars.exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values), guiVars.multistart_count.get(), progress=ConsoleProgress()) # type: ignore
+    
     # Minimize the function for the initialized parameters
     number_of_fit_variables = len(params.valuesdict())
-    minner = Minimizer(func2min, params, fcn_args=(sim, generalVars.exp_x, generalVars.exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values))
-    result = minner.minimize()
+    if guiVars.autofitvar.get() == 'VarPro': # type: ignore
+        # Only the nonlinear parameters are minimized, the linear ones are solved by the projection
+        result = varpro_fit(params, sim, generalVars.exp_x, generalVars.exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+    else:
+        result = minimize_lmfit(params, sim, (generalVars.exp_x, generalVars.exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values), ConsoleProgress(min_step=0.0))
     
     # Get the fitted values
     enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, y0, res, ytot_max, shake_amps, extra_pars = fetchFittedParams(result)
@@ -1124,12 +1205,17 @@ def execute_autofit(sim: Toplevel, sat: str, enoffset: float, sat_enoffset: floa
                 LwidthPar = extra_pars[key]["LwidthPar"]
                 generalVars.yextras[i] = add_fitting_components(generalVars.xfinal, function, xPar, ampPar, GwidthPar, LwidthPar)
     
-    # Ask to save the fit
-    if messagebox.askyesno("Fit Saving", "Do you want to save this fit?"):
-        # Get the report on the fit
-        report: str = fit_report(result)
+    # Get the report on the fit, with the spread of the starts of a multi-start fit
+    report: str = fit_report(result)
+    if len(generalVars.multistart_spread) > 0:
+        report += "\n" + spread_report(generalVars.multistart_spread)
+    
+    # Ask to save the fit, headless fits are saved to the given file
+    if prompt and messagebox.askyesno("Fit Saving", "Do you want to save this fit?"):
         # Export the fit to file
         exportFit(time_of_click, report)
+    elif not prompt and fit_file is not None:
+        exportFit(time_of_click, report, fit_file)
     
     return number_of_fit_variables, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, y0, res, ytot_max, normalization_var, extra_pars
 
@@ -1140,7 +1226,8 @@ def execute_autofit_minuit(sim: Toplevel, sat: str, enoffset: float, sat_enoffse
                     num_of_points: int, peak: str, x: List[List[float]], y: List[List[float]],
                     w: List[List[float]], xs: List[List[List[float]]], ys: List[List[List[float]]],
                     ws: List[List[List[float]]], energy_values: List[float],
-                    efficiency_values: List[float], time_of_click: datetime):
+                    efficiency_values: List[float], time_of_click: datetime,
+                    prompt: bool = True, fit_file: str | Path | None = None):
     """
     Execute the autofit for the current simulation to the loaded experimental values.
     Fitting is currently performed with the LMfit package.
@@ -1164,6 +1251,8 @@ def execute_autofit_minuit(sim: Toplevel, sat: str, enoffset: float, sat_enoffse
             energy_values: list of energy values in the efficiency file
             efficiency_values: list of efficiency values in the efficiency file
             time_of_click: timestamp to use when saving files for this simulation plot
+            prompt: if we ask to save the fit (otherwise it is only saved when a fit_file is given)
+            fit_file: path where the fit report is saved without asking
         
         Returns:
             number_of_fit_variables: number of fitted variables
@@ -1176,15 +1265,24 @@ def execute_autofit_minuit(sim: Toplevel, sat: str, enoffset: float, sat_enoffse
     # Console feedback for long fits
     print("Starting AutoFit...")
     
+    # The spread of the starts is only kept for a multi-start fit
+    generalVars.multistart_spread = {}
+    
     # Initialize the fit parameters
     params,name,limits = initializeFitParameters_minuit(generalVars.exp_x, generalVars.exp_y, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, y0, res)
     
     # Minimize the function for the initialized parameters
     number_of_fit_variables = len(params)
     
-    fun_min_minuit = partial(func2min_minuit,name = name, sim = sim , exp_x = generalVars.exp_x, exp_y = generalVars.exp_y, num_of_points=num_of_points, sat = sat, peak = peak, x = x, y = y, w = w, xs = xs, ys = ys, ws = ws, energy_values = energy_values, efficiency_values = efficiency_values)  
-   
-    m = Minuit(fun_min_minuit, params, name = name)
+    basis = ComponentBasis()
+    fun_min_minuit = partial(func2min_minuit,name = name, sim = sim , exp_x = generalVars.exp_x, exp_y = generalVars.exp_y, num_of_points=num_of_points, sat = sat, peak = peak, x = x, y = y, w = w, xs = xs, ys = ys, ws = ws, energy_values = energy_values, efficiency_values = efficiency_values, progress = ConsoleProgress(min_step=0.0), basis = basis)
+    
+    # Use the analytic gradient unless some parameters (extra fitting components or lines with approximate profiles) need finite differences
+    if has_analytic_jacobian(list(name), peak):
+        grad_min_minuit = partial(grad2min_minuit,name = name, sim = sim , exp_x = generalVars.exp_x, exp_y = generalVars.exp_y, num_of_points=num_of_points, sat = sat, peak = peak, x = x, y = y, w = w, xs = xs, ys = ys, ws = ws, energy_values = energy_values, efficiency_values = efficiency_values, basis = basis)
+        m = Minuit(fun_min_minuit, params, name = name, grad = grad_min_minuit)
+    else:
+        m = Minuit(fun_min_minuit, params, name = name)
     Minuit.errordef = Minuit.LIKELIHOOD ## para garantir que os erros são calculados de forma correta
     m.limits = limits
     result = m.migrad()
@@ -1230,12 +1328,13 @@ def execute_autofit_minuit(sim: Toplevel, sat: str, enoffset: float, sat_enoffse
                 LwidthPar = extra_pars[key]["LwidthPar"]
                 generalVars.yextras[i] = add_fitting_components(generalVars.xfinal, function, xPar, ampPar, GwidthPar, LwidthPar)
     
-    # Ask to save the fit
-    if messagebox.askyesno("Fit Saving", "Do you want to save this fit?"):
+    # Ask to save the fit, headless fits are saved to the given file
+    if prompt and messagebox.askyesno("Fit Saving", "Do you want to save this fit?"):
         # Get the report on the fit
         report: str = report_minuit(result,generalVars.exp_x,number_of_fit_variables)
         # Export the fit to file
         exportFit(time_of_click, report)
-        
-    print(result)
+    elif not prompt and fit_file is not None:
+        exportFit(time_of_click, report_minuit(result,generalVars.exp_x,number_of_fit_variables), fit_file)
+    
     return number_of_fit_variables, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, y0, res, ytot_max, normalization_var, extra_pars
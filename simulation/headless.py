@@ -0,0 +1,664 @@
+"""
+Module with the headless simulation and fit API.
+A SimulationConfig holds the values that are otherwise read from the interface variables, and run_simulation / run_fit
+install them in place of the tkinter variables while they run the same stages as the interface, returning the arrays it would plot.
+The previous interface variables are restored when they finish.
+This module can also be ran from the command line, see main.
+"""
+
+from __future__ import annotations
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from simulation.multistart import FrozenVar, interface_snapshot
+from simulation.preprocessors import process_simulation, process_Msimulation
+from simulation.shake import setupShake
+from simulation.bounds import calculate_xfinal, getBoundedExp
+from simulation.ycalc import y_calculator, normalizer, add_fitting_components, profile_accuracy
+from simulation.fitting import execute_autofit, execute_autofit_minuit
+
+from utils.crossSections.EIICS import setupMRBEB
+from utils.crossSections.PhotoCS import setupELAMPhotoIoniz
+from utils.crossSections.energies import setupFormationEnergies, setupPartialWidths
+from utils.experimental.detector import initialize_detectorEfficiency
+from utils.experimental.expSpectra import extractExpVals
+from utils.misc.fileIO import loadExp
+
+from data.definitions import ComponentStore
+
+from tkinter import messagebox
+
+from contextlib import contextmanager
+import argparse
+import json
+import os
+from pathlib import Path
+from datetime import datetime
+
+from typing import Dict, Iterator, List
+
+import numpy as np
+import numpy.typing as npt
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                  SIMULATION CONFIGURATION                 #
+#                                                           #
+# --------------------------------------------------------- #
+
+class SimulationConfig():
+    """
+    Class with the configuration of a simulation or fit, the values are keyed by the name of the interface variable they replace.
+    The json layout is the same as the fit configurations saved from the interface
+    """
+    # Default value of each interface variable used by the simulation, as initialized in setupVars
+    defaults: Dict[str, str | float | int | bool] = {
+        'satelite_var': 'Diagram',
+        'choice_var': 'Simulation',
+        'type_var': 'Lorentzian',
+        'voigt_method': 'Exact',
+        'profile_mode': 'Exact',
+        'profile_tail_tol': 1E-4,
+        'exc_mech_var': '',
+        'include_cascades': False,
+        'separate_offsets': False,
+        'fit_shake_prob': False,
+        'JJ_colors': False,
+        'autofitvar': 'No',
+        'multistart_count': 16,
+        'normalizevar': 'No',
+        'loadvar': 'No',
+        'effic_var': 'No',
+        'exp_resolution': 1.0,
+        'yoffset': 0.0,
+        'energy_offset': 0.0,
+        'sat_energy_offset': 0.0,
+        'shkoff_energy_offset': 0.0,
+        'shkup_energy_offset': 0.0,
+        'excitation_energy': 0.0,
+        'excitation_energyFWHM': 0.0,
+        'number_points': 500,
+        'x_max': 'Auto',
+        'x_min': 'Auto',
+        'yscale_log': 'No',
+        'xscale_log': 'No',
+        'progress_var': 0.0
+    }
+
+    # Interface variables with one mixture value for each charge state
+    mix_names: List[str] = ['PCS_radMixValues', 'NCS_radMixValues', 'PCS_augMixValues', 'NCS_augMixValues']
+
+    def __init__(self, z: int, transitions: List[str] | None = None, aug_transitions: List[str] | None = None,
+                 extra_fitting_functions: dict | None = None, **values):
+        """
+        Args:
+            z: z value of the element to simulate
+            transitions: radiative transitions to simulate
+            aug_transitions: auger transitions to simulate
+            extra_fitting_functions: extra fitting components, as stored in generalVars.extra_fitting_functions
+            values: value of each interface variable to change from the defaults
+        """
+        for name in values:
+            if name not in self.defaults and name not in self.mix_names:
+                raise RuntimeError("Unknown configuration value: " + name)
+
+        self.z = z
+        self.transitions = list(transitions) if transitions is not None else []
+        self.aug_transitions = list(aug_transitions) if aug_transitions is not None else []
+        self.extra_fitting_functions = dict(extra_fitting_functions) if extra_fitting_functions is not None else {}
+
+        self.values = dict(self.defaults)
+        self.values.update(values)
+
+    def get(self, name: str):
+        return self.values[name]
+
+    def set(self, name: str, value):
+        if name not in self.defaults and name not in self.mix_names:
+            raise RuntimeError("Unknown configuration value: " + name)
+        self.values[name] = value
+
+    # Convert to the saved configuration layout
+    def to_dict(self) -> dict:
+        """
+        Function to convert the configuration to the layout of the saved fit configurations
+
+            Returns:
+                dictionary with the configuration
+        """
+        return {
+            'Z': self.z,
+            'interface': dict(self.values),
+            'transitions': list(self.transitions),
+            'aug_transitions': list(self.aug_transitions),
+            'extra_fitting_functions': dict(self.extra_fitting_functions)
+        }
+
+    # Read a configuration in the saved layout
+    @classmethod
+    def from_dict(cls, config: dict) -> SimulationConfig:
+        """
+        Function to create a configuration from a dictionary in the saved layout.
+        The saved interface values that are not used by the simulation (labels, totals) are ignored
+
+            Args:
+                config: dictionary with the configuration
+
+            Returns:
+                the configuration
+        """
+        values = {name: value for name, value in config.get('interface', {}).items() if name in cls.defaults or name in cls.mix_names}
+
+        return cls(config['Z'], config.get('transitions'), config.get('aug_transitions'), config.get('extra_fitting_functions'), **values)
+
+    # Read the configuration of the interface
+    @classmethod
+    def from_interface(cls) -> SimulationConfig:
+        """
+        Function to create a configuration from the current values of the interface variables and the selected transitions
+
+            Returns:
+                the configuration
+        """
+        return cls.from_dict({
+            'Z': generalVars.Z,
+            'interface': interface_snapshot(),
+            'transitions': [transition for transition in generalVars.the_dictionary if generalVars.the_dictionary[transition]["selected_state"]],
+            'aug_transitions': [transition for transition in generalVars.the_aug_dictionary if generalVars.the_aug_dictionary[transition]["selected_state"]],
+            'extra_fitting_functions': generalVars.extra_fitting_functions
+        })
+
+    # Save the configuration to a json file
+    def save(self, file_name: str | Path):
+        """
+        Function to save the configuration to a json file
+
+            Args:
+                file_name: path of the configuration file
+        """
+        with open(file_name, 'w') as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+    # Read a configuration from a json file
+    @classmethod
+    def load(cls, file_name: str | Path) -> SimulationConfig:
+        """
+        Function to read a configuration saved to a json file
+
+            Args:
+                file_name: path of the configuration file
+
+            Returns:
+                the configuration
+        """
+        with open(file_name, 'r') as file:
+            return cls.from_dict(json.load(file))
+
+    # Install the configuration in place of the interface variables
+    def apply(self):
+        """
+        Function to replace the interface variables with the configuration values and select the configured transitions.
+        The previous values are not restored, so this is meant for worker processes, headless runs in a process that keeps
+        its interface variables use applied instead.
+        Charge state mixtures that are not configured are set to 0 for each charge state of the loaded element
+        """
+        for name, value in self.values.items():
+            if name in self.mix_names:
+                setattr(guiVars, name, [FrozenVar(item) for item in value])
+            else:
+                setattr(guiVars, name, FrozenVar(value))
+
+        mix_states = {
+            'PCS_radMixValues': [cs for cs in generalVars.radiative_files if '+' in cs],
+            'NCS_radMixValues': [cs for cs in generalVars.radiative_files if '+' not in cs],
+            'PCS_augMixValues': [cs for cs in generalVars.auger_files if '+' in cs],
+            'NCS_augMixValues': [cs for cs in generalVars.auger_files if '+' not in cs]
+        }
+        for name in self.mix_names:
+            if name not in self.values:
+                setattr(guiVars, name, [FrozenVar('0.0') for _ in mix_states[name]])
+
+        for transition in generalVars.the_dictionary:
+            generalVars.the_dictionary[transition]["selected_state"] = transition in self.transitions
+        for transition in generalVars.the_aug_dictionary:
+            generalVars.the_aug_dictionary[transition]["selected_state"] = transition in self.aug_transitions
+
+        generalVars.extra_fitting_functions = dict(self.extra_fitting_functions)
+
+    # Install the configuration while a block runs
+    @contextmanager
+    def applied(self) -> Iterator[SimulationConfig]:
+        """
+        Context to install the configuration as apply does and restore the previous interface variables, selected transitions
+        and extra fitting components when the block finishes, so a headless run does not change the state of the interface.
+        The element data must be loaded before, as the charge state mixtures depend on it
+        """
+        names = list(self.defaults) + self.mix_names
+        variables = {name: getattr(guiVars, name) for name in names if hasattr(guiVars, name)}
+        selected = {transition: generalVars.the_dictionary[transition]["selected_state"] for transition in generalVars.the_dictionary}
+        aug_selected = {transition: generalVars.the_aug_dictionary[transition]["selected_state"] for transition in generalVars.the_aug_dictionary}
+        extra_fitting_functions = generalVars.extra_fitting_functions
+
+        self.apply()
+        try:
+            yield self
+        finally:
+            for name in names:
+                if name in variables:
+                    setattr(guiVars, name, variables[name])
+                elif hasattr(guiVars, name):
+                    delattr(guiVars, name)
+
+            for transition, state in selected.items():
+                generalVars.the_dictionary[transition]["selected_state"] = state
+            for transition, state in aug_selected.items():
+                generalVars.the_aug_dictionary[transition]["selected_state"] = state
+
+            generalVars.extra_fitting_functions = extra_fitting_functions
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                   HEADLESS SIMULATION                     #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Print the message boxes to the console
+@contextmanager
+def console_messages() -> Iterator[None]:
+    """
+    Context to print the warnings and errors that the stages show in message boxes, as there is no interface to show them.
+    Questions are answered with no, so nothing is saved without being requested
+    """
+    names = ['showinfo', 'showwarning', 'showerror', 'askyesno', 'askokcancel']
+    originals = {name: getattr(messagebox, name) for name in names}
+
+    def show(kind: str):
+        def message(title: str | None = None, message: str | None = None, **options):
+            print(kind + ": " + str(title) + " - " + str(message))
+            return False
+        return message
+
+    messagebox.showinfo = show("Info")
+    messagebox.showwarning = show("Warning")
+    messagebox.showerror = show("Error")
+    messagebox.askyesno = show("Question")
+    messagebox.askokcancel = show("Question")
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(messagebox, name, original)
+
+# Read the data files of an element
+def load_element(z: int, dir_path: str | Path | None = None):
+    """
+    Function to read the data files of an element without the interface, the files are only read when the element
+    or the data directory changes
+
+        Args:
+            z: z value of the element
+            dir_path: directory with the element data folders (current directory if None)
+    """
+    # The interface modules imported by SpecSimu import this module
+    from aps.SpecSimu import loadElementData
+
+    dir_path = Path(dir_path) if dir_path is not None else Path(str(os.getcwd()) + '/')
+
+    if generalVars.Z == z and generalVars.element_name is not None and generalVars.element_dir == str(dir_path.resolve()):
+        return
+
+    loadElementData(dir_path, [z, generalVars.per_table[z - 1][2]])
+
+# Calculate the lines of the configured transitions
+def configured_lines(shake_amps: dict = {}) -> tuple:
+    """
+    Function to calculate the line lists of the configured transitions, checking that there is something to simulate.
+    The interface reports these errors in message boxes from calculate_xfinal
+
+        Args:
+            shake_amps: fitted shake amplitudes, as in process_simulation
+
+        Returns:
+            x, y, w, xs, ys, ws lists as returned by process_simulation
+    """
+    if guiVars.choice_var.get()[:2] == "M_": # type: ignore
+        x, y, w, xs, ys, ws, bad_selection = process_Msimulation(shake_amps, False)
+    else:
+        x, y, w, xs, ys, ws, bad_selection = process_simulation(shake_amps, False)
+
+    sat = guiVars.satelite_var.get() # type: ignore
+
+    if ('Diagram' in sat or 'Auger' in sat) and sum(len(energies) for energies in x) == 0:
+        raise RuntimeError("No transition was chosen" if not bad_selection else "You chose " + str(bad_selection) + " invalid transition(s)")
+    if 'Satellites' in sat and sum(len(energies) for transition in xs for energies in transition) == 0:
+        raise RuntimeError("No satellite transition was chosen" if not bad_selection else "You chose " + str(bad_selection) + " invalid satellite transition(s)")
+
+    return x, y, w, xs, ys, ws
+
+# Prepare the simulation of a configuration
+def prepare(config: SimulationConfig) -> tuple:
+    """
+    Function to run the stages up to the simulated energy grid, as make_simulation does.
+    The element must be loaded and the configuration installed
+
+        Args:
+            config: configuration to simulate
+
+        Returns:
+            x, y, w, xs, ys, ws: line lists of the configured transitions
+            energy_values: energy values read from the detector efficiency data
+            efficiency_values: efficiency values read from the detector efficiency data
+    """
+    if config.get('choice_var') not in ['Simulation', 'M_Simulation']:
+        raise RuntimeError("Only the Simulation and M_Simulation spectra can be simulated without the interface")
+
+    generalVars.convolutionError = 0.0
+
+    if generalVars.meanR_exists:
+        setupMRBEB()
+    if generalVars.ELAM_exists:
+        setupELAMPhotoIoniz()
+
+    setupShake()
+
+    setupFormationEnergies()
+    setupPartialWidths()
+
+    x, y, w, xs, ys, ws = configured_lines()
+
+    sat = guiVars.satelite_var.get() # type: ignore
+    num_of_points = guiVars.number_points.get() # type: ignore
+    x_mx = guiVars.x_max.get() # type: ignore
+    x_mn = guiVars.x_min.get() # type: ignore
+    enoffset = guiVars.energy_offset.get() # type: ignore
+    sat_enoffset = guiVars.sat_energy_offset.get() # type: ignore
+    shkoff_enoffset = guiVars.shkoff_energy_offset.get() # type: ignore
+    shkup_enoffset = guiVars.shkup_energy_offset.get() # type: ignore
+
+    calculate_xfinal(sat, x, w, xs, ws, x_mx, x_mn, guiVars.exp_resolution.get(), enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, num_of_points, 0) # type: ignore
+
+    # Read the experimental spectrum and calculate the grid from its bounds, as initialize_expElements does
+    generalVars.exp_x = []
+    generalVars.exp_y = []
+    generalVars.exp_sigma = []
+
+    load = guiVars.loadvar.get() # type: ignore
+    if load != 'No':
+        xe, ye, sigma_exp = extractExpVals(loadExp(load))
+        max_offset = enoffset + max([sat_enoffset, shkoff_enoffset, shkup_enoffset])
+        getBoundedExp(xe, ye, sigma_exp, max_offset, num_of_points, x_mx, x_mn)
+        if len(generalVars.exp_x) == 0:
+            raise RuntimeError("The experimental spectrum " + str(load) + " has no points inside the simulation bounds")
+        generalVars.xfinal = np.array(np.linspace(min(generalVars.exp_x) + max_offset, max(generalVars.exp_x) + max_offset, num=num_of_points))
+
+    energy_values: List[float] = []
+    efficiency_values: List[float] = []
+    if guiVars.effic_var.get() != 'No': # type: ignore
+        energy_values, efficiency_values = initialize_detectorEfficiency(guiVars.effic_var.get()) # type: ignore
+
+    return x, y, w, xs, ys, ws, energy_values, efficiency_values
+
+# Collect the simulated arrays
+def simulation_arrays(normalization_var: float) -> Dict[str, npt.NDArray[np.float64] | float]:
+    """
+    Function to collect the simulated arrays stored in the general variables
+
+        Args:
+            normalization_var: normalization multiplier of the simulation
+
+        Returns:
+            dictionary with the energy grid, the total, diagram, satellite, shake-off and shake-up intensities,
+            the intensities of each diagram transition, the sparse store of the satellite components, the extra fitting components, the normalization multiplier and offset to plot them
+            the bound on the truncated profile area (0 unless the truncated profiles are selected), the relative error of the
+            convolution mode (0 unless it was checked) and the message describing them ('profile_accuracy', empty for the exact profiles)
+    """
+    return {
+        'xfinal': np.array(generalVars.xfinal),
+        'ytot': np.array(generalVars.ytot),
+        'ydiagtot': np.array(generalVars.ydiagtot),
+        'ysattot': np.array(generalVars.ysattot),
+        'yshkofftot': np.array(generalVars.yshkofftot),
+        'yshkuptot': np.array(generalVars.yshkuptot),
+        'yfinal': np.array(generalVars.yfinal),
+        'yfinals': generalVars.yfinals,
+        'yextras': np.array(generalVars.yextras) if len(generalVars.extra_fitting_functions) > 0 else np.zeros((0, len(generalVars.xfinal))),
+        'normalization': normalization_var,
+        'yoffset': guiVars.yoffset.get(), # type: ignore
+        'truncated_area': generalVars.truncatedArea,
+        'convolution_error': generalVars.convolutionError,
+        'profile_accuracy': profile_accuracy()
+    }
+
+# Simulate a configuration
+def run_simulation(config: SimulationConfig, dir_path: str | Path | None = None) -> Dict[str, npt.NDArray[np.float64] | float]:
+    """
+    Function to simulate the spectrum of a configuration without the interface.
+    The plotted spectrum is ytot * normalization + yoffset
+
+        Args:
+            config: configuration to simulate
+            dir_path: directory with the element data folders (current directory if None)
+
+        Returns:
+            dictionary with the simulated arrays, as returned by simulation_arrays
+    """
+    with console_messages():
+        load_element(config.z, dir_path)
+        with config.applied():
+            return simulate_configuration(config)
+
+# Simulate the installed configuration with the messages printed to the console
+def simulate_configuration(config: SimulationConfig) -> Dict[str, npt.NDArray[np.float64] | float]:
+    """
+    Function with the stages of run_simulation, ran with the configuration installed
+
+        Args:
+            config: installed configuration to simulate
+
+        Returns:
+            same as run_simulation
+    """
+    x, y, w, xs, ys, ws, energy_values, efficiency_values = prepare(config)
+
+    sat = guiVars.satelite_var.get() # type: ignore
+    peak = guiVars.type_var.get() # type: ignore
+    res = guiVars.exp_resolution.get() # type: ignore
+
+    generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(None, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, # type: ignore
+                                                                                       guiVars.energy_offset.get(), guiVars.sat_energy_offset.get(), guiVars.shkoff_energy_offset.get(), guiVars.shkup_energy_offset.get(), # type: ignore
+                                                                                       check_accuracy=True)
+
+    # Add the extra fitting components
+    if len(generalVars.extra_fitting_functions) > 0:
+        generalVars.yextras.resize((len(generalVars.extra_fitting_functions), len(generalVars.xfinal)))
+        for i, key in enumerate(generalVars.extra_fitting_functions):
+            function = key.split("_")[1]
+            pars = generalVars.extra_fitting_functions[key]
+
+            if function == 'Gaussian':
+                generalVars.yextras[i] = add_fitting_components(generalVars.xfinal, function, pars['xParVal'], pars['ampParVal'] * max(generalVars.ytot), pars['GwidthParVal'])
+            elif function == 'Lorentzian':
+                generalVars.yextras[i] = add_fitting_components(generalVars.xfinal, function, pars['xParVal'], pars['ampParVal'] * max(generalVars.ytot), 0.0, pars['LwidthParVal'])
+            elif function == 'Voigt':
+                generalVars.yextras[i] = add_fitting_components(generalVars.xfinal, function, pars['xParVal'], pars['ampParVal'] * max(generalVars.ytot), pars['GwidthParVal'], pars['LwidthParVal'])
+
+    y0 = guiVars.yoffset.get() # type: ignore
+
+    if guiVars.loadvar.get() != 'No': # type: ignore
+        normalization_var = normalizer(y0, max(generalVars.exp_y), max(generalVars.ytot))
+    elif guiVars.normalizevar.get() == 'ExpMax': # type: ignore
+        raise RuntimeError("No experimental spectrum is loaded to normalize to its maximum")
+    else:
+        normalization_var = normalizer(y0, 1, max(generalVars.ytot))
+
+    return simulation_arrays(normalization_var)
+
+# Fit a configuration to an experimental spectrum
+def run_fit(config: SimulationConfig, spectrum: str | Path, dir_path: str | Path | None = None,
+            fit_file: str | Path | None = None) -> Dict[str, npt.NDArray[np.float64] | float | SimulationConfig | dict]:
+    """
+    Function to fit the simulation of a configuration to an experimental spectrum without the interface.
+    The fit method of the configuration is used, a RuntimeError is raised if it has no valid fit method
+
+        Args:
+            config: configuration to fit, it is not changed
+            spectrum: path of the experimental spectrum
+            dir_path: directory with the element data folders (current directory if None)
+            fit_file: path where the fit report is saved (not saved if None)
+
+        Returns:
+            dictionary with the simulated arrays for the fitted values, as returned by simulation_arrays, the experimental values
+            (exp_x, exp_y, exp_sigma), the configuration with the fitted values ('config'), the fitted extra components ('extra_pars'),
+            the number of fitted variables and the spread of the starts of a multi-start fit ('multistart_spread', empty for the other methods)
+    """
+    methods = ['LMFit', 'VarPro', 'MultiStart', 'iminuit']
+    if config.get('autofitvar') not in methods:
+        raise RuntimeError("The fit method " + repr(config.get('autofitvar')) + " is not valid, select one of " + ", ".join(methods))
+
+    config = SimulationConfig.from_dict(config.to_dict())
+    config.set('loadvar', str(spectrum))
+
+    with console_messages():
+        load_element(config.z, dir_path)
+        with config.applied():
+            return fit_configuration(config, fit_file)
+
+# Fit the installed configuration with the messages printed to the console
+def fit_configuration(config: SimulationConfig, fit_file: str | Path | None = None) -> Dict[str, npt.NDArray[np.float64] | float | SimulationConfig | dict]:
+    """
+    Function with the stages of run_fit, ran with the configuration installed
+
+        Args:
+            config: installed configuration to fit, with the experimental spectrum in loadvar
+            fit_file: path where the fit report is saved (not saved if None)
+
+        Returns:
+            same as run_fit
+    """
+    x, y, w, xs, ys, ws, energy_values, efficiency_values = prepare(config)
+
+    # The fit parameters are initialized from the simulated intensities, as make_simulation calculates them before the fit
+    generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(None, guiVars.satelite_var.get(), guiVars.type_var.get(), generalVars.xfinal, x, y, w, xs, ys, ws, guiVars.exp_resolution.get(), # type: ignore
+                                                                                       energy_values, efficiency_values, guiVars.energy_offset.get(), guiVars.sat_energy_offset.get(), # type: ignore
+                                                                                       guiVars.shkoff_energy_offset.get(), guiVars.shkup_energy_offset.get()) # type: ignore
+
+    fit_args = (None, guiVars.satelite_var.get(), guiVars.energy_offset.get(), guiVars.sat_energy_offset.get(), guiVars.shkoff_energy_offset.get(), guiVars.shkup_energy_offset.get(), # type: ignore
+                guiVars.yoffset.get(), guiVars.exp_resolution.get(), guiVars.number_points.get(), guiVars.type_var.get(), # type: ignore
+                x, y, w, xs, ys, ws, energy_values, efficiency_values, datetime.now())
+
+    if guiVars.autofitvar.get() == 'iminuit': # type: ignore
+        number_of_fit_variables, *_, normalization_var, extra_pars = execute_autofit_minuit(*fit_args, prompt=False, fit_file=fit_file) # type: ignore
+    else:
+        number_of_fit_variables, *_, normalization_var, extra_pars = execute_autofit(*fit_args, prompt=False, fit_file=fit_file) # type: ignore
+
+    results = simulation_arrays(normalization_var)
+    results['exp_x'] = np.array(generalVars.exp_x)
+    results['exp_y'] = np.array(generalVars.exp_y)
+    results['exp_sigma'] = np.array(generalVars.exp_sigma)
+    # The fitted values were set in the installed variables
+    results['config'] = SimulationConfig.from_interface()
+    results['extra_pars'] = extra_pars
+    results['number_of_fit_variables'] = number_of_fit_variables
+    results['multistart_spread'] = dict(generalVars.multistart_spread)
+
+    return results
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                    COMMAND LINE ENTRY                     #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Save the simulated arrays
+def export_results(file_name: str | Path, results: dict):
+    """
+    Function to save the simulated arrays, as a table of the plotted totals for csv or txt files or as all the arrays for npz files.
+    The satellite components are saved one at a time in their non-zero support, as yfinals_<transition>_<component> with the
+    support range in yfinals_<transition>_<component>_support and the dense shape in yfinals_shape
+
+        Args:
+            file_name: path of the output file
+            results: dictionary with the simulated arrays, as returned by run_simulation or run_fit
+    """
+    arrays = {name: value for name, value in results.items() if isinstance(value, (np.ndarray, float, int))}
+
+    if str(file_name).endswith('.npz'):
+        store = results['yfinals']
+        if isinstance(store, ComponentStore):
+            arrays['yfinals_shape'] = np.array(store.shape)
+            for transition in range(len(store)):
+                for component in store.components(transition):
+                    name = 'yfinals_' + str(transition) + '_' + str(component)
+                    arrays[name] = store.values(transition, component)
+                    arrays[name + '_support'] = np.array(store.support(transition, component))
+
+        np.savez_compressed(file_name, **arrays)
+    else:
+        # Same plotted values as the interface, intensity * normalization + offset
+        scale = results['normalization']
+        y0 = results['yoffset']
+        columns = [results['xfinal'], results['ytot'] * scale + y0, results['ydiagtot'] * scale + y0, results['ysattot'] * scale + y0,
+                   results['yshkofftot'] * scale + y0, results['yshkuptot'] * scale + y0]
+        np.savetxt(file_name, np.column_stack(columns), delimiter=',', header='Energy (eV),Total,Diagram,Satellites,Shake-off,Shake-up', comments='')
+
+# Command line entry point
+def main(argv: List[str] | None = None) -> int:
+    """
+    Function to simulate or fit a saved configuration from the command line, e.g.
+    python -m simulation.headless simulate config.json -o spectrum.csv
+    python -m simulation.headless fit config.json spectrum.csv -o fitted.npz --report fit.txt
+
+        Args:
+            argv: command line arguments (sys.argv if None)
+
+        Returns:
+            exit code
+    """
+    parser = argparse.ArgumentParser(prog='python -m simulation.headless', description='Simulate or fit a saved simulation configuration without the interface')
+    parser.add_argument('--data', default=None, help='directory with the element data folders (current directory by default)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    simulate = commands.add_parser('simulate', help='simulate the spectrum of a configuration')
+    simulate.add_argument('config', help='json configuration saved from the interface')
+    simulate.add_argument('-o', '--output', required=True, help='output file (.csv/.txt table of the plotted totals or .npz with all the arrays)')
+
+    fit = commands.add_parser('fit', help='fit a configuration to an experimental spectrum')
+    fit.add_argument('config', help='json configuration saved from the interface')
+    fit.add_argument('spectrum', help='experimental spectrum file')
+    fit.add_argument('-o', '--output', required=True, help='output file (.csv/.txt table of the plotted totals or .npz with all the arrays)')
+    fit.add_argument('--report', default=None, help='file for the fit report')
+    fit.add_argument('--fitted-config', default=None, help='json file for the configuration with the fitted values')
+
+    args = parser.parse_args(argv)
+
+    config = SimulationConfig.load(args.config)
+
+    try:
+        if args.command == 'simulate':
+            results = run_simulation(config, args.data)
+        else:
+            results = run_fit(config, args.spectrum, args.data, args.report)
+    except RuntimeError as error:
+        print("Error: " + str(error))
+        return 1
+
+    if args.command == 'fit' and args.fitted_config is not None:
+        results['config'].save(args.fitted_config) # type: ignore
+
+    # Report the accuracy of the approximate profile evaluation modes once for the run
+    if results['profile_accuracy']:
+        print(results['profile_accuracy'])
+
+    export_results(args.output, results)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,148 @@
+"""
+Module with the analytic Jacobian of the fitted spectrum model, used by lmfit (Dfun) and iminuit (grad)
+instead of finite differences of the full simulation.
+"""
+
+from __future__ import annotations
+
+import interface.variables as guiVars
+
+from simulation.basis import ComponentBasis
+from simulation.ycalc import normalizer
+
+from scipy.interpolate import interp1d
+from scipy.special import digamma
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from tkinter import Toplevel
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                   MODEL JACOBIAN                          #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Parameters of the spectrum model with analytic derivatives
+line_parameters = ['xoff', 'sat_xoff', 'shkoff_xoff', 'shkup_xoff', 'res']
+"""
+Fit parameters that enter the simulated lines, their derivatives come from the profile derivatives
+"""
+
+# Check if the analytic Jacobian can be used for the fitted parameters
+def has_analytic_jacobian(names: List[str], peak: str) -> bool:
+    """
+    Function to check if all the fitted parameters have analytic derivatives.
+    The parameters of the extra fitting components depend on the maximum of the simulated spectrum and are left to finite differences.
+    The derivatives of the line parameters are the derivatives of the exact profiles, so they are also left to finite differences
+    when the profiles are approximated (pseudo-Voigt backend, truncated or convolution modes)
+
+        Args:
+            names: names of the fitted parameters
+            peak: profile type of the fit
+
+        Returns:
+            True if the analytic Jacobian can be used
+    """
+    exact = guiVars.profile_mode.get() not in ['Truncated', 'Convolution'] and \
+            (peak != 'Voigt' or guiVars.voigt_method.get() != 'Pseudo') # type: ignore
+    
+    return all((name in line_parameters and exact) or name in ['yoff', 'ytot_max'] or 'shake_amp_' in name or 'shakeup_amp_' in name for name in names)
+
+# Calculate the Jacobian of the simulated intensities at the experimental x values
+def model_jacobian(names: List[str], values: Dict[str, float], basis: ComponentBasis, sim: Toplevel,
+                   exp_x: List[float], exp_y: List[float], num_of_points: int, sat: str, peak: str,
+                   x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                   xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                   energy_values: List[float], efficiency_values: List[float]) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Function to calculate the derivatives of the interpolated simulated intensities (the model compared with the experimental spectrum in the fit)
+    with respect to the fitted parameters. The interpolation is linear in the simulated values, so the derivative spectra are interpolated the same way
+
+        Args:
+            names: names of the parameters to differentiate, in the order of the Jacobian columns
+            values: values of all the fit parameters
+            basis: component basis cache of the fit
+            remaining arguments: same as func2min
+
+        Returns:
+            model: interpolated simulated intensities at the experimental x values inside the simulated range
+            jacobian: derivatives of each interpolated intensity (rows) with respect to each parameter (columns)
+    """
+    xoff = values['xoff']
+    if guiVars.separate_offsets.get(): # type: ignore
+        shkoff_xoff = values['shkoff_xoff']
+        shkup_xoff = values['shkup_xoff']
+        sat_xoff = 0.0
+    else:
+        sat_xoff = values['sat_xoff']
+        shkoff_xoff = 0.0
+        shkup_xoff = 0.0
+    y0 = values['yoff']
+    res = values['res']
+    ytot_max = values['ytot_max']
+
+    shake_amps = {}
+    if guiVars.fit_shake_prob.get(): # type: ignore
+        shake_amps = {key: values[key] for key in values if 'shake_amp_' in key or 'shakeup_amp_' in key}
+
+    # Same simulated grid as the function to minimize
+    xfinal = np.array(np.linspace(min(exp_x), max(exp_x), num=num_of_points))
+
+    ytot, _, _, _, _, _, _ = basis.evaluate(sim, sat, peak, xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                                            xoff, sat_xoff, shkoff_xoff, shkup_xoff, shake_amps)
+    derivs = basis.derivatives(sim, sat, peak, xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                               xoff, sat_xoff, shkoff_xoff, shkup_xoff, shake_amps)
+
+    # Derivatives of the normalization multiplier
+    normalization_var = normalizer(y0, max(exp_y), ytot_max)
+    if guiVars.normalizevar.get() in ['ExpMax', 'One']: # type: ignore
+        d_norm_y0 = -1 / ytot_max
+        d_norm_ytot_max = -normalization_var / ytot_max
+    else:
+        d_norm_y0 = 0.0
+        d_norm_ytot_max = 0.0
+
+    columns = np.empty((len(names), len(xfinal)))
+    for i, name in enumerate(names):
+        if name == 'yoff':
+            columns[i] = np.asarray(ytot) * d_norm_y0 + 1.0
+        elif name == 'ytot_max':
+            columns[i] = np.asarray(ytot) * d_norm_ytot_max
+        else:
+            columns[i] = derivs[name] * normalization_var
+
+    # Same experimental points as the function to minimize
+    exp_x_f = np.asarray(exp_x)[(np.asarray(exp_x) > min(xfinal)) & (np.asarray(exp_x) < max(xfinal))]
+
+    model = interp1d(xfinal, np.asarray(ytot) * normalization_var + y0, kind='cubic')(exp_x_f)
+    
+    return model, interp1d(xfinal, columns, kind='cubic', axis=1)(exp_x_f).T
+
+# Derivative of the template likelihood with respect to the model intensities
+def nll_gradient(n: npt.NDArray[np.float64], mu: npt.NDArray[np.float64], mu_var: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the derivative of template_nll_asy with respect to each model intensity.
+    Each point adds -(alpha log(beta) + lgamma(n + alpha) - lgamma(n + 1) - (n + alpha) log(1 + beta) - lgamma(alpha)) to the likelihood,
+    with alpha = mu^2 / mu_var + 1 and beta = mu / mu_var, so its derivative is -(digamma(n + alpha) - digamma(n + 1) - log(1 + beta))
+
+        Args:
+            n: model intensities
+            mu: experimental intensities
+            mu_var: variance of the experimental intensities
+
+        Returns:
+            derivative of the likelihood with respect to each model intensity
+    """
+    n = np.asarray(n, dtype=np.float64)
+    mu = np.asarray(mu, dtype=np.float64)
+    mu_var = np.asarray(mu_var, dtype=np.float64)
+
+    alpha = mu ** 2 / mu_var + 1
+    beta = mu / mu_var
+
+    return np.log1p(beta) - digamma(n + alpha) + digamma(n + 1)
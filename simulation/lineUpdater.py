@@ -8,10 +8,13 @@ import interface.variables as guiVars
 
 from simulation.shake import avgDiagramOverlap
 
-from data.definitions import Line
+from data.definitions import LineTable, ChargeStateRates
 
 from typing import List
 
+import numpy as np
+import numpy.typing as npt
+
 
 # --------------------------------------------------------- #
 #                                                           #
@@ -43,32 +46,24 @@ def updateRadTransitionVals(transition: str, num: int, beam: float, FWHM: float)
     low_level: str = generalVars.the_dictionary[transition]["low_level"] # type: ignore
     high_level: str = generalVars.the_dictionary[transition]["high_level"] # type: ignore
     
-    if len(generalVars.jj_vals) == 0:
-        # Filter the radiative and satellite rates data for the selected transition
-        diag_stick_val = [line for line in generalVars.lineradrates if line.filterLevel(low_level, high_level, strict='h')]
-        avgDOverlap = avgDiagramOverlap(diag_stick_val, beam, FWHM)
-        
-        sat_stick_val = [line.setDiagramOverlap(avgDOverlap) for line in generalVars.linesatellites if line.filterLevel(low_level, high_level, strict='na')]
-        
-        # Filter the shake-up satellite rates data for the selected transition
-        if generalVars.Shakeup_exists:
-            sat_stick_val += [line.setDiagramOverlap(avgDOverlap) for line in generalVars.lineshakeup if line.filterLevel(low_level, high_level, strict='na')]
-        
-    else:
-        # Filter the radiative and satellite rates data for the selected transition
-        diag_stick_val = [line for line in generalVars.lineradrates if line.filterLevel(low_level, high_level, strict='h') and line.filterJJI()]
-        avgDOverlap = avgDiagramOverlap(diag_stick_val, beam, FWHM)
-        
-        sat_stick_val = [line.setDiagramOverlap(avgDOverlap) for line in generalVars.linesatellites if line.filterLevel(low_level, high_level, strict='na') and line.filterJJI()]
-        
-        # Filter the shake-up satellite rates data for the selected transition
-        if generalVars.Shakeup_exists:
-            sat_stick_val += [line.setDiagramOverlap(avgDOverlap) for line in generalVars.lineshakeup if line.filterLevel(low_level, high_level, strict='na') and line.filterJJI()]
-        
+    # Look up the radiative rates data for the selected transition
+    diag_stick_val = generalVars.lineradrates.selection(low_level, high_level, strict='h', jj_vals=generalVars.jj_vals)
+    
+    avgDOverlap = avgDiagramOverlap(diag_stick_val, beam, FWHM)
+    
+    # Look up the satellite rates data for the selected transition
+    sat_stick_val = generalVars.linesatellites.selection(low_level, high_level, strict='na', jj_vals=generalVars.jj_vals)
+    
+    # Look up the shake-up satellite rates data for the selected transition
+    if generalVars.Shakeup_exists:
+        sat_stick_val = LineTable.joined([sat_stick_val, generalVars.lineshakeup.selection(low_level, high_level, strict='na', jj_vals=generalVars.jj_vals)])
+    
+    sat_stick_val.setDiagramOverlap(avgDOverlap)
+    
     return num_of_transitions, low_level, high_level, diag_stick_val, sat_stick_val
 
 # Update the satellite rates for the selected transition
-def updateSatTransitionVals(low_level: str, high_level: str, key: str, sat_stick_val: List[Line], free: bool = False):
+def updateSatTransitionVals(low_level: str, high_level: str, key: str, sat_stick_val: LineTable, free: bool = False) -> LineTable:
     """
     Function to update the satellite rates for the selected transition and shake level
         
@@ -82,22 +77,75 @@ def updateSatTransitionVals(low_level: str, high_level: str, key: str, sat_stick
         Returns:
             sat_stick_val_ind: list with the satellite rates for the selected diagram transition and shake level
     """
+    return sat_stick_val.take(satCombinations(low_level, high_level, key, sat_stick_val, free))
+
+# Indexes of the satellite rates for the selected transition
+def satCombinations(low_level: str, high_level: str, key: str, sat_stick_val: LineTable, free: bool = False) -> npt.NDArray[np.intp]:
+    """
+    Function to get the indexes of the satellite rates for the combinations of the selected levels and shake level
+        
+        Args:
+            same as updateSatTransitionVals
+        
+        Returns:
+            indexes of the satellite rates of each combination, in order
+    """
     if not free:
         # Filter the satellite rates data for the combinations of selected levels
-        sat_stick_val_ind1 = [line for line in sat_stick_val if line.filterLevel(low_level + key, key + high_level, strict='na')]
-        sat_stick_val_ind2 = [line for line in sat_stick_val if line.filterLevel(low_level + key, high_level + key, strict='na')]
-        sat_stick_val_ind3 = [line for line in sat_stick_val if line.filterLevel(key + low_level, key + high_level, strict='na')]
-        sat_stick_val_ind4 = [line for line in sat_stick_val if line.filterLevel(key + low_level, high_level + key, strict='na')]
+        sat_stick_val_ind1 = sat_stick_val.select(low_level + key, key + high_level, strict='na')
+        sat_stick_val_ind2 = sat_stick_val.select(low_level + key, high_level + key, strict='na')
+        sat_stick_val_ind3 = sat_stick_val.select(key + low_level, key + high_level, strict='na')
+        sat_stick_val_ind4 = sat_stick_val.select(key + low_level, high_level + key, strict='na')
     else:
         # Filter the satellite rates data for the combinations of selected levels
-        sat_stick_val_ind1 = [line for line in sat_stick_val if low_level + key in line.Shelli]
-        sat_stick_val_ind2 = [line for line in sat_stick_val if low_level + key in line.Shelli]
-        sat_stick_val_ind3 = [line for line in sat_stick_val if key + low_level in line.Shelli]
-        sat_stick_val_ind4 = [line for line in sat_stick_val if key + low_level in line.Shelli]
+        shelli = sat_stick_val.shellLabels('Shelli')
+        sat_stick_val_ind1 = np.flatnonzero([low_level + key in label for label in shelli])
+        sat_stick_val_ind2 = sat_stick_val_ind1
+        sat_stick_val_ind3 = np.flatnonzero([key + low_level in label for label in shelli])
+        sat_stick_val_ind4 = sat_stick_val_ind3
     
-    sat_stick_val_ind = sat_stick_val_ind1 + sat_stick_val_ind2 + sat_stick_val_ind3 + sat_stick_val_ind4
+    # The lines of each combination are kept in order, a line that matches several combinations is repeated
+    return np.concatenate([sat_stick_val_ind1, sat_stick_val_ind2, sat_stick_val_ind3, sat_stick_val_ind4]).astype(np.intp)
+
+# Satellite rates of a shake level for the selected transition
+def updateSatShakeVals(low_level: str, high_level: str, key: str, sat_stick_val: LineTable, shakeup: bool = False) -> LineTable:
+    """
+    Function to get the shake-off or shake-up satellite rates of a shake level for the selected transition.
+    The indexes of each group are kept in the index of the transition table, so they are only filtered the first time
+        
+        Args:
+            low_level: low level of the selected transition
+            high_level: high level of the selected transition
+            key: shake level of the satellite transition
+            sat_stick_val: list with all the possible satellite transitions for the current diagram transition
+            shakeup: get the shake-up group instead of the shake-off group
+        
+        Returns:
+            sat_stick_val_ind: list with the shake-off or shake-up satellite rates for the selected diagram transition and shake level
+    """
+    return sat_stick_val.take(satShakeIndexes(low_level, high_level, key, sat_stick_val, shakeup))
+
+# Indexes of the satellite rates of a shake level
+def satShakeIndexes(low_level: str, high_level: str, key: str, sat_stick_val: LineTable, shakeup: bool = False) -> npt.NDArray[np.intp]:
+    """
+    Function to get the indexes of the shake-off or shake-up satellite rates of a shake level, from the index of the transition table
+        
+        Args:
+            same as updateSatShakeVals
+        
+        Returns:
+            indexes of the satellite rates of the group
+    """
+    group_key = ('shake', low_level, high_level, key, shakeup)
+    indexes = sat_stick_val.selections.get(group_key)
+    if indexes is None:
+        # Same combinations as updateSatTransitionVals, shake-up lines have longer initial shell labels
+        indexes = satCombinations(low_level, high_level, key, sat_stick_val, shakeup)
+        lengths = sat_stick_val.shelliLength()[indexes]
+        indexes = indexes[lengths > 4] if shakeup else indexes[lengths <= 4]
+        sat_stick_val.selections[group_key] = indexes
     
-    return sat_stick_val_ind
+    return indexes
 
 # Update the auger rates for the selected transition
 def updateAugTransitionVals(transition: str, num: int):
@@ -116,19 +164,39 @@ def updateAugTransitionVals(transition: str, num: int):
     # Update the number of transitions loaded (this could be done by reference as well)
     num_of_transitions = num + 1
     # Get the low, high and auger levels for the selected transition
-    low_level: str = the_aug_dictionary[transition]["low_level"] # type: ignore
-    high_level: str = the_aug_dictionary[transition]["high_level"] # type: ignore
-    auger_level: str = the_aug_dictionary[transition]["auger_level"] # type: ignore
+    low_level: str = generalVars.the_aug_dictionary[transition]["low_level"] # type: ignore
+    high_level: str = generalVars.the_aug_dictionary[transition]["high_level"] # type: ignore
+    auger_level: str = generalVars.the_aug_dictionary[transition]["auger_level"] # type: ignore
 
-    if len(generalVars.jj_vals) == 0:
-        # Filter the auger rates data for the selected transition
-        aug_stick_val = [line for line in generalVars.lineauger if line.filterLevel(low_level, high_level, auger_level, strict='na')]
-    else:
-        # Filter the auger rates data for the selected transition
-        aug_stick_val = [line for line in generalVars.lineauger if line.filterLevel(low_level, high_level, auger_level, strict='na') and line.filterJJI()]
+    # Look up the auger rates data for the selected transition
+    aug_stick_val = generalVars.lineauger.selection(low_level, high_level, auger_level, strict='na', jj_vals=generalVars.jj_vals)
 
     return num_of_transitions, aug_stick_val
 
+# Filter the lines of a transition in the tables of a charge state
+def filterChargeState(tables: ChargeStateRates, charge_states: List[str], mix_values: list, cs: str,
+                      low_level: str, high_level: str, auger_level: str = '', *, strict: str) -> LineTable:
+    """
+    Function to filter the lines of a transition in the rates tables of a charge state, setting their mixture value
+        
+        Args:
+            tables: rates tables of each charge state
+            charge_states: charge state of each table
+            mix_values: interface variables with the mixture value of each table
+            cs: charge state to filter
+            low_level, high_level, auger_level, strict: level filter of the transition, as in levelPredicates
+        
+        Returns:
+            table with the lines of the transition in the charge state
+    """
+    selected: List[LineTable] = []
+    for i, charge_state in enumerate(charge_states):
+        if charge_state == cs:
+            # Only the tables of this charge state are read
+            selected.append(tables[i].selection(low_level, high_level, auger_level, strict=strict, jj_vals=generalVars.jj_vals).setMixValue(float(mix_values[i].get())))
+    
+    return LineTable.joined(selected)
+
 # Update the radiative and satellite rates for the selected transition and charge state
 def updateRadCSTrantitionsVals(transition: str, num: int, ncs: bool, cs: str):
     """
@@ -154,29 +222,14 @@ def updateRadCSTrantitionsVals(transition: str, num: int, ncs: bool, cs: str):
     low_level: str = generalVars.the_dictionary[transition]["low_level"] # type: ignore
     high_level: str = generalVars.the_dictionary[transition]["high_level"] # type: ignore
     
-    if len(generalVars.jj_vals) == 0:
-        # Filter the radiative and satellite rates data for the selected transition and charge state
-        if not ncs:
-            diag_stick_val = [line.setMixValue(float(guiVars.PCS_radMixValues[i].get())) for i, linerad in enumerate(generalVars.lineradrates_PCS) for line in linerad if line.filterLevel(low_level, high_level, strict='h') and generalVars.rad_PCS[i] == cs]
-        else:
-            diag_stick_val = [line.setMixValue(float(guiVars.NCS_radMixValues[i].get())) for i, linerad in enumerate(generalVars.lineradrates_NCS) for line in linerad if line.filterLevel(low_level, high_level, strict='h') and generalVars.rad_NCS[i] == cs]
-
-        if not ncs:
-            sat_stick_val = [line.setMixValue(float(guiVars.PCS_radMixValues[generalVars.rad_PCS.index(cs)].get())) for i, linesat in enumerate(generalVars.linesatellites_PCS) for line in linesat if line.filterLevel(low_level, high_level, strict='na') and generalVars.sat_PCS[i] == cs]
-        else:
-            sat_stick_val = [line.setMixValue(float(guiVars.NCS_radMixValues[generalVars.rad_NCS.index(cs)].get())) for i, linesat in enumerate(generalVars.linesatellites_NCS) for line in linesat if line.filterLevel(low_level, high_level, strict='na') and generalVars.sat_NCS[i] == cs]
+    # Filter the radiative and satellite rates data for the selected transition and charge state
+    if not ncs:
+        diag_stick_val = filterChargeState(generalVars.lineradrates_PCS, generalVars.rad_PCS, guiVars.PCS_radMixValues, cs, low_level, high_level, strict='h')
+        sat_stick_val = filterChargeState(generalVars.linesatellites_PCS, generalVars.sat_PCS, [guiVars.PCS_radMixValues[generalVars.rad_PCS.index(cs)]] * len(generalVars.sat_PCS), cs, low_level, high_level, strict='na')
     else:
-        # Filter the radiative and satellite rates data for the selected transition and charge state
-        if not ncs:
-            diag_stick_val = [line.setMixValue(float(guiVars.PCS_radMixValues[i].get())) for i, linerad in enumerate(generalVars.lineradrates_PCS) for line in linerad if line.filterLevel(low_level, high_level, strict='h') and generalVars.rad_PCS[i] == cs and line.filterJJI()]
-        else:
-            diag_stick_val = [line.setMixValue(float(guiVars.NCS_radMixValues[i].get())) for i, linerad in enumerate(generalVars.lineradrates_NCS) for line in linerad if line.filterLevel(low_level, high_level, strict='h') and generalVars.rad_NCS[i] == cs and line.filterJJI()]
-
-        if not ncs:
-            sat_stick_val = [line.setMixValue(float(guiVars.PCS_radMixValues[generalVars.rad_PCS.index(cs)].get())) for i, linesat in enumerate(generalVars.linesatellites_PCS) for line in linesat if line.filterLevel(low_level, high_level, strict='na') and generalVars.sat_PCS[i] == cs and line.filterJJI()]
-        else:
-            sat_stick_val = [line.setMixValue(float(guiVars.NCS_radMixValues[generalVars.rad_NCS.index(cs)].get())) for i, linesat in enumerate(generalVars.linesatellites_NCS) for line in linesat if line.filterLevel(low_level, high_level, strict='na') and generalVars.sat_NCS[i] == cs and line.filterJJI()]
-        
+        diag_stick_val = filterChargeState(generalVars.lineradrates_NCS, generalVars.rad_NCS, guiVars.NCS_radMixValues, cs, low_level, high_level, strict='h')
+        sat_stick_val = filterChargeState(generalVars.linesatellites_NCS, generalVars.sat_NCS, [guiVars.NCS_radMixValues[generalVars.rad_NCS.index(cs)]] * len(generalVars.sat_NCS), cs, low_level, high_level, strict='na')
+    
     return num_of_transitions, low_level, high_level, diag_stick_val, sat_stick_val
 
 # Update the auger rates for the selected transition and charge state
@@ -198,21 +251,83 @@ def updateAugCSTransitionsVals(transition: str, num: int, ncs: bool, cs: str):
     # Update the number of transitions loaded (this could be done by reference as well)
     num_of_transitions = num + 1
     # Get the low, high and auger levels for the selected transition
-    low_level: str = the_aug_dictionary[transition]["low_level"] # type: ignore
-    high_level: str = the_aug_dictionary[transition]["high_level"] # type: ignore
-    auger_level: str = the_aug_dictionary[transition]["auger_level"] # type: ignore
+    low_level: str = generalVars.the_aug_dictionary[transition]["low_level"] # type: ignore
+    high_level: str = generalVars.the_aug_dictionary[transition]["high_level"] # type: ignore
+    auger_level: str = generalVars.the_aug_dictionary[transition]["auger_level"] # type: ignore
     
-    if len(generalVars.jj_vals) == 0:
-        # Filter the auger rates data for the selected transition and charge state
-        if not ncs:
-            aug_stick_val = [line.setMixValue(float(guiVars.PCS_augMixValues[i].get())) for i, lineaug in enumerate(generalVars.lineaugrates_PCS) for line in lineaug if line.filterLevel(low_level, high_level, auger_level, strict='na') and generalVars.aug_PCS[i] == cs]
-        else:
-            aug_stick_val = [line.setMixValue(float(guiVars.NCS_augMixValues[i].get())) for i, lineaug in enumerate(generalVars.lineaugrates_NCS) for line in lineaug if line.filterLevel(low_level, high_level, auger_level, strict='na') and generalVars.aug_PCS[i] == cs]
+    # Filter the auger rates data for the selected transition and charge state
+    if not ncs:
+        aug_stick_val = filterChargeState(generalVars.lineaugrates_PCS, generalVars.aug_PCS, guiVars.PCS_augMixValues, cs, low_level, high_level, auger_level, strict='na')
     else:
-        # Filter the auger rates data for the selected transition and charge state
-        if not ncs:
-            aug_stick_val = [line.setMixValue(float(guiVars.PCS_augMixValues[i].get())) for i, lineaug in enumerate(generalVars.lineaugrates_PCS) for line in lineaug if line.filterLevel(low_level, high_level, auger_level, strict='na') and generalVars.aug_PCS[i] == cs and line.filterJJI()]
-        else:
-            aug_stick_val = [line.setMixValue(float(guiVars.NCS_augMixValues[i].get())) for i, lineaug in enumerate(generalVars.lineaugrates_NCS) for line in lineaug if line.filterLevel(low_level, high_level, auger_level, strict='na') and generalVars.aug_PCS[i] == cs and line.filterJJI()]
+        aug_stick_val = filterChargeState(generalVars.lineaugrates_NCS, generalVars.aug_NCS, guiVars.NCS_augMixValues, cs, low_level, high_level, auger_level, strict='na')
 
     return num_of_transitions, aug_stick_val
+
+# Build the index of the lines of each transition
+def indexTransitions():
+    """
+    Function to build the index of the lines of every transition in the dictionaries, for the loaded rates and charge states.
+    This is done once when the element is loaded, so selecting a transition during the simulations and fits is a lookup.
+    The satellites of each transition are also grouped by shake level, shake-off and shake-up.
+    Only the charge states already read are indexed, the others are indexed by loadChargeStates when they are read.
+    Selections of 2J values are added to the index the first time they are used
+    """
+    for transition in generalVars.the_dictionary:
+        low_level: str = generalVars.the_dictionary[transition]["low_level"] # type: ignore
+        high_level: str = generalVars.the_dictionary[transition]["high_level"] # type: ignore
+        
+        generalVars.lineradrates.select(low_level, high_level, strict='h')
+        for table in generalVars.lineradrates_PCS.loaded() + generalVars.lineradrates_NCS.loaded():
+            table.select(low_level, high_level, strict='h')
+        
+        # Satellite tables of the transition, as selected by updateRadTransitionVals and updateRadCSTrantitionsVals
+        sat_tables = [generalVars.linesatellites.selection(low_level, high_level, strict='na')]
+        if generalVars.Shakeup_exists:
+            sat_tables[0] = LineTable.joined([sat_tables[0], generalVars.lineshakeup.selection(low_level, high_level, strict='na')])
+        for tables, charge_states in [(generalVars.linesatellites_PCS, generalVars.sat_PCS), (generalVars.linesatellites_NCS, generalVars.sat_NCS)]:
+            for cs in dict.fromkeys(charge_states):
+                cs_tables = [tables.tables[i] for i, charge_state in enumerate(charge_states) if charge_state == cs]
+                if all(table is not None for table in cs_tables):
+                    sat_tables.append(LineTable.joined([table.selection(low_level, high_level, strict='na') for table in cs_tables])) # type: ignore
+        
+        # Shake level groups of the satellites
+        for sat_table in sat_tables:
+            for key in generalVars.label1:
+                satShakeIndexes(low_level, high_level, key, sat_table)
+                if generalVars.Shakeup_exists:
+                    satShakeIndexes(low_level, high_level, key, sat_table, True)
+    
+    for transition in generalVars.the_aug_dictionary:
+        low_level: str = generalVars.the_aug_dictionary[transition]["low_level"] # type: ignore
+        high_level: str = generalVars.the_aug_dictionary[transition]["high_level"] # type: ignore
+        auger_level: str = generalVars.the_aug_dictionary[transition]["auger_level"] # type: ignore
+        
+        generalVars.lineauger.select(low_level, high_level, auger_level, strict='na')
+        for table in generalVars.lineaugrates_PCS.loaded() + generalVars.lineaugrates_NCS.loaded():
+            table.select(low_level, high_level, auger_level, strict='na')
+
+# Read the rates of the charge states to simulate
+def loadChargeStates(ploted_cs: List[str], auger: bool = False):
+    """
+    Function to read the rates files of the charge states to simulate that were not read yet, in parallel, and index their transitions.
+    The other charge states are never read
+        
+        Args:
+            ploted_cs: charge states to simulate (with a mixture value that is not 0)
+            auger: read the auger rates instead of the radiative and satellite rates
+    """
+    if auger:
+        sources = [(generalVars.lineaugrates_PCS, generalVars.aug_PCS), (generalVars.lineaugrates_NCS, generalVars.aug_NCS)]
+    else:
+        sources = [(generalVars.lineradrates_PCS, generalVars.rad_PCS), (generalVars.lineradrates_NCS, generalVars.rad_NCS)]
+        if 'Satellites' in guiVars.satelite_var.get(): # type: ignore
+            sources += [(generalVars.linesatellites_PCS, generalVars.sat_PCS), (generalVars.linesatellites_NCS, generalVars.sat_NCS)]
+    
+    missing = False
+    for tables, charge_states in sources:
+        indexes = [i for i, cs in enumerate(charge_states) if cs in ploted_cs]
+        missing = missing or any(tables.tables[i] is None for i in indexes)
+        tables.load(indexes)
+    
+    if missing:
+        indexTransitions()
@@ -0,0 +1,262 @@
+"""
+Module with the parallel multi-start fit mode.
+Several local fits are started from points spread over the parameter bounds and run in a process pool,
+each worker holding a read-only copy of the loaded line data. The worst starts are dropped after each round.
+"""
+
+from __future__ import annotations
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from scipy.stats import qmc
+
+from lmfit import Parameters
+
+from utils.misc.progress import ProgressReporter, NullProgress
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+from types import ModuleType
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from tkinter import Variable
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                  WORKER PROCESS STATE                     #
+#                                                           #
+# --------------------------------------------------------- #
+
+class FrozenVar():
+    """
+    Class to replace an interface variable in the worker processes with its value at the start of the fit
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+# Copy the interface values needed by the simulation
+def interface_snapshot() -> dict:
+    """
+    Function to read the values of all the interface variables, the tkinter variables can not be used outside the interface process.
+    Frozen variables installed in place of the tkinter variables are also read
+
+        Returns:
+            dictionary with the value of each interface variable
+    """
+    snapshot = {}
+    for name, value in vars(guiVars).items():
+        if isinstance(value, (Variable, FrozenVar)):
+            snapshot[name] = value.get()
+        elif isinstance(value, list) and len(value) > 0 and all(isinstance(item, (Variable, FrozenVar)) for item in value):
+            # Lists of variables, like the charge state mixture values
+            snapshot[name] = [item.get() for item in value]
+
+    return snapshot
+
+# Copy the loaded data used by the simulation
+def general_snapshot() -> dict:
+    """
+    Function to copy the global data variables (line data, shake weights, dictionaries, experimental spectrum) to send to the workers
+
+        Returns:
+            dictionary with the value of each global data variable
+    """
+    return {name: value for name, value in vars(generalVars).items() if not name.startswith('_') and not isinstance(value, (ModuleType, type)) and not callable(value)}
+
+# Start the worker processes
+def worker_context() -> multiprocessing.context.BaseContext:
+    """
+    Function to get the context used to start the worker processes.
+    The workers are spawned instead of forked, as forking the interface process also copies the tkinter state and its threads
+
+        Returns:
+            the spawn multiprocessing context
+    """
+    return multiprocessing.get_context('spawn')
+
+# Initialize the state of a worker process
+def init_worker(general_state: dict, config: dict | None):
+    """
+    Function to initialize a worker process with the loaded data and the configuration of the simulation
+
+        Args:
+            general_state: global data variables copied from the interface process
+            config: configuration in the layout of SimulationConfig.to_dict, installed in place of the interface variables (not installed if None)
+    """
+    from simulation.headless import SimulationConfig
+
+    for name, value in general_state.items():
+        setattr(generalVars, name, value)
+
+    if config is not None:
+        SimulationConfig.from_dict(config).apply()
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                    MULTI-START FIT                        #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Run one local fit
+def fit_start(specs: List[Tuple[str, float, float, float, bool]], max_nfev: int | None, fit_args: tuple) -> Tuple[float, Dict[str, float], int]:
+    """
+    Function to run a local fit from a starting point, used by the worker processes
+
+        Args:
+            specs: name, value, minimum, maximum and vary flag of each parameter
+            max_nfev: maximum number of function evaluations of this run (None for no limit)
+            fit_args: arguments of func2min after the interface window (exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+
+        Returns:
+            chisqr: chi^2 of the fit
+            values: fitted value of each parameter
+            nfev: number of function evaluations used
+    """
+    from simulation.fitting import minimize_lmfit
+
+    params = Parameters()
+    for name, value, minimum, maximum, vary in specs:
+        params.add(name, value=value, min=minimum, max=maximum, vary=vary)
+
+    result = minimize_lmfit(params, None, fit_args, max_nfev=max_nfev)
+
+    return float(result.chisqr), {name: result.params[name].value for name in result.params}, int(result.nfev) # type: ignore
+
+# Spread the starting points over the parameter bounds
+def starting_points(params: Parameters, n_starts: int, seed: int = 0) -> List[Dict[str, float]]:
+    """
+    Function to spread the starting points over the bounds of the varying parameters with a latin hypercube.
+    The first start is always the initial values, parameters without finite bounds keep their initial value
+
+        Args:
+            params: initialized fit parameters
+            n_starts: number of starting points
+            seed: seed of the latin hypercube sampler
+
+        Returns:
+            list with the starting value of each parameter for each start
+    """
+    names = [name for name in params if params[name].vary and np.isfinite(params[name].min) and np.isfinite(params[name].max)]
+
+    starts = [{name: params[name].value for name in params}]
+    if n_starts > 1 and len(names) > 0:
+        samples = qmc.LatinHypercube(d=len(names), seed=seed).random(n_starts - 1)
+        lower = np.array([params[name].min for name in names])
+        upper = np.array([params[name].max for name in names])
+        for sample in qmc.scale(samples, lower, upper):
+            start = dict(starts[0])
+            start.update(dict(zip(names, sample)))
+            starts.append(start)
+
+    return starts
+
+# Fit from several starting points in parallel
+def multistart_fit(params: Parameters, fit_args: tuple, n_starts: int = 16, workers: int | None = None,
+                   rounds: int = 3, round_nfev: int = 20, keep_fraction: float = 0.5,
+                   progress: ProgressReporter | None = None) -> Tuple[Parameters, dict]:
+    """
+    Function to run the local fits from several starting points in a process pool.
+    The starts run in rounds with a growing budget of function evaluations, after each round only the best fraction continues
+    from where it stopped, and the last round runs without a budget
+
+        Args:
+            params: initialized fit parameters
+            fit_args: arguments of func2min after the interface window
+            n_starts: number of starting points
+            workers: number of worker processes (number of cores if None)
+            rounds: number of rounds, including the last one without a budget
+            round_nfev: budget of function evaluations of the first round, doubled in each round
+            keep_fraction: fraction of the starts that continue after each round
+            progress: reporter of the finished starts of each round (nothing is reported if None)
+
+        Returns:
+            best: parameters with the values of the best start
+            spread: chi^2 of each start, the round after which each start was dropped (None for the starts that finished)
+                    and the minimum, maximum and standard deviation of each parameter across the starts that finished
+    """
+    from simulation.headless import SimulationConfig
+
+    workers = workers if workers is not None else os.cpu_count() or 1
+    progress = progress if progress is not None else NullProgress()
+
+    starts = starting_points(params, n_starts)
+    chisqrs = [np.inf] * len(starts)
+    dropped: List[int | None] = [None] * len(starts)
+    alive = list(range(len(starts)))
+
+    config = SimulationConfig.from_interface().to_dict()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(), initializer=init_worker, initargs=(general_snapshot(), config)) as pool:
+        for round_index in range(rounds):
+            last = round_index == rounds - 1
+            max_nfev = None if last else round_nfev * 2 ** round_index
+
+            futures = {}
+            for i in alive:
+                specs = [(name, starts[i][name], params[name].min, params[name].max, params[name].vary) for name in params]
+                futures[i] = pool.submit(fit_start, specs, max_nfev, fit_args)
+
+            stage = "Multi-start round " + str(round_index + 1) + "/" + str(rounds)
+            progress.report(stage, 0, len(futures))
+            for done, (i, future) in enumerate(futures.items()):
+                chisqrs[i], starts[i], _ = future.result()
+                progress.report(stage, done + 1, len(futures))
+
+            if not last:
+                # Drop the starts that are losing, their chi^2 is from a fit cut short by the budget of this round
+                ranked = sorted(alive, key=lambda i: chisqrs[i])
+                alive = ranked[:max(1, int(np.ceil(len(alive) * keep_fraction)))]
+                for i in ranked[len(alive):]:
+                    dropped[i] = round_index + 1
+
+    best_index = int(np.argmin(chisqrs))
+
+    best = params.copy()
+    for name in best:
+        best[name].value = starts[best_index][name]
+
+    # The spread of the parameters only includes the starts that ran to convergence
+    spread = {'chisqr': chisqrs, 'dropped': dropped}
+    for name in params:
+        values = np.array([starts[i][name] for i in alive])
+        spread[name] = {'min': float(values.min()), 'max': float(values.max()), 'std': float(values.std())}
+
+    return best, spread
+
+# Format the spread of the starts
+def spread_report(spread: dict) -> str:
+    """
+    Function to format the spread of the starts of a multi-start fit, to add to the fit report
+
+        Args:
+            spread: spread returned by multistart_fit
+
+        Returns:
+            text with the chi^2 of each start, labelled with the round where it was dropped, and the range of each parameter
+            that varied across the starts that finished
+    """
+    chisqrs = ["{:.6g}".format(chisqr) + ("" if dropped is None else " (dropped after round " + str(dropped) + ")")
+               for chisqr, dropped in zip(spread['chisqr'], spread['dropped'])]
+    finished = sum(dropped is None for dropped in spread['dropped'])
+    
+    lines = ["[[Multi-start]]", "    chi-square of each start: " + ", ".join(chisqrs),
+             "    parameter range across the " + str(finished) + " starts that finished:"]
+    for name, values in spread.items():
+        if name not in ['chisqr', 'dropped'] and values['max'] > values['min']:
+            lines.append("        " + name + ": min " + "{:.6g}".format(values['min']) + ", max " + "{:.6g}".format(values['max']) + ", std " + "{:.6g}".format(values['std']))
+
+    return "\n".join(lines) + "\n"
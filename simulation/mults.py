@@ -2,7 +2,9 @@
 Module with functions that calculate various multipliers for line intensities, such as excitation beam overlap and cascade boosts.
 """
 
-from data.definitions import Line
+from __future__ import annotations
+
+from data.definitions import Line, LineTable, BranchingRatios
 
 import interface.variables as guiVars
 import data.variables as generalVars
@@ -10,10 +12,11 @@ import data.variables as generalVars
 import math
 
 import numpy as np
+import numpy.typing as npt
 
 import scipy.integrate as integrate
 
-from typing import List, Dict
+from typing import Dict, Iterable, List, Tuple
 
 # --------------------------------------------------------- #
 #                                                           #
@@ -21,48 +24,197 @@ from typing import List, Dict
 #                                                           #
 # --------------------------------------------------------- #
 
+# Maximum number of (level, beam energy) pairs evaluated at once in the overlap integrals
+overlap_beam_chunk: int = 256
+"""
+Maximum number of (level, beam energy) pairs evaluated at once in the overlap integrals
+"""
+
+# Integration grid of the overlaps, in units of the level partial width around the formation energy
+overlap_grid: npt.NDArray[np.float64] = np.linspace(-100.0, 100.0, 3001, endpoint=True)
+"""
+Integration grid of the overlaps, in units of the level partial width around the formation energy
+"""
+
+# Calculated overlaps, for each level key, formation energy, partial width, beam energy (or array of beam energies) and beam FWHM
+overlap_cache: Dict[tuple, float | npt.NDArray[np.float64]] = {}
+"""
+Calculated overlaps, for each level key, formation energy, partial width, beam energy (or array of beam energies) and beam FWHM
+"""
+
+# Maximum number of overlaps kept in the cache, it is cleared when full
+overlap_cache_size: int = 500000
+"""
+Maximum number of overlaps kept in the cache, it is cleared when full
+"""
+
+# Find the formation energy and partial width of the initial level of a line
+def level_parameters(line: Line) -> tuple:
+    """
+    Function to find the formation energy and the partial width of the initial level of a line
+        
+        Args:
+            line: the data line of the transition
+        
+        Returns:
+            formationEnergy: energy necessary to form the level
+            pWidth: partial width of the level
+    """
+    if len(line.Shelli) <= 4:
+        if len(line.Shelli) == 2:
+            return generalVars.formationEnergies['diagram'][line.keyI()], generalVars.partialWidths['diagram'][line.keyI()]
+        else:
+            return generalVars.formationEnergies['satellite'][line.keyI()], generalVars.partialWidths['satellite'][line.keyI()]
+    else:
+        return generalVars.formationEnergies['shakeup'][line.keyI()], max(generalVars.partialWidths['shakeup'][line.keyI()], 1E-100)
+
+# Calculate the overlap integrals of several levels with several beam energies
+def overlap_integrals(formationEnergies: npt.NDArray[np.float64], pWidths: npt.NDArray[np.float64],
+                      beams: npt.NDArray[np.float64], FWHM: float) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the overlap integrals of the Lorentzian level profiles with the beam energy profile.
+    Below the beam energy the beam profile is the peak value of the level profile, so the integrand is the level profile,
+    and above it the integrand is the minimum of the level profile and the Gaussian tail of the beam.
+    The crossing points of the tail have no closed form, so the integral is calculated on the grid of each level for
+    all the (level, beam energy) pairs at once, in chunks
+        
+        Args:
+            formationEnergies: formation energy of each level
+            pWidths: partial width of each level
+            beams: beam energies (all > 0)
+            FWHM: the beam energy FWHM
+        
+        Returns:
+            overlaps: array with the overlap of each level (rows) with each beam energy (columns)
+    """
+    formationEnergies = np.asarray(formationEnergies, dtype=np.float64)
+    pWidths = np.asarray(pWidths, dtype=np.float64)
+    beams = np.asarray(beams, dtype=np.float64)
+    
+    # Flat (level, beam energy) pairs
+    levels = np.repeat(np.arange(len(formationEnergies)), len(beams))
+    pair_beams = np.tile(beams, len(formationEnergies))
+    
+    overlaps = np.empty(len(levels))
+    for start in range(0, len(levels), overlap_beam_chunk):
+        stop = min(start + overlap_beam_chunk, len(levels))
+        energy = formationEnergies[levels[start:stop], np.newaxis]
+        width = pWidths[levels[start:stop], np.newaxis]
+        x = energy + width * overlap_grid[np.newaxis, :]
+        
+        # Lorentzian level profile and its peak value, which is the beam profile value below the beam energy
+        l = (0.5 * width / np.pi) / ((x - energy) ** 2 + (0.5 * width) ** 2)
+        peak = (0.5 * width / np.pi) / ((0.5 * width) ** 2)
+        
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            g = np.where(x > pair_beams[start:stop, np.newaxis], peak * np.exp(-((x - pair_beams[start:stop, np.newaxis]) / FWHM) ** 2 * np.log(2)), peak)
+        
+        # The grid is uniform in units of the width, so the integral over energy is the width times the integral over the grid
+        overlaps[start:stop] = width[:, 0] * integrate.simpson(np.minimum(l, g), x=overlap_grid, axis=-1)
+    
+    return overlaps.reshape(len(formationEnergies), len(beams))
+
+# Key of an overlap in the cache
+def overlap_key(line: Line, formationEnergy: float, pWidth: float, beam: float | npt.NDArray[np.float64], FWHM: float) -> tuple:
+    beam_key = float(beam) if np.ndim(beam) == 0 else np.asarray(beam, dtype=np.float64).tobytes()
+    return (line.keyI(), formationEnergy, pWidth, beam_key, FWHM)
+
 # Calculate the overlap between the beam energy profile and the energy necessary to reach the level
-def get_overlap(line: Line, beam: float, FWHM: float) -> float:
+def get_overlap(line: Line, beam: float | npt.NDArray[np.float64], FWHM: float) -> float | npt.NDArray[np.float64]:
     """
-    Function to calculate the levels overlap with the beam energy profile
+    Function to calculate the levels overlap with the beam energy profile, the overlaps are cached
         
         Args:
             line: the data line of the transition that we want to find the ionization energy
-            beam: the beam energy introduced in the interface
+            beam: the beam energy introduced in the interface, or an array of beam energies for a beam energy scan
             FWHM: the beam energy FWHM introduced in the interface
-            shakeup: orbital where the shake-up electron ends in. If empty it is not a shake-up transition
 
         Returns:
-            overlap: the overlap
+            overlap: the overlap, or an array with the overlap for each beam energy
     """
     
-    if beam <= 0.0:
+    if np.ndim(beam) == 0 and beam <= 0.0:
         return 1.0
     
-    if len(line.Shelli) <= 4:
-        if len(line.Shelli) == 2:
-            formationEnergy = generalVars.formationEnergies['diagram'][line.keyI()]
-            pWidth = generalVars.partialWidths['diagram'][line.keyI()]
-        else:
-            formationEnergy = generalVars.formationEnergies['satellite'][line.keyI()]
-            pWidth = generalVars.partialWidths['satellite'][line.keyI()]
-    else:
-        formationEnergy = generalVars.formationEnergies['shakeup'][line.keyI()]
-        pWidth = max(generalVars.partialWidths['shakeup'][line.keyI()], 1E-100)
+    overlap = get_overlaps([line], beam, FWHM)[0]
+    
+    return float(overlap) if np.ndim(beam) == 0 else overlap
+
+# Calculate the overlaps of several lines
+def get_overlaps(lines: Iterable[Line], beam: float | npt.NDArray[np.float64], FWHM: float) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the overlaps of the initial levels of several lines with the beam energy profile.
+    The overlaps that are not in the cache are calculated together
+        
+        Args:
+            lines: the data lines of the transitions
+            beam: the beam energy, or an array of beam energies for a beam energy scan
+            FWHM: the beam energy FWHM
+        
+        Returns:
+            overlaps: array with the overlap of each line, with one column for each beam energy if beam is an array
+    """
+    lines = list(lines)
+    scalar = np.ndim(beam) == 0
+    beams = np.atleast_1d(np.asarray(beam, dtype=np.float64))
+    
+    if scalar and beams[0] <= 0.0:
+        return np.ones(len(lines))
     
+    if len(overlap_cache) > overlap_cache_size:
+        overlap_cache.clear()
     
-    def integrand(x):
-        l = (0.5 * pWidth / np.pi) / ((x - formationEnergy) ** 2 + (0.5 * pWidth) ** 2)
+    keys = []
+    missing: Dict[tuple, int] = {}
+    parameters = []
+    for line in lines:
+        formationEnergy, pWidth = level_parameters(line)
+        key = overlap_key(line, formationEnergy, pWidth, beam, FWHM)
+        keys.append(key)
+        if key not in overlap_cache and key not in missing:
+            missing[key] = len(parameters)
+            parameters.append((formationEnergy, pWidth))
+    
+    if len(parameters) > 0:
+        # Beam energies <= 0 disable the overlap
+        positive = beams > 0.0
+        calculated = np.ones((len(parameters), len(beams)))
+        if np.any(positive):
+            energies, widths = np.array(parameters).T
+            calculated[:, positive] = overlap_integrals(energies, widths, beams[positive], FWHM)
+        for key, index in missing.items():
+            overlap_cache[key] = float(calculated[index, 0]) if scalar else calculated[index]
+    
+    if scalar:
+        return np.array([overlap_cache[key] for key in keys], dtype=np.float64)
+    
+    return np.array([overlap_cache[key] for key in keys], dtype=np.float64).reshape(len(lines), len(beams))
+
+# Branching ratios index of the 2 hole levels
+def satelliteBRs() -> BranchingRatios:
+    """
+    Function to get the branching ratios index of the 2 hole levels, rebuilt if the ionization energies were replaced after it was built
         
-        if x > beam:
-            g = (0.5 * pWidth / np.pi) / ((0.5 * pWidth) ** 2) * np.exp(-((x - beam) / FWHM) ** 2 * np.log(2))
-        else:
-            g = (0.5 * pWidth / np.pi) / ((0.5 * pWidth) ** 2)
+        Returns:
+            the branching ratios index
+    """
+    if generalVars.satelliteBRs.levels is not generalVars.ionizationssat:
+        generalVars.satelliteBRs = BranchingRatios(generalVars.ionizationssat)
+    
+    return generalVars.satelliteBRs
+
+# Branching ratios index of the 1 hole levels
+def diagramBRs() -> BranchingRatios:
+    """
+    Function to get the branching ratios index of the 1 hole levels, rebuilt if the ionization energies were replaced after it was built
         
-        return min(l, g)
+        Returns:
+            the branching ratios index
+    """
+    if generalVars.diagramBRs.levels is not generalVars.ionizationsrad:
+        generalVars.diagramBRs = BranchingRatios(generalVars.ionizationsrad)
     
-    x = np.linspace(formationEnergy - 100 * pWidth, formationEnergy + 100 * pWidth, 3001, endpoint=True)
-    return integrate.simpson([integrand(x1) for x1 in x], x)
+    return generalVars.diagramBRs
 
 # Find the branching ratio from Auger process of a higher shell for the satellite transition
 def get_AugerBR(line: Line):
@@ -75,12 +227,7 @@ def get_AugerBR(line: Line):
         Returns:
             BR: the branching ratio
     """
-    if generalVars.ionizationssat is not None:
-        for level in generalVars.ionizationssat:
-                if line.filterInitialState(level):
-                    return level.br
-    
-    return 0.0
+    return satelliteBRs().br(line)
 
 
 # Find the branching ratio from Diagram process of a higher shell for the diagram transition
@@ -94,272 +241,190 @@ def get_DiagramBR(line: Line):
         Returns:
             BR: the branching ratio
     """
-    if generalVars.ionizationsrad is not None:
-        for level in generalVars.ionizationsrad:
-                if line.filterInitialState(level):
-                    return level.br
+    return diagramBRs().br(line)
+
+
+class CascadeGraph():
+    """
+    Class with the directed graph of the cascades between levels, built once from the rates.
+    The nodes are the level labels, with integer ids, and each line of the rates is an edge from its final level to its initial level.
+    The edges keep the order of the rates: a cascade continues through the first edge of its last level,
+    and the later edges of the level it reaches start the side cascades, which are followed in the same way
+    """
+    def __init__(self, sources: List[Tuple[LineTable, BranchingRatios]]):
+        """
+        Args:
+            sources: rates tables to follow, in order, with the branching ratios index of their lines
+        """
+        self.ids: Dict[str, int] = {}
+        
+        finals: List[int] = []
+        initials: List[int] = []
+        for table, _ in sources:
+            columns = [table.columns[name].tolist() for name in ['Shellf', 'jjf', 'eigvf', 'Shelli', 'jji', 'eigvi']]
+            for shellf, jjf, eigvf, shelli, jji, eigvi in zip(*columns):
+                finals.append(self.node(table.shells[shellf] + " " + str(jjf) + " " + str(eigvf)))
+                initials.append(self.node(table.shells[shelli] + " " + str(jji) + " " + str(eigvi)))
+        
+        # Out edges of each node in the order of the rates (compressed adjacency arrays)
+        finals_array = np.array(finals, dtype=np.int64)
+        self.edges = np.argsort(finals_array, kind='stable')
+        self.offsets = np.searchsorted(finals_array[self.edges], np.arange(len(self.ids) + 1))
+        self.targets = np.array(initials, dtype=np.int64)
+        
+        # Branching ratios of the edges, from the initial level of each line
+        self.brs: List[float] = np.concatenate([ratios.values(ratios.levelIds(table)) for table, ratios in sources] + [np.zeros(0)]).tolist()
+        # Cascade chain of each node and boosts of the side cascades started along it
+        self.chains: Dict[int, Tuple[List[int], List[int]]] = {}
+        self.side_boosts: Dict[int, Dict[int, float]] = {}
+    
+    # Id of a level label
+    def node(self, label: str) -> int:
+        if label not in self.ids:
+            self.ids[label] = len(self.ids)
+        return self.ids[label]
+    
+    # Out edges of a node
+    def out_edges(self, node: int) -> npt.NDArray[np.int64]:
+        if node >= len(self.offsets) - 1:
+            # Level that is not in the rates
+            return self.edges[:0]
+        return self.edges[self.offsets[node]:self.offsets[node + 1]]
+    
+    # Branching ratio of an edge
+    def edge_br(self, edge: int) -> float:
+        return self.brs[edge]
     
-    return 0.0
+    # Cascade chain of a node
+    def chain(self, node: int) -> Tuple[List[int], List[int]]:
+        """
+        Function to follow the cascade of a level through the first edge of each level it reaches
+        
+            Args:
+                node: id of the level
+            
+            Returns:
+                nodes: ids of the levels in the cascade, starting with the level
+                edges: ids of the edges between them
+        """
+        if node not in self.chains:
+            nodes = [node]
+            edges: List[int] = []
+            while len(self.out_edges(nodes[-1])) > 0:
+                edge = int(self.out_edges(nodes[-1])[0])
+                if int(self.targets[edge]) in nodes:
+                    raise RuntimeError("Error: cyclic cascade found at level " + list(self.ids)[nodes[-1]])
+                edges.append(edge)
+                nodes.append(int(self.targets[edge]))
+            self.chains[node] = (nodes, edges)
+        
+        return self.chains[node]
+    
+    # Boosts of the side cascades started along the chain of a node
+    def sides(self, node: int) -> Dict[int, float]:
+        """
+        Function to add up the boosts of all the side cascades started along the chain of a level, and along their own chains.
+        Each side cascade starts at a level reached by the chain, from an edge of that level after the edge the chain reached it with,
+        and its boost is the product of 1 + BR of its edges
+        
+            Args:
+                node: id of the level
+            
+            Returns:
+                dictionary with the sum of the (boost - 1) of the side cascades started at each level
+        """
+        if node not in self.side_boosts:
+            nodes, edges = self.chain(node)
+            boosts: Dict[int, float] = {}
+            if len(edges) > 0:
+                reached = nodes[1]
+                boosts.update(self.sides(reached))
+                for side in self.out_edges(reached):
+                    if side > edges[0]:
+                        start = int(self.targets[side])
+                        side_edges = self.chain(start)[1]
+                        boosts[reached] = boosts.get(reached, 0.0) + math.prod([self.edge_br(int(side)) + 1] + [self.edge_br(edge) + 1 for edge in side_edges]) - 1
+                        for level, boost in self.sides(start).items():
+                            boosts[level] = boosts.get(level, 0.0) + boost
+            self.side_boosts[node] = boosts
+        
+        return self.side_boosts[node]
+    
+    # Total cascade boost of a level
+    def boost(self, level: Line, levelBR: float) -> float:
+        """
+        Function to calculate the cascade boost of a level, combining its cascade chain with the side cascades
+        
+            Args:
+                level: the level line
+                levelBR: branching ratio of the level
+            
+            Returns:
+                totalBoost: the cascade boost
+        """
+        nodes, edges = self.chain(self.node(level.labelI()))
+        brs = [levelBR] + [self.edge_br(edge) for edge in edges]
+        sides = self.sides(nodes[0])
+        
+        totalBoost = 0.0
+        for i in range(len(nodes) - 1, -1, -1):
+            if nodes[i] in sides:
+                totalBoost += math.prod(brs[i:]) + sides[nodes[i]]
+            else:
+                totalBoost = (totalBoost + 1) * (brs[i] + 1) - 1
+        
+        return totalBoost
 
 
 def get_cascadeBoost(cascadeType: str):
-    
+    """
+    Function to calculate the cascade boosts of the levels of the selected type, if they were not calculated yet.
+    The cascade graph of the rates is built once and the boosts of all levels are calculated from it
+        
+        Args:
+            cascadeType: type of the levels (diagram, auger or satellite)
+        
+        Returns:
+            Initials: initial labels of the levels
+            Finals: final labels of the levels
+            MatrixDict: intensity of each level
+    """
     Initials: List[str] = []
     Finals: List[str] = []
     MatrixDict: Dict[str, float] = {}
     
     if cascadeType == 'diagram':
-        if len(generalVars.radBoostMatrixDict) == 0:
-            for level in generalVars.diagramwidths:
-                initial = level.labelI()
-                final = level.labelF()
-                Initials.append(initial)
-                Finals.append(final)
-                
-                MatrixDict[level.key()] = level.intensity
-                
-                cascades = [[initial]]
-                cascadesBRs = [[get_DiagramBR(level)]]
-                
-                casc_idx = 0
-                depth = 0
-                
-                while True:
-                    depth_found = False
-                    curr_cascade = cascades[casc_idx].copy()
-                    
-                    for line in generalVars.lineradrates:
-                        if line.labelF() == cascades[casc_idx][depth] and not depth_found:
-                            cascades[casc_idx].append(line.labelI())
-                            depth += 1
-                            depth_found = True
-                            
-                            cascadesBRs[casc_idx].append(get_DiagramBR(line))
-                        elif line.labelF() == cascades[casc_idx][depth] and depth_found:
-                            cascades.append([line.labelF(), line.labelI()])
-                            cascadesBRs.append([get_DiagramBR(line)])
-                    
-                    if curr_cascade == cascades[casc_idx]:
-                        if len(cascades) > casc_idx + 1:
-                            casc_idx += 1
-                            depth = 1
-                        else:
-                            break
-                
-                root_cascade_idx = 0
-                totalBoosts_perCascade: Dict[str, float] = {}
-                knots: Dict[str, int] = {}
-                for i, cascade in enumerate(cascades):
-                    if cascade[0] == initial:
-                        root_cascade_idx = i
-                    else:
-                        if cascade[0] not in totalBoosts_perCascade:
-                            totalBoosts_perCascade[cascade[0]] = math.prod([br + 1 for br in cascadesBRs[i]])
-                            knots[cascade[0]] = 0
-                        else:
-                            knots[cascade[0]] += 1
-                            totalBoosts_perCascade[cascade[0] + "_" + str(knots[cascade[0]])] = math.prod([br + 1 for br in cascadesBRs[i]])
-
-                totalBoost = 0.0
-                for l in cascades[root_cascade_idx][::-1]:
-                    i = cascades[root_cascade_idx].index(l)
-                    if l in totalBoosts_perCascade:
-                        preCascadeBoost = totalBoosts_perCascade[l] - 1
-                        
-                        if l in knots:
-                            for knot in range(knots[l]):
-                                preCascadeBoost += totalBoosts_perCascade[l + "_" + str(knot)] - 1
-                            
-                            totalBoost += math.prod(cascadesBRs[root_cascade_idx][i:]) + preCascadeBoost
-                    else:
-                        totalBoost = (totalBoost + 1) * (cascadesBRs[root_cascade_idx][i] + 1) - 1
-                
-                generalVars.radBoostMatrixDict[level.key()] = totalBoost
-        else:
-            for level in generalVars.diagramwidths:
-                initial = level.labelI()
-                final = level.labelF()
-                Initials.append(initial)
-                Finals.append(final)
-                
-                MatrixDict[level.key()] = level.intensity
+        levels = generalVars.diagramwidths
+        boostDict = generalVars.radBoostMatrixDict
+        sources = [(generalVars.lineradrates, diagramBRs())]
+        levelBR = get_DiagramBR
     elif cascadeType == 'auger':
-        if len(generalVars.augBoostMatrixDict) == 0:
-            for level in generalVars.augerwidths:
-                initial = level.labelI()
-                final = level.labelF()
-                Initials.append(initial)
-                Finals.append(final)
-                
-                MatrixDict[level.key()] = level.intensity
-                
-                cascades = [[initial]]
-                cascadesBRs = [[get_DiagramBR(level)]]
-                
-                casc_idx = 0
-                depth = 0
-                
-                while True:
-                    depth_found = False
-                    curr_cascade = cascades[casc_idx].copy()
-                    
-                    for line in generalVars.lineauger:
-                        if line.labelF() == cascades[casc_idx][depth] and not depth_found:
-                            cascades[casc_idx].append(line.labelI())
-                            depth += 1
-                            depth_found = True
-                            
-                            cascadesBRs[casc_idx].append(get_DiagramBR(line))
-                        elif line.labelF() == cascades[casc_idx][depth] and depth_found:
-                            cascades.append([line.labelF(), line.labelI()])
-                            cascadesBRs.append([get_DiagramBR(line)])
-                    
-                    for line in generalVars.lineradrates:
-                        if line.labelF() == cascades[casc_idx][depth] and not depth_found:
-                            cascades[casc_idx].append(line.labelI())
-                            depth += 1
-                            depth_found = True
-                            
-                            cascadesBRs[casc_idx].append(get_DiagramBR(line))
-                        elif line.labelF() == cascades[casc_idx][depth] and depth_found:
-                            cascades.append([line.labelF(), line.labelI()])
-                            cascadesBRs.append([get_DiagramBR(line)])
-                    
-                    if curr_cascade == cascades[casc_idx]:
-                        if len(cascades) > casc_idx + 1:
-                            casc_idx += 1
-                            depth = 1
-                        else:
-                            break
-                
-                root_cascade_idx = 0
-                totalBoosts_perCascade: Dict[str, float] = {}
-                knots: Dict[str, int] = {}
-                for i, cascade in enumerate(cascades):
-                    if cascade[0] == initial:
-                        root_cascade_idx = i
-                    else:
-                        if cascade[0] not in totalBoosts_perCascade:
-                            totalBoosts_perCascade[cascade[0]] = math.prod([br + 1 for br in cascadesBRs[i]])
-                            knots[cascade[0]] = 0
-                        else:
-                            knots[cascade[0]] += 1
-                            totalBoosts_perCascade[cascade[0] + "_" + str(knots[cascade[0]])] = math.prod([br + 1 for br in cascadesBRs[i]])
-
-                totalBoost = 0.0
-                for l in cascades[root_cascade_idx][::-1]:
-                    i = cascades[root_cascade_idx].index(l)
-                    if l in totalBoosts_perCascade:
-                        preCascadeBoost = totalBoosts_perCascade[l] - 1
-                        
-                        if l in knots:
-                            for knot in range(knots[l]):
-                                preCascadeBoost += totalBoosts_perCascade[l + "_" + str(knot)] - 1
-                            
-                            totalBoost += math.prod(cascadesBRs[root_cascade_idx][i:]) + preCascadeBoost
-                    else:
-                        totalBoost = (totalBoost + 1) * (cascadesBRs[root_cascade_idx][i] + 1) - 1
-                
-                generalVars.augBoostMatrixDict[level.key()] = totalBoost
-        else:
-            for level in generalVars.augerwidths:
-                initial = level.labelI()
-                final = level.labelF()
-                Initials.append(initial)
-                Finals.append(final)
-                
-                MatrixDict[level.key()] = level.intensity
+        levels = generalVars.augerwidths
+        boostDict = generalVars.augBoostMatrixDict
+        sources = [(generalVars.lineauger, diagramBRs()), (generalVars.lineradrates, diagramBRs())]
+        levelBR = get_DiagramBR
     elif cascadeType == 'satellite':
-        if len(generalVars.satBoostMatrixDict) == 0:
-            for level in generalVars.satellitewidths:
-                initial = level.labelI()
-                final = level.labelF()
-                Initials.append(initial)
-                Finals.append(final)
-                
-                MatrixDict[level.key()] = level.intensity
-                
-                cascades = [[initial]]
-                cascadesBRs = [[get_AugerBR(level)]]
-                
-                casc_idx = 0
-                depth = 0
-                
-                while True:
-                    depth_found = False
-                    curr_cascade = cascades[casc_idx].copy()
-                    
-                    for line in generalVars.linesatellites:
-                        if line.labelF() == cascades[casc_idx][depth] and not depth_found:
-                            cascades[casc_idx].append(line.labelI())
-                            depth += 1
-                            depth_found = True
-                            
-                            cascadesBRs[casc_idx].append(get_AugerBR(line))
-                        elif line.labelF() == cascades[casc_idx][depth] and depth_found:
-                            cascades.append([line.labelF(), line.labelI()])
-                            cascadesBRs.append([get_AugerBR(line)])
-                    
-                    for line in generalVars.lineauger:
-                        if line.labelF() == cascades[casc_idx][depth] and not depth_found:
-                            cascades[casc_idx].append(line.labelI())
-                            depth += 1
-                            depth_found = True
-                            
-                            cascadesBRs[casc_idx].append(get_DiagramBR(line))
-                        elif line.labelF() == cascades[casc_idx][depth] and depth_found:
-                            cascades.append([line.labelF(), line.labelI()])
-                            cascadesBRs.append([get_DiagramBR(line)])
-                    
-                    for line in generalVars.lineradrates:
-                        if line.labelF() == cascades[casc_idx][depth] and not depth_found:
-                            cascades[casc_idx].append(line.labelI())
-                            depth += 1
-                            depth_found = True
-                            
-                            cascadesBRs[casc_idx].append(get_DiagramBR(line))
-                        elif line.labelF() == cascades[casc_idx][depth] and depth_found:
-                            cascades.append([line.labelF(), line.labelI()])
-                            cascadesBRs.append([get_DiagramBR(line)])
-                    
-                    if curr_cascade == cascades[casc_idx]:
-                        if len(cascades) > casc_idx + 1:
-                            casc_idx += 1
-                            depth = 1
-                        else:
-                            break
-                
-                root_cascade_idx = 0
-                totalBoosts_perCascade: Dict[str, float] = {}
-                knots: Dict[str, int] = {}
-                for i, cascade in enumerate(cascades):
-                    if cascade[0] == initial:
-                        root_cascade_idx = i
-                    else:
-                        if cascade[0] not in totalBoosts_perCascade:
-                            totalBoosts_perCascade[cascade[0]] = math.prod([br + 1 for br in cascadesBRs[i]])
-                            knots[cascade[0]] = 0
-                        else:
-                            knots[cascade[0]] += 1
-                            totalBoosts_perCascade[cascade[0] + "_" + str(knots[cascade[0]])] = math.prod([br + 1 for br in cascadesBRs[i]])
-
-                totalBoost = 0.0
-                for l in cascades[root_cascade_idx][::-1]:
-                    i = cascades[root_cascade_idx].index(l)
-                    if l in totalBoosts_perCascade:
-                        preCascadeBoost = totalBoosts_perCascade[l] - 1
-                        
-                        if l in knots:
-                            for knot in range(knots[l]):
-                                preCascadeBoost += totalBoosts_perCascade[l + "_" + str(knot)] - 1
-                            
-                            totalBoost += math.prod(cascadesBRs[root_cascade_idx][i:]) + preCascadeBoost
-                    else:
-                        totalBoost = (totalBoost + 1) * (cascadesBRs[root_cascade_idx][i] + 1) - 1
-                
-                generalVars.satBoostMatrixDict[level.key()] = totalBoost
+        levels = generalVars.satellitewidths
+        boostDict = generalVars.satBoostMatrixDict
+        sources = [(generalVars.linesatellites, satelliteBRs()), (generalVars.lineauger, diagramBRs()), (generalVars.lineradrates, diagramBRs())]
+        levelBR = get_AugerBR
     else:
         raise RuntimeError("Error: unexpected cascade boost type: " + cascadeType + ". Implemented types are diagram, auger and satellite.")
     
+    calculate = len(boostDict) == 0
+    # The satellite levels are only listed when their boosts are calculated
+    if not calculate and cascadeType == 'satellite':
+        return Initials, Finals, MatrixDict
+    
+    graph = CascadeGraph(sources) if calculate else None
+    
+    for level in levels:
+        Initials.append(level.labelI())
+        Finals.append(level.labelF())
+        
+        MatrixDict[level.key()] = level.intensity
+        
+        if graph is not None:
+            boostDict[level.key()] = graph.boost(level, levelBR(level))
     
-    return Initials, Finals, MatrixDict
\ No newline at end of file
+    return Initials, Finals, MatrixDict
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import interface.variables as guiVars
 import data.variables as generalVars
 
@@ -8,16 +10,21 @@ from simulation.satellite import simu_sattelite
 from simulation.initializers import initialize_XYW
 
 from simulation.lineUpdater import updateRadTransitionVals, updateAugTransitionVals,\
-                                    updateRadCSTrantitionsVals, updateAugCSTransitionsVals
+                                    updateRadCSTrantitionsVals, updateAugCSTransitionsVals, loadChargeStates
 
 from utils.misc.badReporters import simu_check_bads, Msimu_check_bads, report_MbadSelection
 
 from typing import List
 
+import numpy as np
+import numpy.typing as npt
+
 
-def process_simulation(shake_amps: dict = {}, prompt: bool = True):
+def process_simulation(shake_amps: dict = {}, prompt: bool = True, beam: float | npt.NDArray[np.float64] | None = None):
     sat: str = guiVars.satelite_var.get() # type: ignore
-    beam: float = guiVars.excitation_energy.get() # type: ignore
+    # The beam energy can be overridden by an array of beam energies for the beam energy scans, then each intensity is an array
+    if beam is None:
+        beam = guiVars.excitation_energy.get() # type: ignore
     FWHM: float = guiVars.excitation_energyFWHM.get() # type: ignore
     
     # Radiative and Auger code has to be split due to the different dictionaries used for the transitions
@@ -69,9 +76,10 @@ def process_simulation(shake_amps: dict = {}, prompt: bool = True):
 
 
 
-def process_Msimulation(shake_amps: dict = {}, prompt: bool = True):
+def process_Msimulation(shake_amps: dict = {}, prompt: bool = True, beam: float | npt.NDArray[np.float64] | None = None):
     sat = guiVars.satelite_var.get() # type: ignore  ## saber que tipo de transição 
-    beam = guiVars.excitation_energy.get() # type: ignore  ## Variável para manter o valor da energia de excitação/feixe introduzida pelo utilizador na interface
+    if beam is None:
+        beam = guiVars.excitation_energy.get() # type: ignore  ## Variável para manter o valor da energia de excitação/feixe introduzida pelo utilizador na interface
     FWHM = guiVars.excitation_energyFWHM.get() # type: ignore  ##Variável para manter o valor da energia de excitação/feixe FWHM introduzida pelo utilizador na interface  (largura total a meia altura)
     
     bad_selection = 0
@@ -106,6 +114,9 @@ def process_Msimulation(shake_amps: dict = {}, prompt: bool = True):
                 ploted_cs.append(cs)
                 cs_type.append(ncs)
 
+        # Read the rates of the charge states to plot, the other charge states are not needed
+        loadChargeStates(ploted_cs)
+        
         # Initialize the x, y and w arrays, taking into account the number of charge states to plot, for both the non satellites and satellites (xs, ys, ws) transitions
         x, y, w, xs, ys, ws = initialize_XYW('Radiative_CS', ploted_cs)
 
@@ -164,6 +175,9 @@ def process_Msimulation(shake_amps: dict = {}, prompt: bool = True):
                 ploted_cs.append(cs)
                 cs_type.append(ncs)
 
+        # Read the rates of the charge states to plot, the other charge states are not needed
+        loadChargeStates(ploted_cs, True)
+        
         # Initialize the x, y and w arrays, taking into account the number of charge states to plot, for both the non satellites and satellites (xs, ys, ws) transitions
         x, y, w, xs, ys, ws = initialize_XYW('Auger_CS', ploted_cs)
         
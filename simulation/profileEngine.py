@@ -0,0 +1,525 @@
+"""
+Module with the batched line profile engine used to calculate the simulated intensities.
+"""
+
+from __future__ import annotations
+
+
+import numpy as np
+import numpy.typing as npt
+
+from scipy.special import erfc, erfcx
+from scipy.fft import rfft, irfft, next_fast_len
+
+from typing import Callable, List, Tuple
+
+
+# Maximum number of profile values (lines x points) evaluated at once by the batched engine
+max_chunk_elements: int = 2 ** 21
+"""
+Maximum number of profile values (lines x points) evaluated at once by the batched engine.
+This bounds the memory of each chunk to a few tens of MB, even for the complex valued Voigt profile.
+"""
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#         FUNCTIONS TO FLATTEN THE TRANSITION DATA          #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Flatten the nested per-transition line lists into flat arrays
+def flatten_lines(x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                  offsets: npt.NDArray[np.float64] | float = 0.0) -> \
+                    Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64],
+                          npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """
+    Function to flatten the nested lists of energies, intensities and widths into flat arrays.
+    Each sublist is a segment (a transition or a satellite component) that will be reduced into one spectrum.
+
+        Args:
+            x: energy values of the lines in each segment
+            y: intensity values of the lines in each segment
+            w: natural width values of the lines in each segment
+            offsets: energy offset to apply to the lines, either one value for all or one value per segment
+
+        Returns:
+            energies: flat array with the offset energies of all lines
+            intens: flat array with the intensities of all lines
+            widths: flat array with the natural widths of all lines
+            segments: flat array with the index of the segment each line belongs to
+    """
+    lengths = np.array([len(k) for k in y], dtype=np.int64)
+    segments = np.repeat(np.arange(len(y), dtype=np.int64), lengths)
+
+    if lengths.sum() == 0:
+        empty = np.zeros(0)
+        return empty, empty.copy(), empty.copy(), segments
+
+    energies = np.concatenate([np.asarray(k, dtype=np.float64) for k in x if len(k) > 0])
+    intens = np.concatenate([np.asarray(k, dtype=np.float64) for k in y if len(k) > 0])
+    widths = np.concatenate([np.asarray(k, dtype=np.float64) for k in w if len(k) > 0])
+
+    if np.ndim(offsets) == 0:
+        energies = energies + offsets
+    else:
+        energies = energies + np.asarray(offsets, dtype=np.float64)[segments]
+
+    return energies, intens, widths, segments
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#               BATCHED PROFILE EVALUATION                  #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Evaluate the profile of all lines in memory-bounded chunks and reduce them per segment
+def batched_profile(profile: Callable, T: npt.NDArray[np.float64],
+                    energies: npt.NDArray[np.float64], intens: npt.NDArray[np.float64],
+                    widths: npt.NDArray[np.float64], segments: npt.NDArray[np.int64],
+                    n_segments: int, res: float,
+                    callback: Callable[[int, int], None] | None = None) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the summed line profiles of each segment over the simulated x values.
+    The lines are evaluated in chunks of (lines x points) matrices and the rows of each chunk are
+    summed into their segment with a segment sum (the lines of a segment must be contiguous).
+    The profile is still evaluated at every point for every line, so this takes about as long as a loop over the lines.
+
+        Args:
+            profile: profile function (G, L or V) which broadcasts over column vectors of line parameters
+            T: list of x values for which we want the y values of the profiles
+            energies: flat array with the energies of all lines (offsets already included)
+            intens: flat array with the intensities of all lines
+            widths: flat array with the natural widths of all lines
+            segments: flat array with the index of the segment each line belongs to
+            n_segments: total number of segments
+            res: experimental resolution to be added to the profile width
+            callback: optional function called after each chunk with the number of lines done and the total number of lines
+
+        Returns:
+            yseg: array with the summed y values of each segment for each of the x values in T
+    """
+    yseg: npt.NDArray[np.float64] = np.zeros((n_segments, len(T)))
+
+    total = len(energies)
+    if total == 0 or len(T) == 0:
+        return yseg
+
+    chunk = max(1, max_chunk_elements // len(T))
+    Trow = np.asarray(T, dtype=np.float64)[np.newaxis, :]
+
+    for start in range(0, total, chunk):
+        stop = min(start + chunk, total)
+
+        block = profile(Trow, energies[start:stop, np.newaxis], intens[start:stop, np.newaxis], res, widths[start:stop, np.newaxis])
+
+        # Find where each segment starts inside the chunk and sum the rows of each one
+        seg = segments[start:stop]
+        starts = np.flatnonzero(np.concatenate(([True], seg[1:] != seg[:-1])))
+        yseg[seg[starts]] += np.add.reduceat(block, starts, axis=0)
+
+        if callback is not None:
+            callback(stop, total)
+
+    return yseg
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#          TRUNCATED SUPPORT PROFILE EVALUATION             #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Calculate the half width of the evaluation window of each line for a peak-relative cutoff
+def window_halfwidths(fit_type: str, res: float, widths: npt.NDArray[np.float64], tail_tol: float) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the half width k * (res + width) of the window around each line center where the profile is evaluated.
+    The window ends where the profile falls to tail_tol times its peak value, so k only depends on the tolerance for the Gaussian
+    and Lorentzian. For the Voigt the window is the sum of the Gaussian core window (Gaussian HWHM res) and of the window where the
+    Lorentzian tail gamma / (pi x^2) falls to tail_tol times the Voigt peak, which depends on the ratio of the widths of each line.
+    
+        Args:
+            fit_type: profile type selected in the interface
+            res: experimental resolution to be added to the profile width
+            widths: flat array with the natural widths of all lines
+            tail_tol: profile value, relative to the peak of each line, where the line is cut
+        
+        Returns:
+            halfwidths: flat array with the half width of the window of each line
+    """
+    widths = np.asarray(widths, dtype=np.float64)
+    
+    if fit_type == 'Gaussian':
+        # HWHM res + width, exp(-(x / HWHM)^2 ln 2) = tail_tol
+        return np.sqrt(np.log(1 / tail_tol) / np.log(2)) * (res + widths)
+    elif fit_type == 'Lorentzian':
+        # HWHM (res + width) / 2, HWHM^2 / (x^2 + HWHM^2) = tail_tol
+        return 0.5 * np.sqrt(1 / tail_tol - 1) * (res + widths)
+    else:
+        core, tail = voigt_windows(res, widths, tail_tol)
+        return core + tail
+
+# Split the Voigt window into its Gaussian core and Lorentzian tail parts
+def voigt_windows(res: float, widths: npt.NDArray[np.float64], tail_tol: float) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Function to calculate the two parts of the Voigt window of each line, as described in window_halfwidths
+    
+        Args:
+            same as window_halfwidths
+        
+        Returns:
+            core: half width where the Gaussian part falls to tail_tol times its peak
+            tail: distance where the Lorentzian tail falls to tail_tol times the Voigt peak
+    """
+    sigma = res / np.sqrt(2 * np.log(2))
+    gamma = 0.5 * np.asarray(widths, dtype=np.float64)
+    
+    # Peak value of the unit area Voigt, Re w(i y) / (sigma sqrt(2 pi)) with Re w(i y) = erfcx(y)
+    peak = erfcx(gamma / (sigma * np.sqrt(2))) / (sigma * np.sqrt(2 * np.pi))
+    
+    core = sigma * np.sqrt(2 * np.log(1 / tail_tol)) * np.ones_like(gamma)
+    tail = np.sqrt(gamma / (np.pi * tail_tol * peak))
+    
+    return core, tail
+
+# Evaluate the profile of each line only inside its window and accumulate the values sparsely per segment
+def windowed_segments(profile: Callable, T: npt.NDArray[np.float64],
+                      energies: npt.NDArray[np.float64], intens: npt.NDArray[np.float64],
+                      widths: npt.NDArray[np.float64], segments: npt.NDArray[np.int64],
+                      n_segments: int, res: float, halfwidths: npt.NDArray[np.float64],
+                      callback: Callable[[int, int], None] | None = None) -> \
+                        Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], List[npt.NDArray[np.float64]]]:
+    """
+    Function to calculate the summed line profiles of each segment inside the support of the segment, evaluating each line
+    only inside the window [energy - halfwidth, energy + halfwidth]. The support of a segment is the range covered by the windows
+    of its lines, and only the supports are allocated. The window limits are found with searchsorted, so T must be sorted in
+    ascending order. Lines are sorted by window size and evaluated in chunks of (lines x largest window) matrices, which are
+    accumulated with a weighted bincount. When the median window covers the whole grid the lines are evaluated with batched_profile
+    instead (the lines of a segment must then be contiguous) and the supports are the whole grid.
+    
+        Args:
+            profile: profile function (G, L or V) which broadcasts over column vectors of line parameters
+            T: sorted list of x values for which we want the y values of the profiles
+            energies: flat array with the energies of all lines (offsets already included)
+            intens: flat array with the intensities of all lines
+            widths: flat array with the natural widths of all lines
+            segments: flat array with the index of the segment each line belongs to
+            n_segments: total number of segments
+            res: experimental resolution to be added to the profile width
+            halfwidths: flat array with the half width of the window of each line
+            callback: optional function called after each chunk with the number of lines done and the total number of lines
+        
+        Returns:
+            seg_lo: first index of the support of each segment in T
+            seg_hi: one past the last index of the support of each segment in T (equal to seg_lo for empty segments)
+            values: list with the summed y values of each segment for each of the x values in its support
+    """
+    npts = len(T)
+    seg_lo: npt.NDArray[np.int64] = np.zeros(n_segments, dtype=np.int64)
+    seg_hi: npt.NDArray[np.int64] = np.zeros(n_segments, dtype=np.int64)
+    
+    total = len(energies)
+    if total == 0 or npts == 0:
+        return seg_lo, seg_hi, [np.zeros(0) for _ in range(n_segments)]
+    
+    T = np.asarray(T, dtype=np.float64)
+    lo = np.searchsorted(T, energies - halfwidths, side='left')
+    hi = np.searchsorted(T, energies + halfwidths, side='right')
+    counts = hi - lo
+    
+    # When most windows cover the whole grid the windows only add overhead, so all the lines are evaluated with the exact batched path
+    if np.median(counts) >= npts:
+        yseg = batched_profile(profile, T, energies, intens, widths, segments, n_segments, res, callback)
+        seg_hi[np.unique(segments)] = npts
+        return seg_lo, seg_hi, [yseg[seg] if seg_hi[seg] > 0 else np.zeros(0) for seg in range(n_segments)]
+    
+    # The support of each segment is the union of the windows of its lines
+    inside = counts > 0
+    seg_lo[:] = npts
+    np.minimum.at(seg_lo, segments[inside], lo[inside])
+    np.maximum.at(seg_hi, segments[inside], hi[inside])
+    seg_lo = np.minimum(seg_lo, seg_hi)
+    
+    # The supports are stored one after the other in a flat array
+    bases = np.concatenate(([0], np.cumsum(seg_hi - seg_lo)))
+    flat_values: npt.NDArray[np.float64] = np.zeros(int(bases[-1]))
+    
+    # Evaluate the lines with the smallest windows first so each chunk has similar window sizes
+    order = np.argsort(counts, kind='stable')
+    sorted_counts = counts[order]
+    
+    start = 0
+    while start < total:
+        # Size the chunk with an estimate of its largest window, which is at its end as the counts are sorted
+        guess = min(total, start + max(1, max_chunk_elements // max(int(sorted_counts[start]), 1)))
+        chunk = max(1, max_chunk_elements // max(int(sorted_counts[guess - 1]), 1))
+        stop = min(total, start + chunk)
+        
+        idx = order[start:stop]
+        wmax = int(sorted_counts[stop - 1])
+        if wmax > 0:
+            cols = lo[idx, np.newaxis] + np.arange(wmax)[np.newaxis, :]
+            mask = cols < hi[idx, np.newaxis]
+            cols = np.minimum(cols, npts - 1)
+            
+            block = profile(T[cols], energies[idx, np.newaxis], intens[idx, np.newaxis], res, widths[idx, np.newaxis])
+            seg = segments[idx, np.newaxis]
+            flat = bases[seg] + cols - seg_lo[seg]
+            
+            flat_values += np.bincount(flat[mask], weights=block[mask], minlength=len(flat_values))
+        
+        if callback is not None:
+            callback(stop, total)
+        
+        start = stop
+    
+    return seg_lo, seg_hi, np.split(flat_values, bases[1:-1])
+
+# Evaluate the profile of each line only inside its window and return the dense values of each segment
+def windowed_profile(profile: Callable, T: npt.NDArray[np.float64],
+                     energies: npt.NDArray[np.float64], intens: npt.NDArray[np.float64],
+                     widths: npt.NDArray[np.float64], segments: npt.NDArray[np.int64],
+                     n_segments: int, res: float, halfwidths: npt.NDArray[np.float64],
+                     callback: Callable[[int, int], None] | None = None) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the summed line profiles of each segment over all the x values in T, evaluating each line only
+    inside its window as in windowed_segments
+    
+        Args:
+            same as windowed_segments
+        
+        Returns:
+            yseg: array with the summed y values of each segment for each of the x values in T
+    """
+    yseg: npt.NDArray[np.float64] = np.zeros((n_segments, len(T)))
+    
+    seg_lo, seg_hi, values = windowed_segments(profile, T, energies, intens, widths, segments, n_segments, res, halfwidths, callback)
+    for seg in range(n_segments):
+        yseg[seg, seg_lo[seg]:seg_hi[seg]] = values[seg]
+    
+    return yseg
+
+# Upper bound on the profile area left out by the window truncation
+def truncation_bound(fit_type: str, res: float, widths: npt.NDArray[np.float64], intens: npt.NDArray[np.float64], tail_tol: float) -> float:
+    """
+    Function to calculate the upper bound on the total profile area left outside the windows of window_halfwidths.
+    The area outside the Gaussian and Lorentzian windows is exact, for the Voigt it is bounded by the sum of the Gaussian area
+    outside the core window and the Lorentzian area outside the tail window.
+    
+        Args:
+            fit_type: profile type selected in the interface
+            res: experimental resolution to be added to the profile width
+            widths: flat array with the natural widths of all lines
+            intens: flat array with the intensities of all lines
+            tail_tol: profile value, relative to the peak of each line, where the line is cut
+        
+        Returns:
+            bound: upper bound on the total area not included in the simulated intensities
+    """
+    widths = np.asarray(widths, dtype=np.float64)
+    
+    if fit_type == 'Gaussian':
+        fraction = erfc(np.sqrt(np.log(1 / tail_tol)))
+    elif fit_type == 'Lorentzian':
+        fraction = 2 / np.pi * np.arctan(1 / np.sqrt(1 / tail_tol - 1))
+    else:
+        core, tail = voigt_windows(res, widths, tail_tol)
+        sigma = res / np.sqrt(2 * np.log(2))
+        fraction = erfc(core / (sigma * np.sqrt(2))) + 2 / np.pi * np.arctan(0.5 * widths / tail)
+    
+    return float(np.sum(np.abs(intens) * fraction))
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#            BINNED FFT CONVOLUTION EVALUATION              #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Maximum number of points of the fine uniform grid used in the convolution mode
+max_fine_points: int = 2 ** 18
+"""
+Maximum number of points of the fine uniform grid where the lines are binned in the convolution mode
+"""
+
+# Width scale of each line profile used to bucket the lines and choose the fine grid spacing
+def width_scale(fit_type: str, res: float, widths: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the HWHM scale of the profile of each line.
+    
+        Args:
+            fit_type: profile type selected in the interface
+            res: experimental resolution to be added to the profile width
+            widths: flat array with the natural widths of all lines
+        
+        Returns:
+            scale: flat array with the approximate HWHM of the profile of each line
+    """
+    widths = np.asarray(widths, dtype=np.float64)
+    
+    if fit_type == 'Gaussian':
+        return res + widths
+    elif fit_type == 'Lorentzian':
+        return 0.5 * (res + widths)
+    else:
+        return res + 0.5 * widths
+
+# Evaluate the profiles by binning the lines on a fine grid and convolving each width bucket with its kernel
+def convolved_profile(profile: Callable, fit_type: str, T: npt.NDArray[np.float64],
+                      energies: npt.NDArray[np.float64], intens: npt.NDArray[np.float64],
+                      widths: npt.NDArray[np.float64], segments: npt.NDArray[np.int64],
+                      n_segments: int, res: float, bucket_tol: float = 0.01, oversample: int = 8,
+                      callback: Callable[[int, int], None] | None = None) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the summed line profiles of each segment with a binned FFT convolution.
+    The lines are grouped in buckets of similar width, binned (linear weights) on a fine uniform grid
+    spanning T and each bucket is convolved with the profile kernel of its mean width using FFTs.
+    The result is resampled onto T by linear interpolation. Lines outside the range of T, or too narrow
+    to be resolved by the fine grid, are calculated with the exact batched path.
+    This is much faster than the exact path when there are many more lines than points (Auger and satellite forests).
+    
+        Args:
+            profile: profile function (G, L or V) which broadcasts over column vectors of line parameters
+            fit_type: profile type selected in the interface
+            T: sorted list of x values for which we want the y values of the profiles
+            energies: flat array with the energies of all lines (offsets already included)
+            intens: flat array with the intensities of all lines
+            widths: flat array with the natural widths of all lines
+            segments: flat array with the index of the segment each line belongs to
+            n_segments: total number of segments
+            res: experimental resolution to be added to the profile width
+            bucket_tol: relative width difference allowed between the lines in one bucket
+            oversample: number of fine grid points in the HWHM of the narrowest line
+            callback: optional function called after each bucket with the number of lines done and the total number of lines
+        
+        Returns:
+            yseg: array with the summed y values of each segment for each of the x values in T
+    """
+    T = np.asarray(T, dtype=np.float64)
+    npts = len(T)
+    total = len(energies)
+    
+    if total == 0 or npts < 2 or T[-1] <= T[0]:
+        return batched_profile(profile, T, energies, intens, widths, segments, n_segments, res, callback)
+    
+    yseg: npt.NDArray[np.float64] = np.zeros((n_segments, npts))
+    
+    scale = width_scale(fit_type, res, widths)
+    
+    # Fine uniform grid at least as fine as T and resolving the narrowest line
+    span = T[-1] - T[0]
+    dx = min(span / (npts - 1), max(float(scale.min()), 0.0) / oversample) if scale.min() > 0 else span / (npts - 1)
+    nfine = int(np.ceil(span / dx)) + 1
+    if nfine > max_fine_points:
+        nfine = max_fine_points
+        dx = span / (nfine - 1)
+    
+    # Lines that are not binned are calculated exactly
+    exact = (energies < T[0]) | (energies > T[-1]) | (scale < 2 * dx)
+    if np.any(exact):
+        yseg += batched_profile(profile, T, energies[exact], intens[exact], widths[exact], segments[exact], n_segments, res)
+    
+    done = int(np.count_nonzero(exact))
+    if callback is not None:
+        callback(done, total)
+    
+    binned = ~exact
+    if not np.any(binned):
+        return yseg
+    
+    e = energies[binned]
+    I = intens[binned]
+    w = widths[binned]
+    seg = segments[binned]
+    s = scale[binned]
+    
+    # Width buckets spaced logarithmically by the bucket tolerance
+    bucket = np.floor(np.log(s / s.min()) / np.log1p(bucket_tol)).astype(np.int64)
+    
+    # Linear binning positions on the fine grid
+    pos = (e - T[0]) / dx
+    i0 = np.minimum(np.floor(pos).astype(np.int64), nfine - 2)
+    frac = pos - i0
+    
+    # Kernel offsets covering the full grid span, and an FFT length that avoids wrap around in the kept range
+    offsets = np.arange(-(nfine - 1), nfine) * dx
+    nfft = next_fast_len(2 * nfine - 1)
+    
+    # Interpolation indices and weights to resample the fine grid onto T
+    ti = (T - T[0]) / dx
+    j0 = np.minimum(np.floor(ti).astype(np.int64), nfine - 2)
+    tw = ti - j0
+    
+    rows_per_chunk = max(1, max_chunk_elements // nfft)
+    
+    for b in np.unique(bucket):
+        sel = bucket == b
+        
+        kernel = profile(offsets, 0.0, 1.0, res, float(np.mean(w[sel])))
+        Kf = rfft(kernel, nfft)
+        
+        useg, inv = np.unique(seg[sel], return_inverse=True)
+        b_i0 = i0[sel]
+        b_frac = frac[sel]
+        b_I = I[sel]
+        
+        for r0 in range(0, len(useg), rows_per_chunk):
+            r1 = min(r0 + rows_per_chunk, len(useg))
+            in_rows = (inv >= r0) & (inv < r1)
+            rows = inv[in_rows] - r0
+            
+            # Distribute each stick between its two neighbouring fine grid points
+            flat = rows * nfine + b_i0[in_rows]
+            weights = b_I[in_rows]
+            grid = np.bincount(flat, weights=weights * (1 - b_frac[in_rows]), minlength=(r1 - r0) * nfine) + \
+                   np.bincount(flat + 1, weights=weights * b_frac[in_rows], minlength=(r1 - r0) * nfine)[:(r1 - r0) * nfine]
+            grid = grid.reshape((r1 - r0, nfine))
+            
+            conv = irfft(rfft(grid, nfft, axis=1) * Kf, nfft, axis=1)[:, nfine - 1:2 * nfine - 1]
+            
+            yseg[useg[r0:r1]] += conv[:, j0] * (1 - tw) + conv[:, j0 + 1] * tw
+        
+        done += int(np.count_nonzero(sel))
+        if callback is not None:
+            callback(done, total)
+    
+    return yseg
+
+# Compare the convolution mode with the exact per-line path on a sample of the lines
+def convolution_accuracy(profile: Callable, fit_type: str, T: npt.NDArray[np.float64],
+                         energies: npt.NDArray[np.float64], intens: npt.NDArray[np.float64],
+                         widths: npt.NDArray[np.float64], res: float, n_check: int = 200) -> float:
+    """
+    Function to check the accuracy of the convolution mode against the exact batched path.
+    A random sample of the lines is simulated with both paths and the maximum difference is compared
+    with the maximum of the exact spectrum.
+    
+        Args:
+            profile: profile function (G, L or V) which broadcasts over column vectors of line parameters
+            fit_type: profile type selected in the interface
+            T: sorted list of x values for which we want the y values of the profiles
+            energies: flat array with the energies of all lines (offsets already included)
+            intens: flat array with the intensities of all lines
+            widths: flat array with the natural widths of all lines
+            res: experimental resolution to be added to the profile width
+            n_check: maximum number of lines in the sample
+        
+        Returns:
+            error: maximum absolute difference between both paths relative to the maximum of the exact spectrum
+    """
+    if len(energies) == 0:
+        return 0.0
+    
+    rng = np.random.default_rng(0)
+    idx = np.sort(rng.choice(len(energies), size=min(n_check, len(energies)), replace=False))
+    segments = np.zeros(len(idx), dtype=np.int64)
+    
+    exact = batched_profile(profile, T, energies[idx], intens[idx], widths[idx], segments, 1, res)
+    approx = convolved_profile(profile, fit_type, T, energies[idx], intens[idx], widths[idx], segments, 1, res)
+    
+    exact_max = np.max(np.abs(exact))
+    if exact_max == 0:
+        return 0.0
+    
+    return float(np.max(np.abs(approx - exact)) / exact_max)
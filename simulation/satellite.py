@@ -6,7 +6,7 @@ import interface.variables as guiVars
 
 import data.variables as generalVars
 
-from simulation.lineUpdater import updateSatTransitionVals
+from simulation.lineUpdater import updateSatTransitionVals, updateSatShakeVals
 
 from interface.plotters import stem_ploter
 
@@ -14,7 +14,7 @@ from simulation.mults import get_cascadeBoost
 
 from simulation.shake import calculateTotalShake, get_shakeoff, get_shakeup
 
-from data.definitions import Line
+from data.definitions import Line, LineTable
 
 from typing import List
 
@@ -29,7 +29,7 @@ from matplotlib.pyplot import Axes
 #                                                                        #
 # ---------------------------------------------------------------------- #
 
-def stick_satellite(sim: Toplevel, graph_area: Axes, sat_stick_val: List[Line], transition: str, low_level: str, high_level: str, bad_selection: int, cs: str = ''):
+def stick_satellite(sim: Toplevel, graph_area: Axes, sat_stick_val: LineTable, transition: str, low_level: str, high_level: str, bad_selection: int, cs: str = ''):
     """
     Function to check and send the data to the stick plotter function for sattelite transitions.
     
@@ -52,7 +52,7 @@ def stick_satellite(sim: Toplevel, graph_area: Axes, sat_stick_val: List[Line],
     # Check if there is no data for the selected transition
     if not sat_stick_val:
         # Make a 0 vector to still have data to plot
-        sat_stick_val = [Line() for i in range(16)]
+        sat_stick_val = LineTable.from_lines([Line() for i in range(16)])
         # Show a warning that this transition has no data and add it to the bad selection count
         messagebox.showwarning("Wrong Transition", transition + " is not Available")
         bad += 1
@@ -60,13 +60,16 @@ def stick_satellite(sim: Toplevel, graph_area: Axes, sat_stick_val: List[Line],
     # Initialize a variable to control the progress bar
     b1 = 0
     
+    # Shake-up lines have longer initial shell labels
+    shakeoff = sat_stick_val.shelliLength() <= 4
+    
     # Extract the energy values
-    x = [row.energy for row in sat_stick_val if len(row.Shelli) <= 4]
+    x = sat_stick_val.energy[shakeoff].tolist()
     """
     Energy values for the selected transition (shake-off)
     """
     # Extract the energy values
-    x_up = [row.energy for row in sat_stick_val if len(row.Shelli) > 4]
+    x_up = sat_stick_val.energy[~shakeoff].tolist()
     """
     Energy values for the selected transition (shake-up)
     """
@@ -83,19 +86,19 @@ def stick_satellite(sim: Toplevel, graph_area: Axes, sat_stick_val: List[Line],
 
         # Check for at least one satellite transition
         if len(sat_stick_val_ind) > 1:
-            sy_points = [row.effectiveIntensity(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'satellite', key) for row in sat_stick_val if len(row.Shelli) <= 4] # type: ignore
+            sy_points = sat_stick_val.take(shakeoff).effectiveIntensities(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'satellite', key).tolist() # type: ignore
             """
             Intensity values for the selected satellite transition
             """    
                 
             # SHAKE-UP
-            sy_points_up = [row.effectiveIntensity(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'shakeup', key) for row in sat_stick_val if len(row.Shelli) > 4] # type: ignore
+            sy_points_up = sat_stick_val.take(~shakeoff).effectiveIntensities(-1.0, 1.0, 1.0, guiVars.include_cascades.get(), 'shakeup', key).tolist() # type: ignore
             """
             Intensity values for the selected satellite transition
             """
             
-            JJ = [row.jji for row in sat_stick_val if len(row.Shelli) <= 4]
-            JJ_up = [row.jji for row in sat_stick_val if len(row.Shelli) > 4]
+            JJ = sat_stick_val.jji[shakeoff].tolist()
+            JJ_up = sat_stick_val.jji[~shakeoff].tolist()
             
             graph_area = stem_ploter(graph_area, x, sy_points, JJ,
                                      transition if cs == '' else cs + ' ' + transition,
@@ -110,7 +113,7 @@ def stick_satellite(sim: Toplevel, graph_area: Axes, sat_stick_val: List[Line],
     return bad, graph_area
 
 
-def simu_sattelite(sat_sim_val: List[Line], low_level: str, high_level: str, beam: float, FWHM: float, shake_amps: dict = {}):
+def simu_sattelite(sat_sim_val: LineTable, low_level: str, high_level: str, beam: float, FWHM: float, shake_amps: dict = {}):
     """
     Function to check and send the data to the stick plotter function for sattelite transitions.
     
@@ -140,14 +143,14 @@ def simu_sattelite(sat_sim_val: List[Line], low_level: str, high_level: str, bea
     # SHAKE-OFF
     # Loop the shake labels read from the shake weights file
     for ind, key in enumerate(generalVars.label1):
-        # Filter the specific combination of radiative transition and shake level (key) to simulate
-        sat_sim_val_ind = updateSatTransitionVals(low_level, high_level, key, sat_sim_val)
+        # Get the shake-off lines of the radiative transition and shake level (key) to simulate
+        sat_sim_val_ind = updateSatShakeVals(low_level, high_level, key, sat_sim_val)
         
         # Check if there is at least one satellite transition
         if len(sat_sim_val_ind) > 0:
             # Extract the energies, intensities and widths of the transition (different j and eigv)
-            x1s = [row.energy for row in sat_sim_val_ind if len(row.Shelli) <= 4]
-            w1s = [row.totalWidth for row in sat_sim_val_ind if len(row.Shelli) <= 4]
+            x1s = sat_sim_val_ind.energy.tolist()
+            w1s = sat_sim_val_ind.totalWidth.tolist()
             
             if guiVars.exc_mech_var.get() == 'EII': # type: ignore
                 crossSection = generalVars.elementMRBEB
@@ -158,7 +161,7 @@ def simu_sattelite(sat_sim_val: List[Line], low_level: str, high_level: str, bea
             else:
                 crossSection = 1.0
             
-            y1s = [row.effectiveIntensity(beam, FWHM, crossSection, guiVars.include_cascades.get(), 'satellite', key, shake_amps) for row in sat_sim_val_ind if len(row.Shelli) <= 4] # type: ignore
+            y1s = sat_sim_val_ind.effectiveIntensities(beam, FWHM, crossSection, guiVars.include_cascades.get(), 'satellite', key, shake_amps).tolist() # type: ignore
             
             xs_inds.append(x1s)
             ys_inds.append(y1s)
@@ -172,14 +175,14 @@ def simu_sattelite(sat_sim_val: List[Line], low_level: str, high_level: str, bea
     if generalVars.Shakeup_exists:
         # Loop the shake labels read from the shake weights file
         for ind, key in enumerate(generalVars.label1):
-            # Filter the specific combination of radiative transition and shake level (key) to simulate
-            sat_sim_val_ind = updateSatTransitionVals(low_level, high_level, key, sat_sim_val, True)
+            # Get the shake-up lines of the radiative transition and shake level (key) to simulate
+            sat_sim_val_ind = updateSatShakeVals(low_level, high_level, key, sat_sim_val, True)
             
             # Check if there is at least one satellite transition
             if len(sat_sim_val_ind) > 0:
                 # Extract the energies, intensities and widths of the transition (different j and eigv)
-                x1s = [row.energy for row in sat_sim_val_ind if len(row.Shelli) > 4]
-                w1s = [row.totalWidth for row in sat_sim_val_ind if len(row.Shelli) > 4]
+                x1s = sat_sim_val_ind.energy.tolist()
+                w1s = sat_sim_val_ind.totalWidth.tolist()
                 
                 if guiVars.exc_mech_var.get() == 'EII': # type: ignore
                     crossSection = generalVars.elementMRBEB
@@ -190,7 +193,7 @@ def simu_sattelite(sat_sim_val: List[Line], low_level: str, high_level: str, bea
                 else:
                     crossSection = 1.0
                 
-                y1s = [row.effectiveIntensity(beam, FWHM, crossSection, False, 'shakeup', key, shake_amps) for row in sat_sim_val_ind if len(row.Shelli) > 4]
+                y1s = sat_sim_val_ind.effectiveIntensities(beam, FWHM, crossSection, False, 'shakeup', key, shake_amps).tolist()
                 
                 xs_inds.append(x1s)
                 ys_inds.append(y1s)
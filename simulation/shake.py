@@ -5,11 +5,12 @@ Module to calculate the values necessary to take into account both shake-off and
 import data.variables as generalVars
 import interface.variables as guiVars
 
-from data.definitions import Line
+from data.definitions import Line, ShakeTable, ShakeupSplines
 
-from scipy.interpolate import interp1d
+from typing import Dict, List, Tuple
 
-from typing import List
+import numpy as np
+import numpy.typing as npt
 
 
 # Variable to store the realtionships between shake probabilities for each shell
@@ -31,6 +32,12 @@ existing_shakeoffs = {}
 Variable to hold the existing shakeoffs in the spectrum
 """
 
+# Variable to hold the data the shake setup was calculated from
+shake_setup_sources: tuple = ()
+"""
+Variable to hold the data the shake setup was calculated from, the setup is only calculated again when it changes
+"""
+
 # --------------------------------------------------------- #
 #                                                           #
 #        FUNCTIONS TO HANDLE THE SHAKE PROBABILITIES        #
@@ -38,71 +45,105 @@ Variable to hold the existing shakeoffs in the spectrum
 # --------------------------------------------------------- #
 
 
+# Relations between the shake probabilities of each key
+def shakeRelations(rows: List[List[str]], keys: List[str], probs: List[float]) -> Dict[str, Dict[str, str]]:
+    """
+    Function to find the relation (> or <=) between the probability of each shake key and the probabilities of all the keys.
+    Each key is represented by its last row, and compared with the last row of the other keys (for itself, with its last row that is different)
+    
+        Args:
+            rows: rows of the shake file
+            keys: key of each row
+            probs: probability of each row
+        
+        Returns:
+            dictionary with the relation of each key with each other key
+    """
+    order = list(dict.fromkeys(keys))
+    ids = {key: i for i, key in enumerate(order)}
+    keyIds = np.array([ids[key] for key in keys], dtype=np.intp)
+    values = np.array(probs, dtype=np.float64)
+    
+    # Last row of each key
+    last = np.full(len(order), -1, dtype=np.intp)
+    np.maximum.at(last, keyIds, np.arange(len(rows)))
+    
+    greater = values[last][:, np.newaxis] > values[last][np.newaxis, :]
+    
+    relations: Dict[str, Dict[str, str]] = {}
+    for i, key1 in enumerate(order):
+        relations[key1] = {}
+        for j, key2 in enumerate(order):
+            if i != j:
+                relations[key1][key2] = ">" if greater[i, j] else "<="
+            else:
+                others = [index for index in np.flatnonzero(keyIds == i)[::-1] if rows[index] != rows[last[i]]]
+                if len(others) > 0:
+                    relations[key1][key2] = ">" if values[last[i]] > values[others[0]] else "<="
+    
+    return relations
+
 def setupShake():
     """
     Function to setup the shake-up spline interpolations to calculate the probability, even if we don't have the specific excitation.
+    The setup is only calculated when the shake probabilities or the satellite rates change
     """
-    global existing_shakeoffs, existing_shakeups, shake_relations
+    global existing_shakeoffs, existing_shakeups, shake_relations, shake_setup_sources
+    
+    sources = (generalVars.shakeoff, generalVars.shakeup, generalVars.lineshakeup, generalVars.linesatellites, generalVars.label1, generalVars.Shakeup_exists)
+    if len(shake_setup_sources) == len(sources) and all(old is new for old, new in zip(shake_setup_sources, sources)):
+        return
+    
+    # Convert the shake probabilities to numeric tables by orbital and 2J
+    generalVars.shakeoffTable = ShakeTable(generalVars.shakeoff)
+    generalVars.shakeupTable = ShakeTable(generalVars.shakeup, True)
     
     if generalVars.Shakeup_exists:
-        shakeValues = {}
-        shakeOrbitals = {}
-        
-        for shake in generalVars.shakeup:
-            if shake[2] != 'SUM':
-                if shake[1] + '_' + shake[3] in shakeValues and shake[1] + '_' + shake[3] in shakeOrbitals:
-                    shakeValues[shake[1] + '_' + shake[3]].append(float(shake[4]))
-                    shakeOrbitals[shake[1] + '_' + shake[3]].append(int(shake[2][:-1]))
-                else:
-                    shakeValues[shake[1] + '_' + shake[3]] = [float(shake[4])]
-                    shakeOrbitals[shake[1] + '_' + shake[3]] = [int(shake[2][:-1])]
-        
-        for key in shakeValues:
-            generalVars.shakeUPSplines[key] = interp1d(shakeOrbitals[key], shakeValues[key])
+        generalVars.shakeUPSplines = ShakeupSplines(generalVars.shakeup)
         
         
         # Setup the missing shake-up probabilities
         
-        existing_shakeups = dict.fromkeys([row.Shelli[2:4] + "_" + str(row.jji) for row in generalVars.lineshakeup], 0.0)
-        found_excitations = {}
+        # Distinct initial shells and 2J values of the shake-up lines, in the order of the lines
+        table = generalVars.lineshakeup
+        pairs, first = np.unique(np.stack([table.columns['Shelli'], table.columns['jji']], axis=1), axis=0, return_index=True)
+        pairs = pairs[np.argsort(first)]
         
-        for row in generalVars.lineshakeup:
-            key = row.Shelli[2:4]
-            if key + "_" + str(row.jji) not in found_excitations:
-                found_excitations[key + "_" + str(row.jji)] = []
-            
-            if row.Shelli[4:-1] not in found_excitations[key + "_" + str(row.jji)]:
-                existing_shakeups[key + "_" + str(row.jji)] += get_shakeup(key, row.Shelli[4:], row.jji)
-                found_excitations[key + "_" + str(row.jji)].append(row.Shelli[4:-1])
+        existing_shakeups = dict.fromkeys([table.shells[shell][2:4] + "_" + str(jj) for shell, jj in pairs.tolist()], 0.0)
+        found_excitations: Dict[str, List[str]] = {}
+        excitations: List[Tuple[str, str]] = []
+        for shell, jj in pairs.tolist():
+            key = table.shells[shell][2:4] + "_" + str(jj)
+            shakeF = table.shells[shell][4:]
+            if shakeF[:-1] not in found_excitations.setdefault(key, []):
+                found_excitations[key].append(shakeF[:-1])
+                excitations.append((key, shakeF))
         
-        shakeup_sums = {}
+        # The existing probabilities are the spline values, without the missing probabilities of a previous setup
+        values, _ = generalVars.shakeUPSplines.evaluate([key for key, _ in excitations], excitedOrbitals([shakeF for _, shakeF in excitations]))
+        for (key, _), value in zip(excitations, values.tolist()):
+            existing_shakeups[key] += value
         
-        for shake in generalVars.shakeup:
-            key = shake[1]
-            if shake[2] == 'SUM':
-                shakeup_sums[key + "_" + shake[3]] = float(shake[4])
+        shakeup_sums = {shake[1] + "_" + shake[3]: float(shake[4]) for shake in generalVars.shakeup if shake[2] == 'SUM'}
         
-        for key in existing_shakeups:
-            generalVars.missing_shakeup[key] = (shakeup_sums[key] - existing_shakeups[key]) / len(found_excitations[key])
+        generalVars.missing_shakeup = {key: (shakeup_sums[key] - existing_shakeups[key]) / len(found_excitations[key]) for key in existing_shakeups}
         
         # Setup shakeup relations
         
-        for shake1 in generalVars.shakeup:
-            shake_relations[shake1[1] + "_" + shake1[3]] = {}
-            for shake2 in generalVars.shakeup:
-                if shake1 != shake2:
-                    shake_relations[shake1[1] + "_" + shake1[3]][shake2[1] + "_" + shake2[3]] = \
-                            ">" if float(shake1[4]) > float(shake2[4]) else "<="
-        
-        # print(existing_shakeups)
-        # print(generalVars.missing_shakeup)
+        shake_relations.update(shakeRelations(generalVars.shakeup, [shake[1] + "_" + shake[3] for shake in generalVars.shakeup],
+                                              [float(shake[4]) for shake in generalVars.shakeup]))
+    else:
+        # No shake-up probabilities for this element
+        generalVars.shakeUPSplines = ShakeupSplines([])
+        generalVars.missing_shakeup = {}
     
     # Setup the missing shake-off probabilities
     
+    # Shake orbitals of the satellite lines, in the order of the lines
+    codes, first = np.unique(generalVars.linesatellites.columns['Shelli'], return_index=True)
     existing_shakeoffs = {}
-    
-    for row in generalVars.linesatellites:
-        key = row.Shelli[2:4]
+    for code in codes[np.argsort(first)].tolist():
+        key = generalVars.linesatellites.shells[code][2:4]
         if key not in existing_shakeoffs:
             existing_shakeoffs[key] = get_shakeoff(key)
     
@@ -128,15 +169,37 @@ def setupShake():
     
     # Setup shakeoff relations
     
-    for shake1 in generalVars.shakeoff:
-        shake_relations[shake1[1]] = {}
-        for shake2 in generalVars.shakeoff:
-            if shake1 != shake2:
-                shake_relations[shake1[1]][shake2[1]] = \
-                        ">" if float(shake1[3]) > float(shake2[3]) else "<="
+    shake_relations.update(shakeRelations(generalVars.shakeoff, [shake[1] for shake in generalVars.shakeoff],
+                                          [float(shake[3]) for shake in generalVars.shakeoff]))
+    
+    shake_setup_sources = sources
+
 
+# Numeric shake-off probabilities
+def shakeoffTable() -> ShakeTable:
+    """
+    Function to get the numeric shake-off probabilities, converted again if the shake-off rows were replaced after they were converted
+        
+        Returns:
+            the shake-off probabilities table
+    """
+    if generalVars.shakeoffTable.rows is not generalVars.shakeoff:
+        generalVars.shakeoffTable = ShakeTable(generalVars.shakeoff)
     
+    return generalVars.shakeoffTable
+
+# Numeric shake-up probabilities
+def shakeupTable() -> ShakeTable:
+    """
+    Function to get the numeric shake-up probabilities, converted again if the shake-up rows were replaced after they were converted
+        
+        Returns:
+            the shake-up probabilities table
+    """
+    if generalVars.shakeupTable.rows is not generalVars.shakeup:
+        generalVars.shakeupTable = ShakeTable(generalVars.shakeup, True)
     
+    return generalVars.shakeupTable
 
 # Calculate the total shake probability from shake-up and shake-off probabilities
 def calculateTotalShake(JJ2: int, shake_amps: dict = {}) -> float:
@@ -149,17 +212,25 @@ def calculateTotalShake(JJ2: int, shake_amps: dict = {}) -> float:
         Returns:
             sum of the total shake-up + shake-off probabilities to modify the population of an initial level with 2*J value of JJ2
     """
-    if len(generalVars.shakeup) > 0 and len(generalVars.shakeup[0]) > 1:
-        totalShakeup = sum([float(shake[4]) * \
-                            (shake_amps['shakeup_amps_' + shake[1]] if 'shakeup_amps_' + shake[1] in shake_amps else 1.0) \
-                            for shake in generalVars.shakeup if int(shake[3]) == JJ2 and shake[2] == 'SUM'])
-    else:
-        totalShakeup = 0.0
+    return float(calculateTotalShakes(np.array([JJ2]), shake_amps)[0])
+
+# Calculate the total shake probabilities of several 2J values
+def calculateTotalShakes(JJ2s: npt.NDArray[np.int64], shake_amps: dict = {}) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the total shake probabilities for the initial levels with each of the 2J values in JJ2s
     
-    return sum([float(shake[3]) * \
-                (shake_amps['shake_amps_' + shake[1]] if 'shake_amps_' + shake[1] in shake_amps else 1.0) \
-                for shake in generalVars.shakeoff if int(shake[2]) == JJ2]) + \
-            totalShakeup
+        Args:
+            JJ2s: 2*J values of the transitions for which we want the total shake probability
+            shake_amps: parameters to multiply the shake probabilities during fitting
+        
+        Returns:
+            array with the sum of the total shake-up + shake-off probabilities for each 2*J value
+    """
+    shakeoffs = shakeoffTable()
+    shakeups = shakeupTable()
+    
+    return shakeoffs.totals(JJ2s, shakeoffs.amplitudes(shake_amps, 'shake_amps_')) + \
+            shakeups.totals(JJ2s, shakeups.amplitudes(shake_amps, 'shakeup_amps_'))
 
 # Calculate the average total shake probability for all 2J ground state values
 def calculateAvgTotalShake(shake_amps: dict = {}) -> float:
@@ -172,19 +243,11 @@ def calculateAvgTotalShake(shake_amps: dict = {}) -> float:
         Returns:
             average of the total shake-up + shake-off probabilities to modify the population of an initial level with 2*J value of JJ2
     """
-    if len(generalVars.shakeup) > 0 and len(generalVars.shakeup[0]) > 1:
-        avgShakeup = sum([float(shake[4]) * \
-                            (shake_amps['shakeup_amps_' + shake[1]] if 'shakeup_amps_' + shake[1] in shake_amps else 1.0) \
-                            for shake in generalVars.shakeup if shake[2] == 'SUM']) / \
-                        sum(list(set([int(shake[3]) + 1 for shake in generalVars.shakeup])))
-    else:
-        avgShakeup = 0.0
+    shakeoffs = shakeoffTable()
+    shakeups = shakeupTable()
     
-    return (sum([float(shake[3]) * \
-                (shake_amps['shake_amps_' + shake[1]] if 'shake_amps_' + shake[1] in shake_amps else 1.0) \
-                for shake in generalVars.shakeoff]) / \
-            sum(list(set([int(shake[2]) + 1 for shake in generalVars.shakeoff])))) + \
-            avgShakeup
+    return shakeoffs.average(shakeoffs.amplitudes(shake_amps, 'shake_amps_')) + \
+            shakeups.average(shakeups.amplitudes(shake_amps, 'shakeup_amps_'))
 
 
 # Search for the shake-off probability for the shake electron key
@@ -198,15 +261,28 @@ def get_shakeoff(key: str):
         Returns:
             shake-off probability for the requested level
     """
-    probs = []
-    for shake in generalVars.shakeoff:
-        if shake[1] == key:
-            probs.append(shake)
+    return shakeoffTable().orbitalAverage(key) + generalVars.missing_shakeoff
+
+
+# Excited orbital n of shake-up final shells
+def excitedOrbitals(shakeFs: List[str]) -> npt.NDArray[np.float64]:
+    """
+    Function to read the excited orbital n from the end of the shake-up shell labels (n followed by the orbital letter)
     
-    total_shakeoff = sum([float(prob[3]) * (int(prob[2]) + 1) for prob in probs]) / sum([(int(prob[2]) + 1) for prob in probs])
+        Args:
+            shakeFs: end of the shake-up shell labels, after the 2 hole shells
+        
+        Returns:
+            array with the excited orbital n of each label, NaN if it is not a number
+    """
+    orbitals = np.full(len(shakeFs), np.nan)
+    for i, shakeF in enumerate(shakeFs):
+        try:
+            orbitals[i] = int(shakeF[:-1])
+        except ValueError:
+            pass
     
-    return total_shakeoff + generalVars.missing_shakeoff
-
+    return orbitals
 
 # Search for the shake-up probability for the shake electron key and 2*J value JJ2
 def get_shakeup(key: str, shakeF: str, JJ2: int) -> float:
@@ -220,21 +296,28 @@ def get_shakeup(key: str, shakeF: str, JJ2: int) -> float:
         Returns:
             shake-up probability for the requested level
     """
-    if key + '_' + str(JJ2) not in generalVars.shakeUPSplines:
-        return 0.0
+    return float(get_shakeups([key], [shakeF], np.array([JJ2]))[0])
+
+# Shake-up probabilities of several shake electrons, excitations and 2*J values
+def get_shakeups(keys: List[str], shakeFs: List[str], JJ2s: npt.NDArray[np.int64]) -> npt.NDArray[np.float64]:
+    """
+    Function to calculate the shake-up probabilities of several shake-up levels at once, from the splines of each
+    shake orbital and 2J value plus its missing probability. Excitations outside the splines have probability 0
     
-    if key + '_' + str(JJ2) not in generalVars.missing_shakeup:
-        try:
-            return generalVars.shakeUPSplines[key + '_' + str(JJ2)](int(shakeF[:-1]))
-        except ValueError:
-            # print("Warning: Out of bounds excitation orbital in shake-up probability calculation!")
-            return 0.0
-    else:
-        try:
-            return generalVars.shakeUPSplines[key + '_' + str(JJ2)](int(shakeF[:-1])) + generalVars.missing_shakeup[key + "_" + str(JJ2)]
-        except ValueError:
-            # print("Warning: Out of bounds excitation orbital in shake-up probability calculation!")
-            return 0.0
+        Args:
+            keys: electron shake-up orbital label of each level
+            shakeFs: excited orbital label of each level
+            JJ2s: 2*J value of each level
+        
+        Returns:
+            array with the shake-up probability of each level
+    """
+    splineKeys = [key + '_' + str(JJ2) for key, JJ2 in zip(keys, np.asarray(JJ2s).tolist())]
+    
+    values, inside = generalVars.shakeUPSplines.evaluate(splineKeys, excitedOrbitals(shakeFs))
+    missing = np.array([generalVars.missing_shakeup[key] if key in generalVars.missing_shakeup else 0.0 for key in splineKeys], dtype=np.float64)
+    
+    return np.where(inside, values + missing, 0.0)
 
 
 # Search for the 2j values possible for the selected transitions in the transition_list
@@ -323,9 +406,9 @@ def jj_search(transition_list: List[str]):
                     high_level: str = generalVars.the_dictionary[transition]["high_level"] # type: ignore
                     
                     if not cs_type[cs_index]:
-                        jj_vals += [line.jji for i, lines in enumerate(lines_to_search_PCS) for line in lines if line.filterLevel(low_level, high_level, strict='na') and generalVars.rad_PCS[i] == cs]
+                        jj_vals += [line.jji for i, charge_state in enumerate(generalVars.rad_PCS) if charge_state == cs for line in lines_to_search_PCS[i] if line.filterLevel(low_level, high_level, strict='na')]
                     else:
-                        jj_vals += [line.jji for i, lines in enumerate(lines_to_search_NCS) for line in lines if line.filterLevel(low_level, high_level, strict='na') and generalVars.rad_NCS[i] == cs]
+                        jj_vals += [line.jji for i, charge_state in enumerate(generalVars.rad_NCS) if charge_state == cs for line in lines_to_search_NCS[i] if line.filterLevel(low_level, high_level, strict='na')]
             
             if 'Satellites' in sat:
                 lines_to_search_PCS = generalVars.linesatellites_PCS
@@ -341,9 +424,9 @@ def jj_search(transition_list: List[str]):
                         high_level: str = generalVars.the_dictionary[transition]["high_level"] # type: ignore
                         
                         if not cs_type[cs_index]:
-                            jj_vals += [line.jji for i, lines in enumerate(lines_to_search_PCS) for line in lines if line.filterLevel(low_level, high_level, strict='na') and generalVars.rad_PCS[i] == cs]
+                            jj_vals += [line.jji for i, charge_state in enumerate(generalVars.sat_PCS) if charge_state == cs for line in lines_to_search_PCS[i] if line.filterLevel(low_level, high_level, strict='na')]
                         else:
-                            jj_vals += [line.jji for i, lines in enumerate(lines_to_search_NCS) for line in lines if line.filterLevel(low_level, high_level, strict='na') and generalVars.rad_NCS[i] == cs]
+                            jj_vals += [line.jji for i, charge_state in enumerate(generalVars.sat_NCS) if charge_state == cs for line in lines_to_search_NCS[i] if line.filterLevel(low_level, high_level, strict='na')]
         else:
             lines_to_search_PCS = generalVars.lineaugrates_PCS
             lines_to_search_NCS = generalVars.lineaugrates_NCS
@@ -384,9 +467,9 @@ def jj_search(transition_list: List[str]):
                     high_level: str = generalVars.the_aug_dictionary[transition]["high_level"] # type: ignore
                     
                     if not cs_type[cs_index]:
-                        jj_vals += [line.jji for i, lines in enumerate(lines_to_search_PCS) for line in lines if line.filterLevel(low_level, high_level, strict='na') and generalVars.aug_PCS[i] == cs]
+                        jj_vals += [line.jji for i, charge_state in enumerate(generalVars.aug_PCS) if charge_state == cs for line in lines_to_search_PCS[i] if line.filterLevel(low_level, high_level, strict='na')]
                     else:
-                        jj_vals += [line.jji for i, lines in enumerate(lines_to_search_NCS) for line in lines if line.filterLevel(low_level, high_level, strict='na') and generalVars.aug_PCS[i] == cs]
+                        jj_vals += [line.jji for i, charge_state in enumerate(generalVars.aug_NCS) if charge_state == cs for line in lines_to_search_NCS[i] if line.filterLevel(low_level, high_level, strict='na')]
         
     jj_vals = list(set(jj_vals))
     jj_vals.sort()
@@ -406,9 +489,12 @@ def avgDiagramOverlap(diagram_source: List[Line], beam: float, FWHM: float):
     Returns:
         float: average diagram overlap
     """
-    from simulation.mults import get_overlap
+    from simulation.mults import get_overlaps
     
     if len(diagram_source) == 0:
         return 0.0
     
-    return sum([get_overlap(line, beam, FWHM) for line in diagram_source]) / len(diagram_source)
\ No newline at end of file
+    # The overlaps of all the lines are calculated together
+    overlaps = np.mean(get_overlaps(diagram_source, beam, FWHM), axis=0)
+    
+    return float(overlaps) if np.ndim(beam) == 0 else overlaps
\ No newline at end of file
@@ -23,7 +23,7 @@ from simulation.shake import setupShake
 # Bad selection reporting functions
 from utils.experimental.detector import initialize_detectorEfficiency
 
-from simulation.ycalc import y_calculator, normalizer, add_fitting_components
+from simulation.ycalc import y_calculator, normalizer, add_fitting_components, profile_accuracy
 from simulation.bounds import calculate_xfinal
 from simulation.fitting import calculateResidues, execute_autofit,execute_autofit_minuit
 
@@ -172,7 +172,12 @@ def make_simulation(sim: Toplevel, f: Figure, graph_area: Axes, time_of_click: d
     peak = guiVars.type_var.get() # type: ignore
     
     generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
-        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
+        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, check_accuracy=True)
+    
+    # Show the accuracy of the approximate profile evaluation modes once for this simulation
+    accuracy = profile_accuracy()
+    if accuracy:
+        messagebox.showinfo("Profile Accuracy", accuracy)
 
     # Add the extra fitting components
     if len(generalVars.extra_fitting_functions) > 0:
@@ -206,7 +211,7 @@ def make_simulation(sim: Toplevel, f: Figure, graph_area: Axes, time_of_click: d
     # ---------------------------------------------------------------------------------------------------------------
     # Autofit:
     number_of_fit_variables = 0
-    if guiVars.autofitvar.get() == 'LMFit': # type: ignore
+    if guiVars.autofitvar.get() in ['LMFit', 'VarPro', 'MultiStart']: # type: ignore
         #guiVars.autofitvar_minuit.set("No")
         # We can only fit if we have an experimental spectrum
         if load != 'No':
@@ -405,7 +410,12 @@ def make_Msimulation(sim: Toplevel, f: Figure, graph_area: Axes, time_of_click:
     peak = guiVars.type_var.get() # type: ignore
     
     generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
-        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
+        generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals = y_calculator(sim, sat, peak, generalVars.xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset, check_accuracy=True)
+    
+    # Show the accuracy of the approximate profile evaluation modes once for this simulation
+    accuracy = profile_accuracy()
+    if accuracy:
+        messagebox.showinfo("Profile Accuracy", accuracy)
     
     # Add the extra fitting components
     if len(generalVars.extra_fitting_functions) > 0:
@@ -535,13 +545,7 @@ def simulate(sim: Toplevel, f: Figure, graph_area: Axes):
     # --------------------------------------------------------------------------------------------------------------------------
     elif spectype == 'Simulation':
         graph_area = make_simulation(sim, f, graph_area, time_of_click)
-        # CODE FOR AUTOMATIC BEAM ENERGY INCREMENTATION
-        import numpy as np
-        #for energ in np.linspace(8970, 10500, 5100, endpoint=True):
-        #for energ in np.linspace(9955, 10045, 300, endpoint=True):
-        # for energ in [9950, 10050, 10200, 10300, 10400, 10500, 18000, 20000]:
-           #guiVars.excitation_energy.set(energ) # type: ignore
-        #graph_area = make_simulation(sim, f, graph_area, time_of_click, False)
+        # Beam energy scans are run from the Tools menu (simulation.beamScan)
     # --------------------------------------------------------------------------------------------------------------------------------------
     elif spectype == 'M_Simulation':
         graph_area = make_Msimulation(sim, f, graph_area, time_of_click)
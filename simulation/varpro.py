@@ -0,0 +1,337 @@
+"""
+Module with the variable projection fit.
+Only the nonlinear parameters (energy offsets, resolution, positions and widths of the extra components) are searched by the optimizer,
+while the linear ones (intensity offset, normalization, shake amplitudes and extra component amplitudes) are solved at each step
+with a bounded linear least squares. The values and errors of the linear parameters in the fit report come from the projected
+linear least squares solution at the fitted nonlinear parameters.
+"""
+
+from __future__ import annotations
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from simulation.basis import ComponentBasis
+from simulation.ycalc import fitting_component
+
+from utils.experimental.detector import efficiency_model
+
+from scipy.interpolate import interp1d
+from scipy.optimize import lsq_linear
+
+from lmfit import Minimizer, Parameters
+from lmfit.minimizer import MinimizerResult
+
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from tkinter import Toplevel
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                 VARIABLE PROJECTION FIT                   #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Check if a fit parameter enters the model linearly
+def is_linear_parameter(name: str) -> bool:
+    """
+    Function to check if a fit parameter enters the model linearly, after the reparametrization of the normalization
+
+        Args:
+            name: name of the fit parameter
+
+        Returns:
+            True if the parameter is solved by the linear least squares
+    """
+    return name in ['yoff', 'ytot_max'] or 'shake_amp_' in name or 'shakeup_amp_' in name or name.endswith('_ampPar')
+
+# Build the linear least squares problem of the linear parameters for fixed nonlinear parameters
+def linear_system(params: Parameters, basis: ComponentBasis, sim: Toplevel,
+                  exp_x: List[float], exp_y: List[float], num_of_points: int, sat: str, peak: str,
+                  x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                  xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                  energy_values: List[float], efficiency_values: List[float]) -> \
+                      Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], Tuple[List[float], List[float]], Callable[[npt.NDArray[np.float64]], Dict[str, float]]]:
+    """
+    Function to build the linear least squares problem of the linear fit parameters for the current nonlinear parameters.
+    The model is a * (fixed + sum_k c_k D_k + sum_e s_e) + y0, with a the normalization multiplier, D_k the spectrum of the shake label k,
+    c_k the product of its fitted amplitudes and s_e the extra components. The products a * c_k are solved as non-negative unknowns
+
+        Args:
+            params: fit parameters, only the values of the nonlinear ones are used
+            basis: component basis cache of the fit
+            remaining arguments: same as func2min
+
+        Returns:
+            matrix: design matrix of the linear unknowns at the experimental points
+            target: experimental intensities to be fitted by matrix @ unknowns
+            bounds: lower and upper bounds of the linear unknowns
+            recover: function that converts a solution of the linear unknowns into the values of the linear parameters
+    """
+    normalize = guiVars.normalizevar.get() # type: ignore
+
+    xoff = params['xoff'].value
+    if guiVars.separate_offsets.get(): # type: ignore
+        shkoff_xoff = params['shkoff_xoff'].value
+        shkup_xoff = params['shkup_xoff'].value
+        sat_xoff = 0.0
+    else:
+        sat_xoff = params['sat_xoff'].value
+        shkoff_xoff = 0.0
+        shkup_xoff = 0.0
+    res = params['res'].value
+
+    amp_names = [name for name in params if 'shake_amp_' in name or 'shakeup_amp_' in name]
+    if len(amp_names) > 0 and basis.lines is None:
+        basis.build_lines({name: 1.0 for name in amp_names})
+
+    xfinal = np.array(np.linspace(min(exp_x), max(exp_x), num=num_of_points))
+    entry = basis.basis(sim, sat, peak, xfinal, x, y, w, xs, ys, ws, res, energy_values, efficiency_values,
+                        xoff, sat_xoff, shkoff_xoff, shkup_xoff)
+
+    n_labels = len(generalVars.label1)
+    fitted_labels = [label for label in generalVars.label1 if 'shake_amp_' + label in params or 'shakeup_amp_' + label in params]
+
+    # Spectrum of the lines that do not depend on the fitted amplitudes, and of each fitted shake label
+    fixed = np.array(entry['ydiag'], dtype=np.float64)
+    label_spectra = []
+    for index, label in enumerate(generalVars.label1):
+        if label in fitted_labels and entry['S0'] is not None:
+            fixed = fixed + entry['S0'][index] + entry['S0'][index + n_labels]
+            label_spectra.append(entry['S1'][index] + entry['S1'][index + n_labels] - entry['S0'][index] - entry['S0'][index + n_labels])
+        else:
+            fixed = fixed + entry['S1'][index] + entry['S1'][index + n_labels]
+            if label in fitted_labels:
+                label_spectra.append(np.zeros(len(xfinal)))
+
+    # The total spectrum is weighted by the efficiency at the main offset
+    if guiVars.effic_var.get() != 'No': # type: ignore
+        effic = efficiency_model(energy_values, efficiency_values).evaluate(xfinal, xoff)
+        fixed = fixed * effic
+        label_spectra = [spectrum * effic for spectrum in label_spectra]
+
+    # Shapes of the extra components with unit amplitude
+    extra_shapes = []
+    for key in generalVars.extra_fitting_functions:
+        function = key.split("_")[1]
+        GwidthPar = res
+        LwidthPar = 0.0
+        if function in ['Gaussian', 'Voigt'] and generalVars.extra_fitting_functions[key]['widthRes'] == 0.0:
+            GwidthPar = params[key + "_GwidthPar"].value
+        if function == 'Voigt' or (function == 'Lorentzian' and generalVars.extra_fitting_functions[key]['widthRes'] == 0.0):
+            LwidthPar = params[key + "_LwidthPar"].value
+        elif function == 'Lorentzian':
+            LwidthPar = res
+        extra_shapes.append(fitting_component(xfinal, function, params[key + "_xPar"].value, 1.0, GwidthPar, LwidthPar))
+
+    # Same experimental points as the function to minimize
+    mask = (np.asarray(exp_x) > min(xfinal)) & (np.asarray(exp_x) < max(xfinal))
+    exp_x_f = np.asarray(exp_x)[mask]
+    exp_y_f = np.asarray(exp_y, dtype=np.float64)[mask]
+    target = exp_y_f / max(exp_y_f) if normalize == 'One' else exp_y_f.copy()
+
+    spectra = np.array([fixed] + label_spectra + extra_shapes)
+    interpolated = interp1d(xfinal, spectra, kind='cubic', axis=1)(exp_x_f)
+
+    n_amps = len(label_spectra)
+    n_extras = len(extra_shapes)
+
+    lower = [0.0] * (n_amps + n_extras) + [params['yoff'].min]
+    upper = [np.inf] * (n_amps + n_extras) + [params['yoff'].max]
+    if normalize == 'No':
+        # The normalization multiplier is 1, the fixed spectrum is not scaled
+        target = target - interpolated[0]
+        matrix = np.vstack((interpolated[1:], np.ones(len(exp_x_f)))).T
+        for i, label in enumerate(fitted_labels):
+            names = [name for name in ['shake_amp_' + label, 'shakeup_amp_' + label] if name in params]
+            lower[i] = np.prod([params[name].min for name in names])
+            upper[i] = np.prod([params[name].max for name in names])
+    else:
+        matrix = np.vstack((interpolated, np.ones(len(exp_x_f)))).T
+        lower = [0.0] + lower
+        upper = [np.inf] + upper
+
+    # Recover the fit parameters from the linear unknowns
+    def recover(solution: npt.NDArray[np.float64]) -> Dict[str, float]:
+        """
+        Function to convert a solution of the linear unknowns into the values of the linear fit parameters
+        """
+        if normalize == 'No':
+            normalization_var = 1.0
+            unknowns = solution[:-1]
+        else:
+            normalization_var = max(solution[0], 1E-12)
+            unknowns = solution[1:-1] / normalization_var
+        y0 = solution[-1]
+
+        linear_values: Dict[str, float] = {'yoff': y0}
+        if normalize == 'ExpMax':
+            linear_values['ytot_max'] = (max(exp_y) - y0) / normalization_var
+        elif normalize == 'One':
+            linear_values['ytot_max'] = (1 - y0) / normalization_var
+        else:
+            linear_values['ytot_max'] = params['ytot_max'].value
+
+        ytot = fixed.copy()
+        for i, label in enumerate(fitted_labels):
+            # Only the product of the amplitudes of a label enters the model, so it is split evenly between them
+            names = [name for name in ['shake_amp_' + label, 'shakeup_amp_' + label] if name in params]
+            for name in names:
+                linear_values[name] = unknowns[i] ** (1 / len(names))
+            ytot = ytot + unknowns[i] * label_spectra[i]
+
+        # The extra amplitudes are relative to the maximum of the total intensity before each component is added
+        for e, key in enumerate(generalVars.extra_fitting_functions):
+            ytot_max = max(ytot)
+            linear_values[key + '_ampPar'] = unknowns[n_amps + e] / ytot_max if ytot_max != 0 else 0.0
+            ytot = ytot + unknowns[n_amps + e] * extra_shapes[e]
+
+        return linear_values
+    
+    return matrix, target, (lower, upper), recover
+
+# Solve the linear parameters for fixed nonlinear parameters
+def project(params: Parameters, basis: ComponentBasis, sim: Toplevel,
+            exp_x: List[float], exp_y: List[float], num_of_points: int, sat: str, peak: str,
+            x: List[List[float]], y: List[List[float]], w: List[List[float]],
+            xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+            energy_values: List[float], efficiency_values: List[float]) -> Tuple[npt.NDArray[np.float64], Dict[str, float]]:
+    """
+    Function to solve the linear fit parameters for the current nonlinear parameters with a bounded linear least squares
+
+        Args:
+            same as linear_system
+
+        Returns:
+            residues: differences between the projected model and the experimental intensities, as returned by func2min
+            linear_values: solved values of the linear parameters
+    """
+    matrix, target, bounds, recover = linear_system(params, basis, sim, exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+    
+    solution = lsq_linear(matrix, target, bounds=bounds).x
+    
+    return matrix @ solution - target, recover(solution)
+
+# Standard errors of the linear parameters from the covariance of the projected solution
+def linear_errors(params: Parameters, scale: float, basis: ComponentBasis, sim: Toplevel,
+                  exp_x: List[float], exp_y: List[float], num_of_points: int, sat: str, peak: str,
+                  x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                  xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                  energy_values: List[float], efficiency_values: List[float]) -> Tuple[Dict[str, float], Dict[str, float | None]]:
+    """
+    Function to calculate the values and standard errors of the linear fit parameters for the fitted nonlinear parameters.
+    The covariance of the linear unknowns is scale * (A^T A)^-1, with A the design matrix of the projection,
+    and it is propagated to the linear parameters with the Jacobian of the conversion from the unknowns
+
+        Args:
+            params: fit parameters, only the values of the nonlinear ones are used
+            scale: variance of the residues (the reduced chi-square of the fit)
+            remaining arguments: same as linear_system
+
+        Returns:
+            linear_values: solved values of the linear parameters
+            linear_stderr: standard errors of the linear parameters (None when they are not solved by the projection)
+    """
+    matrix, target, bounds, recover = linear_system(params, basis, sim, exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+    
+    solution = lsq_linear(matrix, target, bounds=bounds).x
+    linear_values = recover(solution)
+    
+    covariance = scale * np.linalg.pinv(matrix.T @ matrix)
+    
+    # Jacobian of the conversion from the unknowns to the parameters, by central differences
+    names = list(linear_values)
+    jacobian = np.zeros((len(names), len(solution)))
+    for j in range(len(solution)):
+        step = 1E-6 * max(abs(solution[j]), 1E-6)
+        forward = solution.copy()
+        backward = solution.copy()
+        forward[j] += step
+        backward[j] -= step
+        values_forward = recover(forward)
+        values_backward = recover(backward)
+        jacobian[:, j] = [(values_forward[name] - values_backward[name]) / (2 * step) for name in names]
+    
+    variances = np.einsum('ij,jk,ik->i', jacobian, covariance, jacobian)
+    
+    linear_stderr: Dict[str, float | None] = {}
+    for name, variance, row in zip(names, variances, jacobian):
+        # Parameters that do not depend on the unknowns (the maximum without normalization) are not fitted
+        linear_stderr[name] = float(np.sqrt(max(variance, 0.0))) if np.any(row != 0.0) else None
+    
+    return linear_values, linear_stderr
+
+# Residues of the variable projection fit
+def func2min_varpro(params: Parameters, basis: ComponentBasis, sim: Toplevel,
+                    exp_x: List[float], exp_y: List[float], num_of_points: int, sat: str, peak: str,
+                    x: List[List[float]], y: List[List[float]], w: List[List[float]],
+                    xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+                    energy_values: List[float], efficiency_values: List[float]) -> npt.NDArray[np.float64]:
+    """
+    Function to be minimized in the variable projection fit, the residues after solving the linear parameters
+
+        Args:
+            same as project
+
+        Returns:
+            differences between the projected model and the experimental intensities
+    """
+    residues, _ = project(params, basis, sim, exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+
+    return residues
+
+# Fit the parameters with the variable projection
+def varpro_fit(params: Parameters, sim: Toplevel,
+               exp_x: List[float], exp_y: List[float], num_of_points: int, sat: str, peak: str,
+               x: List[List[float]], y: List[List[float]], w: List[List[float]],
+               xs: List[List[List[float]]], ys: List[List[List[float]]], ws: List[List[List[float]]],
+               energy_values: List[float], efficiency_values: List[float]) -> MinimizerResult:
+    """
+    Function to fit the parameters with the variable projection. Only the nonlinear parameters are minimized, with the
+    linear ones projected out in the residues. The linear parameters of the result are then set to the projected solution
+    at the fitted nonlinear parameters, with the standard errors from its covariance, and the fit statistics count them
+    as fitted parameters. The errors of the linear parameters do not include the uncertainty of the nonlinear ones
+
+        Args:
+            params: initialized fit parameters
+            remaining arguments: same as func2min
+
+        Returns:
+            result object from the fitting, with the values and errors of all the parameters
+    """
+    basis = ComponentBasis()
+    args = (basis, sim, exp_x, exp_y, num_of_points, sat, peak, x, y, w, xs, ys, ws, energy_values, efficiency_values)
+
+    nonlinear = params.copy()
+    linear_names = [name for name in nonlinear if is_linear_parameter(name) and nonlinear[name].vary]
+    for name in linear_names:
+        nonlinear[name].vary = False
+
+    result = Minimizer(func2min_varpro, nonlinear, fcn_args=args).minimize()
+    
+    # Count the solved linear unknowns (one per shake label, not per amplitude) as fitted parameters in the statistics
+    matrix, _, _, _ = linear_system(result.params, *args) # type: ignore
+    redchi = result.redchi
+    result.nvarys += matrix.shape[1]
+    result.nfree = max(result.ndata - result.nvarys, 1)
+    result.redchi = result.chisqr / result.nfree
+    neg2_log_likel = result.ndata * np.log(max(result.chisqr, 1E-250) / result.ndata)
+    result.aic = neg2_log_likel + 2 * result.nvarys
+    result.bic = neg2_log_likel + np.log(result.ndata) * result.nvarys
+    
+    # The errors of the nonlinear parameters were scaled with the reduced chi-square of the nonlinear fit
+    for name in result.params: # type: ignore
+        if result.params[name].stderr is not None and redchi > 0: # type: ignore
+            result.params[name].stderr *= np.sqrt(result.redchi / redchi) # type: ignore
+    
+    linear_values, linear_stderr = linear_errors(result.params, result.redchi, *args) # type: ignore
+    for name in linear_names:
+        result.params[name].vary = linear_stderr[name] is not None # type: ignore
+        result.params[name].value = min(max(linear_values[name], result.params[name].min), result.params[name].max) # type: ignore
+        result.params[name].stderr = linear_stderr[name] # type: ignore
+
+    return result
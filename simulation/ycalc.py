@@ -7,8 +7,13 @@ from __future__ import annotations
 #GUI Imports for warnings
 from tkinter import messagebox
 
-from simulation.profiles import G, L, V
+from simulation.profiles import G, L, V, voigt_profile
+from simulation.profileEngine import flatten_lines, batched_profile, window_halfwidths, windowed_profile, windowed_segments, truncation_bound, \
+                                    convolved_profile, convolution_accuracy
 from utils.experimental.detector import detector_efficiency
+from utils.misc.progress import ProgressReporter, TkProgress, NullProgress
+
+from data.definitions import ComponentStore
 
 import data.variables as generalVars
 
@@ -34,10 +39,11 @@ def y_calculator(sim: Toplevel, transition_type: str, fit_type: str,
                  xs: List[List[List[float]]],
                  ys: List[List[List[float]]], ws: List[List[List[float]]],
                  res: float, energy_values: List[float], efficiency_values: List[float],
-                 enoffset: float, sat_enoffset: float, shkoff_enoffset: float, shkup_enoffset: float) -> \
+                 enoffset: float, sat_enoffset: float, shkoff_enoffset: float, shkup_enoffset: float,
+                 progress: ProgressReporter | None = None, apply_efficiency: bool = True, check_accuracy: bool = False) -> \
                     Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64],
                         npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64],
-                        npt.NDArray[np.float64]]:
+                        ComponentStore]:
     """ 
     Function to calculate the simulated intensities for all the transitions requested, taking into account the simulated offsets.
     This function is used only to apply the selected profile to the already filtered x, y and width values for the transitions.
@@ -60,14 +66,21 @@ def y_calculator(sim: Toplevel, transition_type: str, fit_type: str,
             sat_enoffset: satellite energy offset to simulate
             shkoff_enoffset: shake-off energy offset to simulate
             shkup_enoffset: shake-up energy offset to simulate
+            progress: progress reporter, defaults to the interface progress bar of sim (or no reporting if sim is None)
+            apply_efficiency: if the detector efficiency weights are applied to the y values (when efficiency data was loaded)
+            check_accuracy: if the convolution mode is checked against the exact profiles on a sample of lines (only for single simulations, not fit evaluations)
         
         Returns:
             yfinal: list of simulated y values for each diagram transition we want to simulate for each of the x values in T
             ytot: list of the simulated total y values for all transitions we want to simulate for each of the x values in T
-            yfinals: list of simulated y values for each satellite transition in each digram transition we want to simulate for each of the x values in T
+            yfinals: sparse store of the simulated y values for each satellite transition in each digram transition we want to simulate for each of the x values in T
     """
+    # Report the progress to the interface progress bar unless another reporter was requested
+    if progress is None:
+        progress = TkProgress(sim, guiVars.progress_var) if sim is not None else NullProgress()
+    
     # Initialize a list to store the final y values for each selected transition to be calulated
-    generalVars.yfinal = np.array([[0.0 for _ in range(len(xfinal))] for _ in range(len(x))])
+    generalVars.yfinal = np.zeros((len(x), len(xfinal)))
     """
     List of simulated y values for each diagrma transition we want to simulate for each of the x values in T
     """
@@ -103,104 +116,174 @@ def y_calculator(sim: Toplevel, transition_type: str, fit_type: str,
     List of the simulated total y values for all shake-up transitions we want to simulate for each of the x values in T
     """
     # Initialize a list to store the final y values for each satellite transition for each of the selected transitions
-    generalVars.yfinals = []
+    generalVars.yfinals = ComponentStore(len(xs), 2 * len(generalVars.label1), len(xfinal))
     """
     List of simulated y values for each satellite transition in each digram transition we want to simulate for each of the x values in T
     """
     
-    for j in range(len(xs)):
-        generalVars.yfinals.append([])
-        for i in generalVars.label1:
-            generalVars.yfinals[-1].append([0.0 for n in range(len(xfinal))])
-            generalVars.yfinals[-1].append([0.0 for n in range(len(xfinal))])
-    
-    generalVars.yfinals = np.array(generalVars.yfinals)
-    
-    profile = V
-    if fit_type == 'Voigt':
-        profile = V
-    elif fit_type == 'Lorentzian':
+    # Profile function of the selected line type, the Voigt uses the backend selected in the interface (exact or pseudo-Voigt)
+    if fit_type == 'Lorentzian':
         profile = L
     elif fit_type == 'Gaussian':
         profile = G
+    else:
+        profile = voigt_profile(guiVars.voigt_method.get()) # type: ignore
+    
+    # Profile evaluation mode selected in the interface (exact over the full grid, truncated to a window around each line or binned convolution)
+    profile_mode = guiVars.profile_mode.get() # type: ignore
+    tail_tol = guiVars.profile_tail_tol.get() # type: ignore
+    
+    generalVars.truncatedArea = 0.0
+    if check_accuracy:
+        generalVars.convolutionError = 0.0
+    
+    # Calculate the summed profiles of each segment with the selected evaluation mode
+    def segment_profiles(energies: npt.NDArray[np.float64], intens: npt.NDArray[np.float64],
+                         widths: npt.NDArray[np.float64], segments: npt.NDArray[np.int64],
+                         n_segments: int, callback) -> npt.NDArray[np.float64]:
+        """
+        Function to calculate the summed profiles of each segment with the profile evaluation mode selected in the interface
+        """
+        if profile_mode == 'Truncated':
+            halfwidths = window_halfwidths(fit_type, res, widths, tail_tol)
+            generalVars.truncatedArea += truncation_bound(fit_type, res, widths, intens, tail_tol)
+            return windowed_profile(profile, xfinal, energies, intens, widths, segments, n_segments, res, halfwidths, callback)
+        elif profile_mode == 'Convolution':
+            if check_accuracy:
+                generalVars.convolutionError = max(generalVars.convolutionError, convolution_accuracy(profile, fit_type, xfinal, energies, intens, widths, res))
+            return convolved_profile(profile, fit_type, xfinal, energies, intens, widths, segments, n_segments, res, callback=callback)
+        
+        return batched_profile(profile, xfinal, energies, intens, widths, segments, n_segments, res, callback)
     
     b1max = 100 if '+' not in transition_type else 50
     if 'Diagram' in transition_type or 'Auger' in transition_type:
-        b1 = 0
-        # Loop all the diagram or auger transitions to calculate (y parameter)
-        for j, k in enumerate(y):
-            # For each transition (high-low levels) loop all the different rates
-            # print("Diagram")
-            # print(str(x[j]) + "; " + str(y[j]) + "; " + str(w[j]))
-            for i in range(len(k)):
-                # Depending on the profile selected add the y values of the calculated profile to the y values of this transition
-                # This profile is calculated across the entire simulated range of x values
-                generalVars.yfinal[j] = np.add(generalVars.yfinal[j], profile(xfinal, x[j][i] + enoffset, y[j][i], res, w[j][i]))
-                
-                # Add a proportionate amount of progress to the current progress value
-                b1 += b1max / (len(y) * len(k))
-                # Set the progress on the interface
-                guiVars.progress_var.set(b1) # type: ignore
-                # Update the interface to show the progress
-                sim.update_idletasks()
-            
-            # If the transition rates list is not empty then add the y values for this transition into the total y values for all transitions
-            if k != []:
-                generalVars.ytot = np.add(generalVars.ytot, generalVars.yfinal[j])
-                generalVars.ydiagtot = np.add(generalVars.ydiagtot, generalVars.yfinal[j])
+        # Flatten the diagram or auger lines of all transitions (y parameter), each transition is one segment
+        energies, intens, widths, segments = flatten_lines(x, y, w, enoffset)
+        
+        # Progress callback to report after each chunk of lines
+        def diag_progress(done: int, total: int):
+            progress.report('Simulation', b1max * done / total, 100) # type: ignore
         
-        # Set and update the progress and progress bar to 100%
+        # Calculate the profiles of all lines across the entire simulated range of x values and sum them per transition
+        generalVars.yfinal = segment_profiles(energies, intens, widths, segments, len(x), diag_progress)
+        
+        # Add the y values of all transitions into the total y values (empty transitions are all zeros)
+        generalVars.ydiagtot = generalVars.yfinal.sum(axis=0)
+        generalVars.ytot = np.add(generalVars.ytot, generalVars.ydiagtot)
+        
+        # Report the progress of the diagram lines as done
         b1 = b1max
-        guiVars.progress_var.set(b1) # type: ignore
-        sim.update_idletasks()
+        progress.report('Simulation', b1, 100)
     
     if 'Satellites' in transition_type:
         b1 = 0 if b1max == 100 else b1max
-        # Similar to the diagram transitions but we need an extra for loop to get the rates of each satellite in each diagram transition
+        n_comps = 2 * len(generalVars.label1)
+        
+        # Energy offset of each satellite component, shake-off components come first and shake-up after
+        if guiVars.separate_offsets.get(): # type: ignore
+            comp_offsets = np.array([enoffset + shkoff_enoffset if l < len(generalVars.label1) else enoffset + shkup_enoffset for l in range(n_comps)])
+        else:
+            comp_offsets = np.full(n_comps, enoffset + sat_enoffset)
+        
+        # Each satellite component of each transition is one segment (j * n_comps + l)
+        xs_flat: List[List[float]] = [[] for _ in range(len(xs) * n_comps)]
+        ys_flat: List[List[float]] = [[] for _ in range(len(xs) * n_comps)]
+        ws_flat: List[List[float]] = [[] for _ in range(len(xs) * n_comps)]
         for j, k in enumerate(ys):
             for l, m in enumerate(k):
-                # print(str(l) + " -> " + generalVars.label1[l])
-                # print(str(xs[j][l]) + "; " + str(ys[j][l]) + "; " + str(ws[j][l]))
-                for i, n in enumerate(m):
-                    if guiVars.separate_offsets.get(): # type: ignore
-                        if l < len(generalVars.label1):
-                            generalVars.yfinals[j][l] = np.add(generalVars.yfinals[j][l], profile(xfinal, xs[j][l][i] + enoffset + shkoff_enoffset, ys[j][l][i], res, ws[j][l][i]))
-                        else:
-                            generalVars.yfinals[j][l] = np.add(generalVars.yfinals[j][l], profile(xfinal, xs[j][l][i] + enoffset + shkup_enoffset, ys[j][l][i], res, ws[j][l][i]))
-                    else:
-                        generalVars.yfinals[j][l] = np.add(generalVars.yfinals[j][l], profile(xfinal, xs[j][l][i] + enoffset + sat_enoffset, ys[j][l][i], res, ws[j][l][i]))
-
-                    b1 += b1max / (len(ys) * len(generalVars.label1) * len(m))
-                    guiVars.progress_var.set(b1) # type: ignore
-                    sim.update_idletasks()
-                
-                if m != []:
-                    generalVars.ytot = np.add(generalVars.ytot, generalVars.yfinals[j][l])
-                    generalVars.ysattot = np.add(generalVars.ysattot, generalVars.yfinals[j][l])
-                    if l < len(generalVars.label1):
-                        generalVars.yshkofftot = np.add(generalVars.yshkofftot, generalVars.yfinals[j][l])
-                    else:
-                        generalVars.yshkuptot = np.add(generalVars.yshkuptot, generalVars.yfinals[j][l])
+                xs_flat[j * n_comps + l] = xs[j][l]
+                ys_flat[j * n_comps + l] = m
+                ws_flat[j * n_comps + l] = ws[j][l]
+        
+        energies, intens, widths, segments = flatten_lines(xs_flat, ys_flat, ws_flat, np.tile(comp_offsets, len(xs)))
+        
+        # Progress callback to report after each chunk of lines
+        def sat_progress(done: int, total: int):
+            progress.report('Simulation', b1 + (100 - b1) * done / total, 100) # type: ignore
+        
+        # Only the components that have lines are simulated, each one stored in its non-zero support
+        stored, compact = np.unique(segments, return_inverse=True)
+        generalVars.yfinals = ComponentStore(len(xs), n_comps, len(xfinal))
+        
+        if profile_mode == 'Truncated':
+            # The truncated profiles are accumulated directly in the support of each component, the dense rows are never allocated
+            halfwidths = window_halfwidths(fit_type, res, widths, tail_tol)
+            generalVars.truncatedArea += truncation_bound(fit_type, res, widths, intens, tail_tol)
+            seg_lo, _, values = windowed_segments(profile, xfinal, energies, intens, widths, compact, len(stored), res, halfwidths, sat_progress)
+            for seg, start, component_values in zip(stored, seg_lo, values):
+                generalVars.yfinals.set(int(seg) // n_comps, int(seg) % n_comps, component_values, int(start))
+        else:
+            yseg = segment_profiles(energies, intens, widths, compact, len(stored), sat_progress)
+            for seg, component_values in zip(stored, yseg):
+                generalVars.yfinals.set(int(seg) // n_comps, int(seg) % n_comps, component_values)
+        
+        # Reduce the components into the shake-off, shake-up and satellite totals
+        generalVars.yshkofftot = generalVars.yfinals.total(range(len(generalVars.label1)))
+        generalVars.yshkuptot = generalVars.yfinals.total(range(len(generalVars.label1), n_comps))
+        generalVars.ysattot = np.add(generalVars.yshkofftot, generalVars.yshkuptot)
+        generalVars.ytot = np.add(generalVars.ytot, generalVars.ysattot)
         
         b1 = 100
-        guiVars.progress_var.set(b1) # type: ignore
-        sim.update_idletasks()
+        progress.report('Simulation', b1, 100)
 
     # If detector efficiency data was loaded the appropriate weights are applied to the y values
+    if apply_efficiency:
+        apply_detector_efficiency(energy_values, efficiency_values, xfinal, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
+    
+    return generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
+            generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals
+
+# Apply the detector efficiency to the simulated y values
+def apply_detector_efficiency(energy_values: List[float], efficiency_values: List[float],
+                              xfinal: npt.NDArray[np.float64], enoffset: float, sat_enoffset: float,
+                              shkoff_enoffset: float, shkup_enoffset: float):
+    """
+    Function to apply the detector efficiency weights to the simulated y values stored in the general variables.
+    Nothing is done if no efficiency data was loaded in the interface
+        
+        Args:
+            energy_values: energy values read from the detector efficiency data
+            efficiency_values: efficiency values read from the detector efficiency data
+            xfinal: array with the x values of the simulation
+            enoffset: energy offset of the simulation
+            sat_enoffset: satellite energy offset of the simulation
+            shkoff_enoffset: shake-off energy offset of the simulation
+            shkup_enoffset: shake-up energy offset of the simulation
+    """
     if guiVars.effic_var.get() != 'No': # type: ignore
         # Get the efficiency values for the x values simulated
         detector_effi, detector_effi_sat, detector_effi_shkoff, detector_effi_shkup = detector_efficiency(energy_values, efficiency_values, xfinal, enoffset, sat_enoffset, shkoff_enoffset, shkup_enoffset)
         # Modify the y values by the effiency weights
-        generalVars.ytot = np.multiply(generalVars.ytot, np.array(detector_effi))
-        generalVars.ydiagtot = np.multiply(generalVars.ydiagtot, np.array(detector_effi))
-        generalVars.ysattot = np.multiply(generalVars.ysattot, np.array(detector_effi_sat))
-        generalVars.yshkofftot = np.multiply(generalVars.yshkofftot, np.array(detector_effi_shkoff))
-        generalVars.yshkuptot = np.multiply(generalVars.yshkuptot, np.array(detector_effi_shkup))
-        generalVars.yfinal = np.multiply(generalVars.yfinal, np.array(detector_effi))
-        generalVars.yfinals = np.multiply(generalVars.yfinals, np.array(detector_effi))
+        generalVars.ytot = np.multiply(generalVars.ytot, detector_effi)
+        generalVars.ydiagtot = np.multiply(generalVars.ydiagtot, detector_effi)
+        generalVars.ysattot = np.multiply(generalVars.ysattot, detector_effi_sat)
+        generalVars.yshkofftot = np.multiply(generalVars.yshkofftot, detector_effi_shkoff)
+        generalVars.yshkuptot = np.multiply(generalVars.yshkuptot, detector_effi_shkup)
+        generalVars.yfinal = np.multiply(generalVars.yfinal, detector_effi)
+        # Each satellite component is weighted by the efficiency at the offset it was simulated with
+        shkoff_comps = range(len(generalVars.label1))
+        shkup_comps = range(len(generalVars.label1), 2 * len(generalVars.label1))
+        if guiVars.separate_offsets.get(): # type: ignore
+            generalVars.yfinals.scale(detector_effi_shkoff, shkoff_comps)
+            generalVars.yfinals.scale(detector_effi_shkup, shkup_comps)
+        else:
+            generalVars.yfinals.scale(detector_effi_sat)
+
+# Describe the accuracy of the last simulation when an approximate profile evaluation mode is selected
+def profile_accuracy() -> str:
+    """
+    Function to describe the accuracy of the last simulation for the profile evaluation mode selected in the interface.
+    This is meant to be shown once per simulation, not for each evaluation of a fit
+        
+        Returns:
+            message with the bound on the truncated profile area or the relative error of the convolution mode (empty if the profiles are exact)
+    """
+    if guiVars.profile_mode.get() == 'Truncated': # type: ignore
+        return "Truncated profile area bound: " + str(generalVars.truncatedArea) + " (lines cut at " + str(guiVars.profile_tail_tol.get()) + " of their peak)" # type: ignore
+    elif guiVars.profile_mode.get() == 'Convolution': # type: ignore
+        return "Convolution mode relative error (sample check against the exact profiles): " + str(generalVars.convolutionError)
     
-    return generalVars.ytot, generalVars.ydiagtot, generalVars.ysattot, generalVars.yshkofftot, \
-            generalVars.yshkuptot, generalVars.yfinal, generalVars.yfinals
+    return ""
 
 # Normalization function
 def normalizer(y0: float, expy_max: float, ytot_max: float) -> float:
@@ -256,6 +339,31 @@ def add_fitting_components(xfinal: npt.NDArray[np.float64], function: str,
     Returns:
         npt.NDArray[np.float64]: new intensity values with the added component
     """
+    component = fitting_component(xfinal, function, xPar, ampPar, GwidthPar, LwidthPar)
+
+    generalVars.ytot = np.add(generalVars.ytot, component)  ## adicionams estes valores de y aos que já tinhamos pois isto são extra
+    
+    generalVars.yextrastot = np.add(generalVars.yextrastot, component)
+
+    return component
+
+# Calculate a fitting component without adding it to the total intensity
+def fitting_component(xfinal: npt.NDArray[np.float64], function: str,
+    xPar: float, ampPar: float, GwidthPar: float, LwidthPar: float = 0.0) -> \
+        npt.NDArray[np.float64]:
+    """Function to calculate the intensity of a fitting component
+
+    Args:
+        xfinal (npt.NDArray[np.float64]): final energy values to be simulated
+        function (str): function to use for the component
+        xPar (float): component x offset
+        ampPar (float): component amplitude
+        GwidthPar (float): gaussian width
+        LwidthPar (float, optional): lorentzian width. Defaults to 0.0.
+
+    Returns:
+        npt.NDArray[np.float64]: intensity values of the component
+    """
     component = np.zeros(len(xfinal))
     
     if function == 'Gaussian':
@@ -264,9 +372,5 @@ def add_fitting_components(xfinal: npt.NDArray[np.float64], function: str,
         component = np.array(L(xfinal, xPar, ampPar, 0, LwidthPar))
     elif function == 'Voigt':
         component = np.array(V(xfinal, xPar, ampPar, GwidthPar, LwidthPar))
-
-    generalVars.ytot = np.add(generalVars.ytot, component)  ## adicionams estes valores de y aos que já tinhamos pois isto são extra
     
-    generalVars.yextrastot = np.add(generalVars.yextrastot, component)
-
-    return component
\ No newline at end of file
+    return component
@@ -0,0 +1,144 @@
+"""
+Tests of the headless simulation API in simulation.headless.
+The element data files are not read, the line lists are replaced with a few synthetic lines.
+"""
+
+import pytest
+
+pytest.importorskip("matplotlib")
+pytest.importorskip("lmfit")
+pytest.importorskip("iminuit")
+
+import numpy as np
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+import simulation.headless as headless
+from simulation.headless import SimulationConfig, run_simulation, run_fit
+from simulation.ycalc import y_calculator
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                        FIXTURES                           #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Synthetic line lists of two transitions with their satellites
+@pytest.fixture
+def lines():
+    rng = np.random.default_rng(0)
+
+    x = [list(rng.uniform(100, 110, 3)), list(rng.uniform(100, 110, 2))]
+    y = [list(rng.uniform(0, 1, len(energies))) for energies in x]
+    w = [list(rng.uniform(0.1, 1, len(energies))) for energies in x]
+    xs = [[list(rng.uniform(100, 110, 2)), [], [], list(rng.uniform(100, 110, 1))] for _ in x]
+    ys = [[list(rng.uniform(0, 1, len(energies))) for energies in transition] for transition in xs]
+    ws = [[list(rng.uniform(0.1, 1, len(energies))) for energies in transition] for transition in xs]
+
+    return x, y, w, xs, ys, ws
+
+# Replace the element data and the setup stages of the headless simulation
+@pytest.fixture
+def element(monkeypatch, lines):
+    monkeypatch.setattr(generalVars, 'Z', 48)
+    monkeypatch.setattr(generalVars, 'element_name', 'Cd')
+    monkeypatch.setattr(generalVars, 'label1', ['a', 'b'], raising=False)
+
+    monkeypatch.setattr(headless, 'load_element', lambda z, dir_path=None: None)
+    monkeypatch.setattr(headless, 'setupShake', lambda: None)
+    monkeypatch.setattr(headless, 'setupFormationEnergies', lambda: None)
+    monkeypatch.setattr(headless, 'setupPartialWidths', lambda: None)
+    monkeypatch.setattr(headless, 'process_simulation', lambda shake_amps={}, prompt=True, beam=None: (*lines, 0))
+
+# Configuration of a Voigt simulation of two transitions with satellites
+@pytest.fixture
+def config():
+    return SimulationConfig(48, transitions=list(generalVars.the_dictionary)[:2], satelite_var='Diagram + Satellites',
+                            type_var='Voigt', exp_resolution=0.8, energy_offset=1.5, normalizevar='One', yoffset=0.1)
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                         TESTS                             #
+#                                                           #
+# --------------------------------------------------------- #
+
+def test_config_round_trip(tmp_path, config):
+    config.set('PCS_radMixValues', ['0.5', '0.5'])
+
+    assert SimulationConfig.from_dict(config.to_dict()).to_dict() == config.to_dict()
+
+    config.save(tmp_path / "config.json")
+    assert SimulationConfig.load(tmp_path / "config.json").to_dict() == config.to_dict()
+
+def test_config_unknown_value():
+    with pytest.raises(RuntimeError):
+        SimulationConfig(48, not_a_variable=1)
+
+def test_run_simulation(element, config, lines):
+    interface_var = guiVars.satelite_var
+    selected = {transition: generalVars.the_dictionary[transition]["selected_state"] for transition in generalVars.the_dictionary}
+
+    results = run_simulation(config)
+
+    # The interface state is restored after the run
+    assert guiVars.satelite_var is interface_var
+    assert {transition: generalVars.the_dictionary[transition]["selected_state"] for transition in generalVars.the_dictionary} == selected
+
+    with config.applied():
+        ytot = y_calculator(None, 'Diagram + Satellites', 'Voigt', results['xfinal'], *lines, 0.8, [], [], 1.5, 0.0, 0.0, 0.0)[0]
+
+    assert len(results['xfinal']) == config.get('number_points')
+    np.testing.assert_allclose(results['ytot'], ytot)
+    assert results['normalization'] == pytest.approx(0.9 / np.max(ytot))
+    assert results['yoffset'] == 0.1
+    assert results['profile_accuracy'] == ''
+
+def test_load_element_directory(monkeypatch, tmp_path):
+    import aps.SpecSimu
+
+    loaded = []
+    def loadElementData(dir_path, element):
+        generalVars.Z, generalVars.element_name = element
+        generalVars.element_dir = str(dir_path.resolve())
+        loaded.append((element[0], dir_path))
+
+    monkeypatch.setattr(aps.SpecSimu, 'loadElementData', loadElementData)
+    monkeypatch.setattr(generalVars, 'Z', 0)
+    monkeypatch.setattr(generalVars, 'element_name', None)
+    monkeypatch.setattr(generalVars, 'element_dir', None)
+
+    headless.load_element(48, tmp_path / "a")
+    headless.load_element(48, tmp_path / "a")
+    assert len(loaded) == 1
+
+    # The same element from another data directory is read again
+    headless.load_element(48, tmp_path / "b")
+    assert loaded[-1] == (48, tmp_path / "b")
+    assert len(loaded) == 2
+
+def test_run_fit_without_method(element, config, tmp_path):
+    with pytest.raises(RuntimeError):
+        run_fit(config, tmp_path / "spectrum.csv")
+
+def test_run_fit(element, monkeypatch, tmp_path):
+    # Two separated diagram lines, so the fit has a single minimum
+    lines = ([[104.0, 106.0]], [[1.0, 0.5]], [[0.5, 0.4]], [[[], [], [], []]], [[[], [], [], []]], [[[], [], [], []]])
+    monkeypatch.setattr(headless, 'process_simulation', lambda shake_amps={}, prompt=True, beam=None: (*lines, 0))
+
+    config = SimulationConfig(48, transitions=list(generalVars.the_dictionary)[:1], satelite_var='Diagram', type_var='Voigt',
+                              exp_resolution=0.8, number_points=200, autofitvar='LMFit')
+
+    # Spectrum simulated with a known energy offset
+    energies = np.linspace(100, 110, 200)
+    with config.applied():
+        intensities = y_calculator(None, 'Diagram', 'Voigt', energies, *lines, 0.8, [], [], 0.2, 0.0, 0.0, 0.0)[0]
+    np.savetxt(tmp_path / "spectrum.csv", np.column_stack((energies, 1000 * intensities / np.max(intensities) + 10)), delimiter=',')
+
+    results = run_fit(config, tmp_path / "spectrum.csv")
+
+    assert results['config'].get('energy_offset') == pytest.approx(0.2, abs=1e-2)
+    assert config.get('energy_offset') == 0.0
+    assert results['multistart_spread'] == {}
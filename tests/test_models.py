@@ -0,0 +1,131 @@
+"""
+Tests of the simulated spectrum models used by the fits and the beam energy scan: the analytic Jacobian and the intensity maps.
+The interface variables are replaced with frozen values, so only numpy and scipy are needed, the plotting packages are not imported.
+"""
+
+import pytest
+
+pytest.importorskip("tkinter")
+
+import numpy as np
+
+import data.variables as generalVars
+import interface.variables as guiVars
+
+from simulation.multistart import FrozenVar
+from simulation.basis import ComponentBasis
+from simulation.jacobian import model_jacobian
+from simulation.beamScan import scan_map
+from simulation.ycalc import y_calculator, normalizer
+
+from scipy.interpolate import interp1d
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                        FIXTURES                           #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Interface values of a simulation of diagram lines and satellites
+interface_values = {'choice_var': 'Radiative', 'satelite_var': 'Diagram + Satellites', 'type_var': 'Voigt', 'voigt_method': 'Exact',
+                    'profile_mode': 'Exact', 'profile_tail_tol': 1E-4, 'separate_offsets': False, 'fit_shake_prob': False,
+                    'normalizevar': 'One', 'effic_var': 'No', 'exp_resolution': 0.8, 'energy_offset': 0.3, 'sat_energy_offset': -0.2,
+                    'shkoff_energy_offset': 0.1, 'shkup_energy_offset': -0.4, 'progress_var': 0.0}
+
+# Replace the interface variables with frozen values
+@pytest.fixture
+def interface(monkeypatch):
+    for name, value in interface_values.items():
+        monkeypatch.setattr(guiVars, name, FrozenVar(value))
+    monkeypatch.setattr(generalVars, 'label1', ['a', 'b'])
+    monkeypatch.setattr(generalVars, 'extra_fitting_functions', {})
+
+# Synthetic line lists of two transitions with their satellites
+@pytest.fixture
+def lines():
+    rng = np.random.default_rng(0)
+
+    x = [list(rng.uniform(100, 110, 3)), list(rng.uniform(100, 110, 2))]
+    y = [list(rng.uniform(0, 1, len(energies))) for energies in x]
+    w = [list(rng.uniform(0.1, 1, len(energies))) for energies in x]
+    xs = [[list(rng.uniform(100, 110, 2)), [], [], list(rng.uniform(100, 110, 1))] for _ in x]
+    ys = [[list(rng.uniform(0, 1, len(energies))) for energies in transition] for transition in xs]
+    ws = [[list(rng.uniform(0.1, 1, len(energies))) for energies in transition] for transition in xs]
+
+    return x, y, w, xs, ys, ws
+
+# Interpolated model of the fit, as in func2min
+def fit_model(values, exp_x, exp_y, num_of_points, lines):
+    xfinal = np.linspace(min(exp_x), max(exp_x), num=num_of_points)
+    offsets = (values['xoff'], values['sat_xoff'], values['shkoff_xoff'], values['shkup_xoff'])
+    ytot = y_calculator(None, 'Diagram + Satellites', 'Voigt', xfinal, *lines, values['res'], [], [], *offsets)[0]
+
+    exp_x_f = exp_x[(exp_x > min(xfinal)) & (exp_x < max(xfinal))]
+    normalization_var = normalizer(values['yoff'], max(exp_y), values['ytot_max'])
+    return interp1d(xfinal, np.asarray(ytot) * normalization_var + values['yoff'], kind='cubic')(exp_x_f)
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                         TESTS                             #
+#                                                           #
+# --------------------------------------------------------- #
+
+@pytest.mark.parametrize("separate_offsets, normalize", [(False, 'One'), (True, 'ExpMax'), (False, 'No')])
+def test_model_jacobian(interface, lines, separate_offsets, normalize):
+    guiVars.separate_offsets.set(separate_offsets)
+    guiVars.normalizevar.set(normalize)
+
+    exp_x = np.linspace(98, 112, 120)
+    exp_y = 1000 * np.exp(-(exp_x - 105) ** 2)
+    values = {'xoff': 0.3, 'sat_xoff': -0.2, 'shkoff_xoff': 0.1, 'shkup_xoff': -0.4, 'res': 0.8, 'yoff': 0.05, 'ytot_max': 2.5}
+    if separate_offsets:
+        names = ['xoff', 'shkoff_xoff', 'shkup_xoff', 'res', 'yoff', 'ytot_max']
+    else:
+        names = ['xoff', 'sat_xoff', 'res', 'yoff', 'ytot_max']
+
+    model, jacobian = model_jacobian(names, values, ComponentBasis(), None, list(exp_x), list(exp_y), 300, 'Diagram + Satellites', 'Voigt',
+                                     *lines, [], [])
+
+    np.testing.assert_allclose(model, fit_model(values, exp_x, exp_y, 300, lines), rtol=1e-12)
+
+    # Central finite differences of the interpolated model
+    step = 1e-6
+    for column, name in enumerate(names):
+        upper = fit_model(dict(values, **{name: values[name] + step}), exp_x, exp_y, 300, lines)
+        lower = fit_model(dict(values, **{name: values[name] - step}), exp_x, exp_y, 300, lines)
+        np.testing.assert_allclose(jacobian[:, column], (upper - lower) / (2 * step), rtol=1e-4, atol=1e-6 * np.max(np.abs(model)))
+
+@pytest.mark.parametrize("sat, peak, profile_mode", [('Diagram + Satellites', 'Voigt', 'Exact'), ('Diagram', 'Gaussian', 'Truncated'),
+                                                     ('Satellites', 'Lorentzian', 'Exact'), ('Diagram + Satellites', 'Voigt', 'Truncated')])
+def test_scan_map(interface, lines, sat, peak, profile_mode):
+    guiVars.satelite_var.set(sat)
+    guiVars.type_var.set(peak)
+    guiVars.profile_mode.set(profile_mode)
+    guiVars.separate_offsets.set(True)
+
+    x, y, w, xs, ys, ws = lines
+    xfinal = np.linspace(95, 115, 500)
+
+    # The intensities of the beam energies are scalings of the line intensities
+    scales = np.array([1.0, 0.4, 2.5])
+    scan_y = [[value * scales for value in transition] for transition in y]
+    scan_ys = [[[value * scales for value in component] for component in transition] for transition in ys]
+
+    intensity_map = scan_map((x, scan_y, w, xs, scan_ys, ws), len(scales), xfinal, [], [])
+
+    for row, scale in zip(intensity_map, scales):
+        scaled_y = [[value * scale for value in transition] for transition in y]
+        scaled_ys = [[[value * scale for value in component] for component in transition] for transition in ys]
+        ytot = y_calculator(None, sat, peak, xfinal, x, scaled_y, w, xs, scaled_ys, ws, 0.8, [], [], 0.3, -0.2, 0.1, -0.4)[0]
+        np.testing.assert_allclose(row, ytot, rtol=1e-10, atol=1e-12 * np.max(ytot))
+
+def test_scan_map_scalar(interface, lines):
+    xfinal = np.linspace(95, 115, 300)
+
+    # Scalar intensities are the same at every beam energy
+    intensity_map = scan_map(lines, 2, xfinal, [], [])
+    ytot = y_calculator(None, 'Diagram + Satellites', 'Voigt', xfinal, *lines, 0.8, [], [], 0.3, -0.2, 0.1, -0.4)[0]
+
+    np.testing.assert_allclose(intensity_map, [ytot, ytot], rtol=1e-10)
@@ -0,0 +1,140 @@
+"""
+Tests of the line profiles and of the profile evaluation modes in simulation.profileEngine.
+These only need numpy and scipy, the interface and plotting packages are not imported.
+"""
+
+import pytest
+
+import numpy as np
+
+from scipy.integrate import quad
+
+from simulation.profiles import G, L, V, profile_derivative
+from simulation.profileEngine import flatten_lines, batched_profile, window_halfwidths, windowed_profile, windowed_segments, \
+    truncation_bound, convolved_profile
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                        FIXTURES                           #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Line lists of three transitions, with an empty one
+@pytest.fixture
+def lines():
+    rng = np.random.default_rng(0)
+
+    x = [list(rng.uniform(100, 200, 40)), [], list(rng.uniform(100, 200, 25))]
+    y = [list(rng.uniform(0, 1, len(energies))) for energies in x]
+    w = [list(rng.uniform(0.05, 0.5, len(energies))) for energies in x]
+
+    return x, y, w
+
+# Per-line sum of the profiles of each transition
+def line_loop(profile, T, x, y, w, res):
+    return np.array([sum((profile(T, e, i, res, width) for e, i, width in zip(*line)), np.zeros(len(T))) for line in zip(x, y, w)])
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                         TESTS                             #
+#                                                           #
+# --------------------------------------------------------- #
+
+@pytest.mark.parametrize("profile", [G, L, V])
+def test_batched_profile(lines, profile):
+    x, y, w = lines
+    T = np.linspace(90, 210, 700)
+
+    energies, intens, widths, segments = flatten_lines(x, y, w)
+    yseg = batched_profile(profile, T, energies, intens, widths, segments, len(x), 0.3)
+
+    np.testing.assert_allclose(yseg, line_loop(profile, T, x, y, w, 0.3), rtol=1e-12, atol=1e-14)
+    assert not yseg[1].any()
+
+@pytest.mark.parametrize("fit_type, profile", [('Gaussian', G), ('Lorentzian', L), ('Voigt', V)])
+def test_windowed_profile(lines, fit_type, profile):
+    x, y, w = lines
+    T = np.linspace(90, 210, 4000)
+    tail_tol = 1e-3
+
+    energies, intens, widths, segments = flatten_lines(x, y, w)
+    halfwidths = window_halfwidths(fit_type, 0.3, widths, tail_tol)
+    exact = batched_profile(profile, T, energies, intens, widths, segments, len(x), 0.3)
+    truncated = windowed_profile(profile, T, energies, intens, widths, segments, len(x), 0.3, halfwidths)
+
+    # Each line is cut where it falls below the tolerance times its peak, so the error is below the sum of the cut values
+    peaks = np.array([profile(np.array([0.0]), 0.0, 1.0, 0.3, width)[0] for width in widths]) * intens
+    assert np.all(np.abs(truncated - exact) <= tail_tol * np.sum(peaks) + 1e-12)
+    assert np.all(halfwidths < 100)
+
+def test_window_cutoff():
+    widths = np.array([0.01, 0.3, 2.0])
+
+    for fit_type, profile in [('Gaussian', G), ('Lorentzian', L), ('Voigt', V)]:
+        halfwidths = window_halfwidths(fit_type, 0.8, widths, 1e-3)
+        for width, halfwidth in zip(widths, halfwidths):
+            edge, peak = profile(np.array([halfwidth, 0.0]), 0.0, 1.0, 0.8, width)
+            assert edge <= 1e-3 * peak * (1 + 1e-9)
+
+def test_truncation_bound():
+    widths = np.array([0.01, 0.3, 2.0])
+    intens = np.array([1.0, 0.5, 2.0])
+
+    for fit_type, profile in [('Gaussian', G), ('Lorentzian', L), ('Voigt', V)]:
+        halfwidths = window_halfwidths(fit_type, 0.8, widths, 1e-3)
+
+        # Area left outside the window of each line
+        outside = 0.0
+        for width, intensity, halfwidth in zip(widths, intens, halfwidths):
+            def f(t):
+                return profile(np.array([t]), 0.0, intensity, 0.8, width)[0]
+            outside += 2 * quad(f, halfwidth, np.inf)[0]
+
+        bound = truncation_bound(fit_type, 0.8, widths, intens, 1e-3)
+        assert outside <= bound * (1 + 1e-6)
+        if fit_type != 'Voigt':
+            assert bound == pytest.approx(outside, rel=1e-5)
+
+def test_windowed_fallback(lines):
+    x, y, w = lines
+    T = np.linspace(90, 210, 300)
+
+    # Windows wider than the grid evaluate the exact profiles over the whole grid
+    energies, intens, widths, segments = flatten_lines(x, y, w)
+    halfwidths = np.full(len(energies), 1000.0)
+    seg_lo, seg_hi, values = windowed_segments(V, T, energies, intens, widths, segments, len(x), 0.3, halfwidths)
+
+    exact = batched_profile(V, T, energies, intens, widths, segments, len(x), 0.3)
+    np.testing.assert_array_equal(seg_lo, [0, 0, 0])
+    np.testing.assert_array_equal(seg_hi, [300, 0, 300])
+    np.testing.assert_array_equal(values[0], exact[0])
+    np.testing.assert_array_equal(values[2], exact[2])
+
+def test_convolved_profile(lines):
+    x, y, w = lines
+    T = np.linspace(90, 210, 2000)
+
+    energies, intens, widths, segments = flatten_lines(x, y, w)
+    exact = batched_profile(V, T, energies, intens, widths, segments, len(x), 0.3)
+    convolved = convolved_profile(V, 'Voigt', T, energies, intens, widths, segments, len(x), 0.3)
+
+    assert np.max(np.abs(convolved - exact)) < 1e-2 * np.max(exact)
+
+@pytest.mark.parametrize("fit_type, profile", [('Gaussian', G), ('Lorentzian', L), ('Voigt', V)])
+def test_profile_derivatives(fit_type, profile):
+    T = np.linspace(95, 105, 101)
+    step = 1e-6
+
+    d_energy = profile_derivative(fit_type, 'energy')(T, 100.2, 0.7, 0.8, 0.4)
+    d_res = profile_derivative(fit_type, 'res')(T, 100.2, 0.7, 0.8, 0.4)
+    d_width = profile_derivative(fit_type, 'width')(T, 100.2, 0.7, 0.8, 0.4)
+
+    fd_energy = (profile(T, 100.2 + step, 0.7, 0.8, 0.4) - profile(T, 100.2 - step, 0.7, 0.8, 0.4)) / (2 * step)
+    fd_res = (profile(T, 100.2, 0.7, 0.8 + step, 0.4) - profile(T, 100.2, 0.7, 0.8 - step, 0.4)) / (2 * step)
+    fd_width = (profile(T, 100.2, 0.7, 0.8, 0.4 + step) - profile(T, 100.2, 0.7, 0.8, 0.4 - step)) / (2 * step)
+
+    np.testing.assert_allclose(d_energy, fd_energy, rtol=1e-5, atol=1e-8)
+    np.testing.assert_allclose(d_res, fd_res, rtol=1e-5, atol=1e-8)
+    np.testing.assert_allclose(d_width, fd_width, rtol=1e-5, atol=1e-8)
@@ -0,0 +1,152 @@
+"""
+Tests of the rates tables, their indexes and the binary cache of the parsed rates files.
+These only need numpy, the interface and plotting packages are not imported.
+"""
+
+import pytest
+
+import numpy as np
+
+import data.variables as generalVars
+from data.definitions import Line, LineTable, BranchingRatios
+
+from simulation.mults import CascadeGraph
+
+from utils.misc.rateCache import cachedTable, cachedLines, cacheFile
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                        FIXTURES                           #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Radiative lines of a few levels, with repeated levels and a line with energy 0
+@pytest.fixture
+def lines():
+    shells = [('1s', '2p'), ('1s', '2p*'), ('1s2p', '2p2p'), ('2p', '3d'), ('1s', '3p'), ('1s2s', '2s2p')]
+    rng = np.random.default_rng(0)
+
+    lines = []
+    for num, (shelli, shellf) in enumerate(shells * 4):
+        energy = 0.0 if num == 5 else float(rng.uniform(100, 200))
+        lines.append(Line(num, shelli, int(rng.integers(0, 4)), int(rng.integers(1, 3)), shellf, int(rng.integers(0, 4)), 1,
+                          energy, float(rng.uniform(0, 1)), 0.5, float(rng.uniform(0, 1)), 1.0, 0.1, 0.2, 0.3))
+
+    return lines
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                         TESTS                             #
+#                                                           #
+# --------------------------------------------------------- #
+
+@pytest.mark.parametrize("levels", [('1s', '2p', 'h'), ('1s', '2p', 'hl'), ('1s', '2p', 'na'), ('1s', '2p', 'hia'), ('2p', '3d', 'l')])
+def test_table_selection(lines, levels):
+    low, high, strict = levels
+    table = LineTable.from_lines(lines)
+
+    expected = [i for i, line in enumerate(lines) if line.filterLevel(low, high, strict=strict)]
+    np.testing.assert_array_equal(table.select(low, high, strict=strict), expected)
+
+    # The 2J selection keeps the lines of the level filter with the selected initial 2J values
+    expected_jj = [i for i in expected if lines[i].jji in [1, 3]]
+    np.testing.assert_array_equal(table.select(low, high, strict=strict, jj_vals=[3, 1]), expected_jj)
+
+    # The selected tables are reused and hold the same lines as the filter
+    selection = table.selection(low, high, strict=strict)
+    assert table.selection(low, high, strict=strict) is selection
+    assert [row.key() for row in selection] == [lines[i].key() for i in expected]
+    np.testing.assert_array_equal(selection.energy, [lines[i].energy for i in expected])
+
+def test_table_filter_jji(monkeypatch, lines):
+    monkeypatch.setattr(generalVars, 'jj_vals', [0, 2])
+    table = LineTable.from_lines(lines)
+
+    np.testing.assert_array_equal(table.filterJJI(), [line.filterJJI() for line in lines])
+
+def test_branching_ratios(lines):
+    ratios = BranchingRatios(lines)
+    table = LineTable.from_lines(lines)
+
+    # The first line of a repeated level gives its branching ratio
+    for line in lines:
+        first = next(other for other in lines if other.filterInitialState(line))
+        assert ratios.br(line) == first.br
+
+    np.testing.assert_array_equal(ratios.values(ratios.levelIds(table)), [ratios.br(line) for line in lines])
+
+    # Levels that are not in the file have no branching ratio
+    missing = Line(0, '4f', 1, 1, '5g', 1, 1, 100.0)
+    assert ratios.levelId(missing) == -1
+    assert ratios.br(missing) == 0.0
+    assert len(BranchingRatios(None)) == 0
+
+def test_cascade_chain():
+    # Cascade of the level 2p 1 1 through 3d 1 1 to 4f 1 1, the rates of 3d 1 1 come before the line that reaches it
+    rates = [Line(0, '4f', 1, 1, '3d', 1, 1, 50.0), Line(1, '4d', 1, 1, '3d', 1, 1, 40.0), Line(2, '3d', 1, 1, '2p', 1, 1, 100.0)]
+    levels = [Line(0, '3d', 1, 1, br=0.5), Line(1, '4f', 1, 1, br=0.2), Line(2, '4d', 1, 1, br=0.1)]
+
+    graph = CascadeGraph([(LineTable.from_lines(rates), BranchingRatios(levels))])
+
+    level = Line(0, '2p', 1, 1)
+    nodes, edges = graph.chain(graph.node(level.labelI()))
+    assert [list(graph.ids)[node] for node in nodes] == ['2p 1 1', '3d 1 1', '4f 1 1']
+    assert [graph.edge_br(edge) for edge in edges] == [0.5, 0.2]
+    assert graph.sides(nodes[0]) == {}
+
+    # Without side cascades the boosts multiply along the chain
+    assert graph.boost(level, 0.3) == pytest.approx(1.3 * 1.5 * 1.2 - 1)
+
+    # A level without cascades is only boosted by its own branching ratio
+    assert graph.boost(Line(0, '5g', 1, 1), 0.3) == pytest.approx(0.3)
+
+def test_cascade_sides():
+    # Same cascade with the rates in level order, so the rates of 3d 1 1 after the line that reaches it start side cascades
+    rates = [Line(0, '3d', 1, 1, '2p', 1, 1, 100.0), Line(1, '4f', 1, 1, '3d', 1, 1, 50.0), Line(2, '4d', 1, 1, '3d', 1, 1, 40.0)]
+    levels = [Line(0, '3d', 1, 1, br=0.5), Line(1, '4f', 1, 1, br=0.2), Line(2, '4d', 1, 1, br=0.1)]
+
+    graph = CascadeGraph([(LineTable.from_lines(rates), BranchingRatios(levels))])
+
+    level = Line(0, '2p', 1, 1)
+    nodes, _ = graph.chain(graph.node(level.labelI()))
+    assert graph.sides(nodes[0]) == {nodes[1]: pytest.approx(0.2 + 0.1)}
+
+    # The side cascades add their boosts at the level they start from
+    assert graph.boost(level, 0.3) == pytest.approx((0.2 + 0.5 * 0.2 + 0.3 + 1) * 1.3 - 1)
+
+def test_cached_table(tmp_path, lines):
+    source = tmp_path / "48-intensity.out"
+    source.write_text("rates")
+
+    parsed = []
+    def parse():
+        parsed.append(True)
+        return LineTable.from_lines(lines)
+
+    table = cachedTable(source, parse)
+    assert cacheFile(source).is_file()
+
+    cached = cachedTable(source, parse)
+    assert len(parsed) == 1
+    assert cached.shells == table.shells
+    for name in LineTable.int_fields + LineTable.float_fields + LineTable.shell_fields:
+        np.testing.assert_array_equal(cached.columns[name], table.columns[name])
+    assert np.all(np.isnan(cached.columns['overlap']))
+
+    # A changed source file is parsed again
+    source.write_text("new rates")
+    cachedTable(source, parse)
+    assert len(parsed) == 2
+
+def test_cached_lines(tmp_path):
+    source = tmp_path / "48-widths.out"
+    source.write_text("widths")
+
+    lines = [Line(line="1 1s 1 1 100.5 99.5 0.3 0.2 1s>2 95.0 1e-6 0.01"), Line(line="2 2p 3 1 50.5 49.5 0.1")]
+
+    cachedLines(source, lambda: lines)
+    cached = cachedLines(source, lambda: pytest.fail("the cache was not used"))
+
+    assert [vars(line) for line in cached] == [vars(line) for line in lines]
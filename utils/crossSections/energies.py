@@ -4,6 +4,8 @@ Module with functions to initialize helper variables to optimize the line filter
 
 import data.variables as generalVars
 
+from data.definitions import BranchingRatios
+
 
 def setupFormationEnergies():
     if type(generalVars.ionizationsrad) != type(None):
@@ -40,4 +42,9 @@ def setupPartialWidths():
     if type(generalVars.ionizationsshakeup) != type(None):
         generalVars.partialWidths['shakeup'] = {}
         for level in generalVars.ionizationsshakeup:
-            generalVars.partialWidths['shakeup'][level.keyI()] = level.totalWidth
\ No newline at end of file
+            generalVars.partialWidths['shakeup'][level.keyI()] = level.totalWidth
+
+
+def setupBranchingRatios():
+    generalVars.diagramBRs = BranchingRatios(generalVars.ionizationsrad)
+    generalVars.satelliteBRs = BranchingRatios(generalVars.ionizationssat)
@@ -7,7 +7,7 @@ from __future__ import annotations
 #Import file namer function
 from utils.misc.fileIO import loadEfficiency
 
-from typing import List
+from typing import Dict, List, Tuple
 
 from scipy.interpolate import interp1d
 
@@ -68,27 +68,96 @@ def detector_efficiency(energy_values: List[float], efficiency_values: List[floa
             shkup_enoffset: value of the simulated shake-up x offset
             
         Returns:
-            interpolated_effic: list of efficiency values interpolated for the simulated x values
+            interpolated_effic: array of efficiency values interpolated for the simulated x values
+            interpolated_effic_sat: same for the satellite x offset
+            interpolated_effic_shkoff: same for the shake-off x offset
+            interpolated_effic_shkup: same for the shake-up x offset
     """
-    # Initialize interpolated y values
-    interpolated_effic = [0.0 for i in range(len(xfinal))]
-    # Initialize interpolated satellite y values
-    interpolated_effic_sat = [0.0 for i in range(len(xfinal))]
-    # Initialize interpolated shake-off y values
-    interpolated_effic_shkoff = [0.0 for i in range(len(xfinal))]
-    # Initialize interpolated shake-up y values
-    interpolated_effic_shkup = [0.0 for i in range(len(xfinal))]
-    # Interpolate data
-    effic_interpolation = interp1d(energy_values, np.array(efficiency_values)/100)
+    model = efficiency_model(energy_values, efficiency_values)
+    
+    interpolated_effic = model.evaluate(xfinal, enoffset)
+    interpolated_effic_sat = model.evaluate(xfinal, enoffset + sat_enoffset)
+    interpolated_effic_shkoff = model.evaluate(xfinal, enoffset + shkoff_enoffset)
+    interpolated_effic_shkup = model.evaluate(xfinal, enoffset + shkup_enoffset)
+    
+    return interpolated_effic, interpolated_effic_sat, interpolated_effic_shkoff, interpolated_effic_shkup
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                 CACHED EFFICIENCY MODEL                   #
+#                                                           #
+# --------------------------------------------------------- #
+
+class EfficiencyModel():
     """
-    Interpolation function initialized from the efficiency data, normalized to 1
+    Class to hold the interpolated detector efficiency of a loaded efficiency file.
+    The interpolator is built once and whole grids are evaluated in one vectorized call.
+    The results are memoised by (grid, offset) so fit evaluations with unchanged offsets reuse them.
     """
-    # Loop the energy values with the simulated offset and store the efficiency
-    for i, energy in enumerate(np.array(xfinal)+enoffset):
-        interpolated_effic[i] = effic_interpolation(energy)
-        interpolated_effic_sat[i] = effic_interpolation(energy + sat_enoffset)
-        interpolated_effic_shkoff[i] = effic_interpolation(energy + shkoff_enoffset)
-        interpolated_effic_shkup[i] = effic_interpolation(energy + shkup_enoffset)
+    def __init__(self, energy_values: List[float], efficiency_values: List[float], max_cached: int = 64):
+        """
+        Args:
+            energy_values: list of the energy values provided in the detector efficiency data
+            efficiency_values: list of the efficiency values provided in the detector efficiency data (in percentage)
+            max_cached: maximum number of (grid, offset) results to keep
+        """
+        self.interpolation = interp1d(np.array(energy_values, dtype=np.float64), np.array(efficiency_values, dtype=np.float64) / 100)
+        """
+        Interpolation function initialized from the efficiency data, normalized to 1
+        """
+        self.max_cached = max_cached
+        self.cache: Dict[Tuple[int, int, float], npt.NDArray[np.float64]] = {}
     
-    return interpolated_effic, interpolated_effic_sat, interpolated_effic_shkoff, interpolated_effic_shkup
+    def evaluate(self, xfinal: List[float] | npt.NDArray[np.float64], offset: float) -> npt.NDArray[np.float64]:
+        """
+        Function to get the efficiency for the simulated x values shifted by an offset
+            
+            Args:
+                xfinal: list of the simulated x values
+                offset: energy offset to add to the x values
+            
+            Returns:
+                efficiency values for each of the shifted x values (read only, shared between calls)
+        """
+        grid = np.ascontiguousarray(xfinal, dtype=np.float64)
+        # The grid is keyed by its size and a hash of its values
+        key = (len(grid), hash(grid.tobytes()), float(offset))
+        
+        if key not in self.cache:
+            if len(self.cache) >= self.max_cached:
+                self.cache.pop(next(iter(self.cache)))
+            
+            effic = np.asarray(self.interpolation(grid + offset), dtype=np.float64)
+            effic.flags.writeable = False
+            self.cache[key] = effic
+        
+        return self.cache[key]
+
+
+loaded_models: Dict[Tuple[Tuple[float, ...], Tuple[float, ...]], EfficiencyModel] = {}
+"""
+Efficiency models already built, keyed by the efficiency data they were built from
+"""
 
+# Get the efficiency model for the loaded efficiency data
+def efficiency_model(energy_values: List[float], efficiency_values: List[float]) -> EfficiencyModel:
+    """
+    Function to get the efficiency model of an efficiency file, building it only the first time the data is used
+        
+        Args:
+            energy_values: list of the energy values provided in the detector efficiency data
+            efficiency_values: list of the efficiency values provided in the detector efficiency data
+        
+        Returns:
+            the efficiency model for this data
+    """
+    key = (tuple(energy_values), tuple(efficiency_values))
+    
+    if key not in loaded_models:
+        # Only keep the models of the last few loaded files
+        if len(loaded_models) >= 4:
+            loaded_models.pop(next(iter(loaded_models)))
+        loaded_models[key] = EfficiencyModel(energy_values, efficiency_values)
+    
+    return loaded_models[key]
@@ -4,6 +4,8 @@ Exporting to and importing from files is handled by these functions.
 I/O in aps 1, 2 and 3 is not yet implemented in this module.
 """
 
+from __future__ import annotations
+
 #GUI Imports for warnings and interface to select files
 from tkinter import messagebox
 from tkinter.filedialog import askopenfilename
@@ -25,13 +27,19 @@ from pathlib import Path
 #OS import for timestamps
 from datetime import datetime
 
-from data.definitions import Line
+from data.definitions import Line, LineTable, ChargeStateRates
+
+from utils.misc.rateCache import cachedTable, cachedLines, CACHE_SUFFIX
 
-from matplotlib.pyplot import Axes
+from typing import List, TYPE_CHECKING
 
-from plotly.graph_objects import Figure
+# The plotting types are only used in the annotations, so the numerical modules that read files do not need the plotting packages
+if TYPE_CHECKING:
+    from matplotlib.pyplot import Axes
+    from plotly.graph_objects import Figure
 
-from typing import List
+import numpy as np
+import numpy.typing as npt
 
 dir_path = Path(str(os.getcwd()) + '/')
 
@@ -149,8 +157,8 @@ def write_to_xls(type_t: str, enoffset: float, sat_enoffset: float, shkoff_enoff
                         if max(generalVars.yfinal[cs_index * len(generalVars.the_dictionary) + index]) != 0:
                             first_line += [cs + ' ' + generalVars.the_dictionary[transition]["readable_name"]]
                         # Add the satellite transitions
-                        for l, m in enumerate(generalVars.yfinals[cs_index * len(generalVars.the_dictionary) + index]):
-                            if max(m) != 0:
+                        for l in generalVars.yfinals.components(cs_index * len(generalVars.the_dictionary) + index):
+                            if max(generalVars.yfinals.row(cs_index * len(generalVars.the_dictionary) + index, l)) != 0:
                                 if l < len(generalVars.label1):
                                     first_line += [cs + ' ' + generalVars.the_dictionary[transition]["readable_name"] + '-' + labeldict[generalVars.label1[l]]]
                                 else:
@@ -162,8 +170,8 @@ def write_to_xls(type_t: str, enoffset: float, sat_enoffset: float, shkoff_enoff
                     if max(generalVars.yfinal[index]) != 0:
                         first_line += [generalVars.the_dictionary[transition]["readable_name"]]
                     # Add the satellite transitions
-                    for l, m in enumerate(generalVars.yfinals[index]):
-                        if max(m) != 0:
+                    for l in generalVars.yfinals.components(index):
+                        if max(generalVars.yfinals.row(index, l)) != 0:
                             if l < len(generalVars.label1):
                                 first_line += [generalVars.the_dictionary[transition]["readable_name"] + '-' + labeldict[generalVars.label1[l]]] # type: ignore
                             else:
@@ -199,8 +207,8 @@ def write_to_xls(type_t: str, enoffset: float, sat_enoffset: float, shkoff_enoff
                         if max(generalVars.yfinal[index]) != 0:
                             first_line += [cs + ' ' + generalVars.the_aug_dictionary[transition]["readable_name"]]
                         # Add the satellite transitions
-                        for l, m in enumerate(generalVars.yfinals[index]):
-                            if max(m) != 0:
+                        for l in generalVars.yfinals.components(index):
+                            if max(generalVars.yfinals.row(index, l)) != 0:
                                 if l < len(generalVars.label1):
                                     first_line += [cs + ' ' + generalVars.the_aug_dictionary[transition]["readable_name"] + '-' + labeldict[generalVars.label1[l]]]
                                 else:
@@ -212,8 +220,8 @@ def write_to_xls(type_t: str, enoffset: float, sat_enoffset: float, shkoff_enoff
                     if max(generalVars.yfinal[index]) != 0:
                         first_line += [generalVars.the_aug_dictionary[transition]["readable_name"]]
                     # Add the satellite transitions
-                    for l, m in enumerate(generalVars.yfinals[index]):
-                        if max(m) != 0:
+                    for l in generalVars.yfinals.components(index):
+                        if max(generalVars.yfinals.row(index, l)) != 0:
                             if l < len(generalVars.label1):
                                 first_line += [generalVars.the_aug_dictionary[transition]["readable_name"] + '-' + labeldict[generalVars.label1[l]]] # type: ignore
                             else:
@@ -293,8 +301,9 @@ def write_to_xls(type_t: str, enoffset: float, sat_enoffset: float, shkoff_enoff
             transition_columns += 1
         
         # Same for the satellite transitions but we require and extra loop
-        if any([max(ys) for ys in generalVars.yfinals[i]]):
-            for j, ys in enumerate(generalVars.yfinals[i]):
+        if len(generalVars.yfinals.components(i)) > 0:
+            for j in generalVars.yfinals.components(i):
+                ys = generalVars.yfinals.row(i, j)
                 if max(ys) != 0:
                     for row in range(len(y)):
                         matrix[row][transition_columns] = ys[row] # type: ignore
@@ -444,23 +453,64 @@ def write_to_xls(type_t: str, enoffset: float, sat_enoffset: float, shkoff_enoff
     messagebox.showinfo("File Saved", "Data file has been saved")
 
 # Function to save the fit report to file
-def exportFit(time_of_click: datetime, report: str):
+def exportFit(time_of_click: datetime, report: str, file_name: str | Path | None = None):
     """
     Function export the fit parameters calculated
         
         Args:
             time_of_click: timestamp of the fit
             report: the report to be saved
+            file_name: path of the report file (named from the timestamp if None)
             
         Returns:
             Nothing, the data is saved to file and printed on the console
     """
-    with open(file_namer("Fit", time_of_click, ".txt"), 'w') as file:
+    with open(file_name if file_name is not None else file_namer("Fit", time_of_click, ".txt"), 'w') as file:
         file.write(report)
         file.write("\nTotal theoretical intensity multiplier for the amplitude parameters: " + str(max(generalVars.ytot)))
         print(report)
         print("\nTotal theoretical intensity multiplier for the amplitude parameters: " + str(max(generalVars.ytot)))
 
+# Function to save the table with the fitted parameters of a batch fit
+def exportBatchTable(file_name: str | Path, rows: List[dict]):
+    """
+    Function to export the fitted parameters of all the spectra in a batch fit to a single csv table
+        
+        Args:
+            file_name: path of the table file
+            rows: dictionary with the spectrum file, fit statistics and fitted parameters for each spectrum
+            
+        Returns:
+            Nothing, the table is saved to file
+    """
+    # Columns in the order they first appear
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    
+    with open(file_name, 'w', newline='') as csvfile:
+        w1 = csv.DictWriter(csvfile, fieldnames=columns, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        w1.writeheader()
+        w1.writerows(rows)
+
+# Function to save the intensity map of a beam energy scan
+def exportScan(file_name: str | Path, beams: npt.NDArray[np.float64], xfinal: npt.NDArray[np.float64], intensity_map: npt.NDArray[np.float64]):
+    """
+    Function to export the intensity map of a beam energy scan to a compressed numpy file
+        
+        Args:
+            file_name: path of the .npz file
+            beams: beam energies of the scan
+            xfinal: simulated energy values
+            intensity_map: simulated intensity (columns) for each beam energy (rows)
+            
+        Returns:
+            Nothing, the map is saved to file with the beam_energies, energies and intensity arrays
+    """
+    np.savez_compressed(file_name, beam_energies=beams, energies=xfinal, intensity=intensity_map)
+
 def saveMatrixHtml(fig: Figure, title: str):
     if not os.path.isdir(dir_path / str(generalVars.Z) / "Analysis"):
         os.mkdir(dir_path / str(generalVars.Z) / "Analysis")
@@ -552,16 +602,43 @@ def readRates(rates_file: Path):
             rates_file: file path of the rates file
             
         Returns:
-            linerates: list with the data in Line objects
+            linerates: table with the data of the lines
     """
     try:
-        with open(rates_file, 'r') as rates:
-            # Write the lines into a list
-            return [Line(line=x) for x in rates.readlines()[3:]]
+        # Parse the lines and store them in columns, or read them from the cache of the file
+        return cachedTable(rates_file, lambda: parseRates(rates_file))
 
     except FileNotFoundError:
         messagebox.showwarning("Error", "Rates File is not Avaliable: " + str(rates_file))
 
+# Parse a rates file into a table
+def parseRates(rates_file: Path) -> LineTable:
+    """
+    Function to parse the lines of a rates file, skipping the header
+        
+        Args:
+            rates_file: file path of the rates file
+            
+        Returns:
+            linerates: table with the data of the lines
+    """
+    with open(rates_file, 'r') as rates:
+        return LineTable.from_lines(Line(line=x) for x in rates.readlines()[3:])
+
+# Parse a levels file into a list of lines
+def parseLines(levels_file: Path) -> List[Line]:
+    """
+    Function to parse the lines of an ionization energies or widths file, skipping the header
+        
+        Args:
+            levels_file: file path of the file
+            
+        Returns:
+            list with the parsed lines
+    """
+    with open(levels_file, 'r') as levels:
+        return [Line(line=x) for x in levels.readlines()[3:]]
+
 # Read the ionization energies file and return a list with the data
 def readIonizationEnergies(ioniz_file: Path):
     """
@@ -574,9 +651,8 @@ def readIonizationEnergies(ioniz_file: Path):
             ionizations: list with the ionization energies still in string format
     """
     try:
-        with open(ioniz_file, 'r') as ioniz:
-            # Write the lines into a list
-            return [Line(line=x) for x in ioniz.readlines()[3:]]
+        # Write the lines into a list, or read them from the cache of the file
+        return cachedLines(ioniz_file, lambda: parseLines(ioniz_file))
             
     except FileNotFoundError:
         messagebox.showwarning("Error", "Ionization Energies File is not Avaliable: " + str(ioniz_file))
@@ -593,9 +669,8 @@ def readWidths(widthsfile: Path):
             widths: list with the diagram widths still in string format
     """
     try:
-        with open(widthsfile, 'r') as widths:
-            # Write the lines into a list
-            return [Line(line=x) for x in widths.readlines()[3:]]
+        # Write the lines into a list, or read them from the cache of the file
+        return cachedLines(widthsfile, lambda: parseLines(widthsfile))
             
     except FileNotFoundError:
         messagebox.showwarning("Error", "Widths File is not Avaliable: " + str(widthsfile))
@@ -714,17 +789,34 @@ def searchChargeStates(dir_path: Path, z: int, identifyer: str):
     files: List[str] = []
     # Loop all files in the folder
     for f in os.listdir(dir_path / str(z) / 'Charge_States'):
-        # If the name format matches a radiative rates files then append it to the list
-        if os.path.isfile(os.path.join(dir_path / str(z) / 'Charge_States', f)) and identifyer in f:
+        # If the name format matches a radiative rates files then append it to the list (the caches of the files are skipped)
+        if os.path.isfile(os.path.join(dir_path / str(z) / 'Charge_States', f)) and identifyer in f and not f.endswith(CACHE_SUFFIX):
             files.append(f)
     
     return files
 
+# Read a charge state rates file
+def readChargeStateFile(rates_file: Path) -> LineTable:
+    """
+    Function to read a charge state rates file, used by ChargeStateRates when the rates of the charge state are first used
+        
+        Args:
+            rates_file: file path of the rates file
+            
+        Returns:
+            table with the data of the lines (empty if the file is not available)
+    """
+    try:
+        return cachedTable(rates_file, lambda: parseRates(rates_file))
+    except FileNotFoundError:
+        return LineTable.from_lines([])
+
+
 # Read the rates files in the files list and return a list with the data split by positive and negative charge states.
 # Also return a list with the order in which the data was stored in the lists
 def readChargeStates(files: List[str], dir_path: Path, z: int):
     """
-    Function to read the rates files in the files list
+    Function to prepare the rates of the files in the files list, the files are only read when their rates are used
         
         Args:
             files: list of the file names to read
@@ -732,13 +824,13 @@ def readChargeStates(files: List[str], dir_path: Path, z: int):
             z: z value of the element to simulate
         
         Returns:
-            linerates_PCS: lists of the rates read for each positive charge state
-            linerates_NCS: lists of the rates read for each negative charge state
-            PCS: list with the order that the rates for the positive charge states were read
-            NCS: list with the order that the rates for the negative charge states were read
+            linerates_PCS: rates of each positive charge state
+            linerates_NCS: rates of each negative charge state
+            PCS: list with the order that the rates for the positive charge states were stored
+            NCS: list with the order that the rates for the negative charge states were stored
     """
-    linerates_PCS: List[List[Line]] = []
-    linerates_NCS: List[List[Line]] = []
+    files_PCS: List[Path] = []
+    files_NCS: List[Path] = []
 
     PCS: List[str] = []
     NCS: List[str] = []
@@ -747,24 +839,20 @@ def readChargeStates(files: List[str], dir_path: Path, z: int):
     for file in files:
         # Path to the selected file
         tmp_file = dir_path / str(z) / 'Charge_States' / file
-        try:
-            with open(tmp_file, 'r') as rates:
-                if '+' in file:
-                    # Write the lines into a list and append it to the total rates for all charge states
-                    linerates_PCS.append([Line(line=x) for x in rates.readlines()[3:]])
-                    
-                    # Append the charge state value to identify the rates we just appended
-                    PCS.append('+' + file.split('+')[1].split('.')[0])
-                else:
-                    # Write the lines into a list and append it to the total rates for all charge states
-                    linerates_NCS.append([Line(line=x) for x in rates.readlines()[3:]])
-                    
-                    # Append the charge state value to identify the rates we just appended
-                    NCS.append('-' + file.split('-')[1].split('.')[0])
-        except FileNotFoundError:
+        if not os.path.isfile(tmp_file):
             messagebox.showwarning("Error", "Charge State File is not Avaliable: " + file)
+        elif '+' in file:
+            files_PCS.append(tmp_file)
+            
+            # Append the charge state value to identify the rates of the file
+            PCS.append('+' + file.split('+')[1].split('.')[0])
+        else:
+            files_NCS.append(tmp_file)
+            
+            # Append the charge state value to identify the rates of the file
+            NCS.append('-' + file.split('-')[1].split('.')[0])
     
-    return linerates_PCS, linerates_NCS, PCS, NCS
+    return ChargeStateRates(files_PCS, readChargeStateFile), ChargeStateRates(files_NCS, readChargeStateFile), PCS, NCS
 
 # Read the ion population file and return a list with the raw data
 def readIonPop(ionpop_file: Path):
@@ -0,0 +1,130 @@
+"""
+Module with the progress reporters used by the simulation, fitting and conversion loops.
+The loops only call report(stage, done, total) and the reporter decides if and how to show it.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                    PROGRESS REPORTERS                     #
+#                                                           #
+# --------------------------------------------------------- #
+
+class ProgressReporter():
+    """
+    Base class for the progress reporters. The reports are throttled by time and by percentage,
+    so a loop can report after every item and only a few of the reports are shown.
+    A report is always shown when the stage changes or when the stage is complete.
+    """
+    def __init__(self, min_interval: float = 0.1, min_step: float = 1.0):
+        """
+        Args:
+            min_interval: minimum time in seconds between two shown reports of the same stage
+            min_step: minimum change in percentage between two shown reports of the same stage
+        """
+        self.min_interval = min_interval
+        self.min_step = min_step
+        self.last_stage = None
+        self.last_time = 0.0
+        self.last_percent = 0.0
+
+    def report(self, stage: str, done: float, total: float | None):
+        """
+        Function to report the progress of a stage of a loop
+
+            Args:
+                stage: name of the stage being processed
+                done: number of items done
+                total: total number of items in the stage (0 or None if unknown, then only the time throttling is applied)
+
+            Returns:
+                Nothing, the progress is shown if the throttling allows it
+        """
+        percent = 100.0 * done / total if total else None
+        now = time.monotonic()
+
+        if stage == self.last_stage and (percent is None or percent < 100.0):
+            if now - self.last_time < self.min_interval:
+                return
+            if percent is not None and percent - self.last_percent < self.min_step:
+                return
+
+        self.last_stage = stage
+        self.last_time = now
+        self.last_percent = percent if percent is not None else 0.0
+
+        self.show(stage, done, total, percent)
+
+    def show(self, stage: str, done: float, total: float | None, percent: float | None):
+        """
+        Function to show a progress report that passed the throttling, implemented by each adapter
+
+            Args:
+                stage: name of the stage being processed
+                done: number of items done
+                total: total number of items in the stage (None if unknown)
+                percent: percentage of the stage that is done (None if the total is unknown)
+        """
+        pass
+
+
+class NullProgress(ProgressReporter):
+    """
+    Progress reporter that ignores all reports, for headless runs
+    """
+    def __init__(self):
+        super().__init__()
+
+    def report(self, stage: str, done: float, total: float | None):
+        pass
+
+
+class TkProgress(ProgressReporter):
+    """
+    Progress reporter that updates a tkinter progress bar variable and redraws the window
+    """
+    def __init__(self, window, progress_var, min_interval: float = 0.1, min_step: float = 1.0):
+        """
+        Args:
+            window: tkinter window to update after setting the progress
+            progress_var: tkinter variable bound to the progress bar (0 to 100)
+            min_interval: minimum time in seconds between two redraws of the same stage
+            min_step: minimum change in percentage between two redraws of the same stage
+        """
+        super().__init__(min_interval, min_step)
+        self.window = window
+        self.progress_var = progress_var
+
+    def show(self, stage: str, done: float, total: float | None, percent: float | None):
+        if percent is not None:
+            self.progress_var.set(percent)
+        self.window.update_idletasks()
+
+
+class ConsoleProgress(ProgressReporter):
+    """
+    Progress reporter that prints the progress on a single console line
+    """
+    def __init__(self, min_interval: float = 0.5, min_step: float = 1.0, stream = None):
+        """
+        Args:
+            min_interval: minimum time in seconds between two printed reports of the same stage
+            min_step: minimum change in percentage between two printed reports of the same stage
+            stream: text stream where to print the reports (the current sys.stdout when each report is printed if None)
+        """
+        super().__init__(min_interval, min_step)
+        self.stream = stream
+
+    def show(self, stage: str, done: float, total: float | None, percent: float | None):
+        stream = self.stream if self.stream is not None else sys.stdout
+        if percent is None:
+            stream.write(stage + ": " + str(int(done)) + '\r')
+        else:
+            end = '\n' if percent >= 100.0 else '\r'
+            stream.write(stage + ": " + str(int(done)) + "/" + str(int(total)) + " ({:.0f}%)".format(percent) + end) # type: ignore
+        stream.flush()
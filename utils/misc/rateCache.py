@@ -0,0 +1,254 @@
+"""
+Module with the binary cache of the parsed rates files.
+Each parsed file is stored in columns in an uncompressed npz file next to it, together with the path, size,
+modification time and content hash of the source file. The cache is used while it matches the source and rebuilt otherwise.
+"""
+
+from __future__ import annotations
+
+from data.definitions import Line, LineTable
+
+import hashlib
+import os
+from pathlib import Path
+
+from typing import Callable, Dict, List
+
+import numpy as np
+import numpy.typing as npt
+
+
+# Version of the cache layout, caches written with another version are rebuilt
+CACHE_VERSION = 1
+
+# Suffix added to the source file name
+CACHE_SUFFIX = '.cache.npz'
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                CACHE FILES AND VALIDATION                 #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Path of the cache of a source file
+def cacheFile(source: Path) -> Path:
+    """
+    Function to get the path of the cache file of a source file, in the same folder
+
+        Args:
+            source: path of the source file
+
+        Returns:
+            path of the cache file
+    """
+    return source.with_name(source.name + CACHE_SUFFIX)
+
+# Hash of the content of a source file
+def contentHash(source: Path) -> str:
+    """
+    Function to calculate the hash of the content of a source file
+
+        Args:
+            source: path of the source file
+
+        Returns:
+            hexadecimal sha256 digest of the content
+    """
+    digest = hashlib.sha256()
+    with open(source, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+# Read a cache if it matches the source file
+def loadCache(source: Path, kind: str) -> Dict[str, npt.NDArray] | None:
+    """
+    Function to read the cache of a source file if it is still valid.
+    A cache with the same size and modification time of the source is valid, if only the modification time changed
+    the content hash is compared, and the cache is updated with the new time when the content is the same
+
+        Args:
+            source: path of the source file
+            kind: kind of data stored in the cache (table or lines)
+
+        Returns:
+            the cached columns, or None if there is no valid cache
+    """
+    cache = cacheFile(source)
+    if not cache.is_file():
+        return None
+
+    stat = source.stat()
+
+    try:
+        with np.load(cache, allow_pickle=False) as data:
+            columns = {name: data[name] for name in data.files}
+    except (OSError, ValueError):
+        # Unreadable cache, it is rebuilt
+        return None
+
+    if int(columns.pop('__version__')) != CACHE_VERSION or str(columns.pop('__kind__')) != kind \
+       or str(columns.pop('__path__')) != str(source.resolve()) or int(columns.pop('__size__')) != stat.st_size:
+        return None
+
+    mtime = int(columns.pop('__mtime__'))
+    content = str(columns.pop('__hash__'))
+
+    if mtime != stat.st_mtime_ns:
+        if content != contentHash(source):
+            return None
+        # The source was touched but not changed
+        saveCache(source, kind, columns, content)
+
+    return columns
+
+# Write the cache of a source file
+def saveCache(source: Path, kind: str, columns: Dict[str, npt.NDArray], content: str | None = None):
+    """
+    Function to write the cache of a source file.
+    The cache is written to a temporary file and then moved, so a failed write never leaves a broken cache,
+    and a folder without write permissions just runs without cache
+
+        Args:
+            source: path of the source file
+            kind: kind of data stored in the cache (table or lines)
+            columns: columns to store
+            content: content hash of the source (calculated if None)
+    """
+    stat = source.stat()
+    cache = cacheFile(source)
+    temporary = cache.with_name(cache.name + '.' + str(os.getpid()) + '.tmp')
+
+    meta = {'__version__': np.array(CACHE_VERSION), '__kind__': np.array(kind), '__path__': np.array(str(source.resolve())),
+            '__size__': np.array(stat.st_size), '__mtime__': np.array(stat.st_mtime_ns),
+            '__hash__': np.array(content if content is not None else contentHash(source))}
+
+    try:
+        with open(temporary, 'wb') as file:
+            np.savez(file, **meta, **columns)
+        os.replace(temporary, cache)
+    except OSError:
+        if temporary.exists():
+            temporary.unlink()
+
+
+# --------------------------------------------------------- #
+#                                                           #
+#                   CACHED PARSED DATA                      #
+#                                                           #
+# --------------------------------------------------------- #
+
+# Parsed rates table of a file
+def cachedTable(source: Path, parse: Callable[[], LineTable]) -> LineTable:
+    """
+    Function to get the rates table of a file from its cache, parsing the file and writing the cache if needed
+
+        Args:
+            source: path of the rates file
+            parse: function that parses the file into a table
+
+        Returns:
+            table with the data of the lines
+    """
+    columns = loadCache(source, 'table')
+    if columns is not None:
+        shells = columns.pop('__shells__').tolist()
+        for name in LineTable.state_fields:
+            columns[name] = np.full(len(columns['energy']), np.nan)
+        return LineTable(shells, columns)
+
+    table = parse()
+
+    stored = {name: column for name, column in table.columns.items() if name not in LineTable.state_fields}
+    saveCache(source, 'table', {'__shells__': np.array(table.shells, dtype=np.str_), **stored})
+
+    return table
+
+# Parsed lines of a file
+def cachedLines(source: Path, parse: Callable[[], List[Line]]) -> List[Line]:
+    """
+    Function to get the Line objects of a file (ionization energies and widths) from its cache,
+    parsing the file and writing the cache if needed.
+    The lines of these files do not all have the same attributes, so each attribute is stored with a mask of the lines that have it
+
+        Args:
+            source: path of the file
+            parse: function that parses the file into a list of lines
+
+        Returns:
+            list with the lines
+    """
+    columns = loadCache(source, 'lines')
+    if columns is not None:
+        return linesFromColumns(columns)
+
+    lines = parse()
+    saveCache(source, 'lines', linesToColumns(lines))
+
+    return lines
+
+# Store the attributes of a list of lines in columns
+def linesToColumns(lines: List[Line]) -> Dict[str, npt.NDArray]:
+    """
+    Function to store the attributes of a list of lines in columns.
+    Each attribute has a values column and a mask column (name + '!'), the overlap labels of the
+    widths files are split into a label column (name + '.0') and a value column (name + '.1')
+
+        Args:
+            lines: lines to store
+
+        Returns:
+            dictionary with the columns
+    """
+    names: Dict[str, type] = {}
+    for line in lines:
+        for name, value in vars(line).items():
+            names.setdefault(name, type(value))
+
+    columns: Dict[str, npt.NDArray] = {'__count__': np.array(len(lines))}
+    for name, kind in names.items():
+        columns[name + '!'] = np.array([hasattr(line, name) for line in lines], dtype=np.bool_)
+        if kind is list:
+            columns[name + '.0'] = np.array([getattr(line, name, ['', 0.0])[0] for line in lines], dtype=np.str_)
+            columns[name + '.1'] = np.array([getattr(line, name, ['', 0.0])[1] for line in lines], dtype=np.float64)
+        elif kind is str:
+            columns[name] = np.array([getattr(line, name, '') for line in lines], dtype=np.str_)
+        elif kind is int:
+            columns[name] = np.array([getattr(line, name, 0) for line in lines], dtype=np.int64)
+        else:
+            columns[name] = np.array([getattr(line, name, 0.0) for line in lines], dtype=np.float64)
+
+    return columns
+
+# Rebuild a list of lines from its columns
+def linesFromColumns(columns: Dict[str, npt.NDArray]) -> List[Line]:
+    """
+    Function to rebuild the lines stored with linesToColumns
+
+        Args:
+            columns: dictionary with the columns
+
+        Returns:
+            list with the lines, with the same attributes as the parsed lines
+    """
+    count = int(columns['__count__'])
+    names = [name[:-1] for name in columns if name.endswith('!')]
+
+    values: Dict[str, list] = {}
+    for name in names:
+        if name + '.0' in columns:
+            values[name] = [[label, value] for label, value in zip(columns[name + '.0'].tolist(), columns[name + '.1'].tolist())]
+        else:
+            values[name] = columns[name].tolist()
+
+    lines: List[Line] = []
+    for i in range(count):
+        line = Line.__new__(Line)
+        for name in names:
+            if columns[name + '!'][i]:
+                setattr(line, name, values[name][i])
+        lines.append(line)
+
+    return lines